@@ -1,47 +1,93 @@
 from flask import Blueprint, request, jsonify, render_template
-from flask_login import login_required
-from llm import analyze_code_with_ai
+from flask_login import login_required, current_user
+from incremental import analyze_incrementally, iter_analysis, units_summary
+from llm import llm_available, static_fallback
+from llm_client import LLMUnavailable, request_deadline
+from ratelimit import rate_limited
+from sse import sse_event, sse_response
+from static_analysis import analyze as static_analyze
 
 analyze = Blueprint("analyze", __name__)
 
+# Supported languages
+SUPPORTED_LANGS = ["py", "js", "java", "cpp", "c", "html", "css", "sql"]
+
+
+def _parse_analyze_request(data):
+    """Validate an analyze payload; returns (code, lang, error)"""
+    if not data:
+        return None, None, "No data provided"
+    
+    code = data.get("code", "").strip()
+    lang = data.get("lang", "py").strip().lower()
+    
+    if not code:
+        return None, None, "No code provided"
+    
+    if len(code) > 50000:
+        return None, None, "Code too long. Maximum 50,000 characters."
+    
+    if lang not in SUPPORTED_LANGS:
+        return None, None, f"Unsupported language: {lang}"
+    
+    return code, lang, None
+
+
+def _voice_text(code, lang, explanation):
+    """Create voice-friendly summary"""
+    return f"Analysis complete. This is {lang.upper()} code with {len(code.split(chr(10)))} lines. {explanation[:200]}..."
+
+
+def _static_only_result(code, lang, static):
+    """Response body while the LLM circuit breaker is open"""
+    explanation = static_fallback(static)
+    return {
+        "explanation": explanation,
+        "voice_text": _voice_text(code, lang, explanation),
+        "language": lang,
+        "line_count": len(code.split('\n')),
+        "static": static,
+        "units": units_summary({}),
+        "degraded": True,
+        "success": True
+    }
+
+
 @analyze.route("/analyze", methods=["POST"])
 @login_required
+@rate_limited("analyze")
 def analyze_code():
     """Analyze code with AI - returns analysis and voice-ready text"""
     try:
-        data = request.get_json()
-        if not data:
-            return jsonify({"error": "No data provided"}), 400
-        
-        code = data.get("code", "").strip()
-        lang = data.get("lang", "py").strip().lower()
-        
-        if not code:
-            return jsonify({"error": "No code provided"}), 400
-        
-        if len(code) > 50000:
-            return jsonify({"error": "Code too long. Maximum 50,000 characters."}), 400
-        
-        # Supported languages
-        supported_langs = ["py", "js", "java", "cpp", "c", "html", "css", "sql"]
-        if lang not in supported_langs:
-            return jsonify({"error": f"Unsupported language: {lang}"}), 400
+        code, lang, error = _parse_analyze_request(request.get_json())
+        if error:
+            return jsonify({"error": error}), 400
         
         print(f"🔍 Analyzing {lang} code ({len(code)} chars)...")
         
-        # Get AI analysis
-        explanation = analyze_code_with_ai(code, lang, "beginner")
+        # Local static pre-analysis (milliseconds), also fed into the prompt
+        static = static_analyze(code, lang)
+        
+        # Get AI analysis; unchanged functions/classes reuse earlier results
+        try:
+            if not llm_available():
+                raise LLMUnavailable("circuit open", 0)
+            explanation, unit_stats = analyze_incrementally(code, lang, "beginner", static, request_deadline(user_id=current_user.id))
+        except LLMUnavailable:
+            print("⚡ LLM unavailable; answering with static analysis only")
+            return jsonify(_static_only_result(code, lang, static)), 200
         
-        # Create voice-friendly summary
-        voice_text = f"Analysis complete. This is {lang.upper()} code with {len(code.split(chr(10)))} lines. {explanation[:200]}..."
+        voice_text = _voice_text(code, lang, explanation)
         
-        print(f"✅ Analysis complete")
+        print(f"✅ Analysis complete ({units_summary(unit_stats)['message']})")
         
         return jsonify({
             "explanation": explanation,
             "voice_text": voice_text,
             "language": lang,
             "line_count": len(code.split('\n')),
+            "static": static,
+            "units": units_summary(unit_stats),
             "success": True
         }), 200
     
@@ -54,6 +100,58 @@ def analyze_code():
         }), 500
 
 
+@analyze.route("/analyze/stream", methods=["POST"])
+@login_required
+@rate_limited("analyze")
+def analyze_stream():
+    """Streaming analysis - pushes explanation tokens as Server-Sent Events"""
+    code, lang, error = _parse_analyze_request(request.get_json(silent=True))
+    if error:
+        return jsonify({"error": error, "success": False}), 400
+    
+    print(f"🔍 Streaming analysis of {lang} code ({len(code)} chars)...")
+    deadline = request_deadline(user_id=current_user.id)
+    
+    def generate():
+        parts = []
+        try:
+            # Static results go out before the first LLM token
+            static = static_analyze(code, lang)
+            yield sse_event(static, event="static")
+            
+            unit_stats = {}
+            try:
+                if not llm_available():
+                    raise LLMUnavailable("circuit open", 0)
+                for text in iter_analysis(code, lang, "beginner", static, unit_stats, deadline=deadline):
+                    parts.append(text)
+                    yield sse_event({"delta": text})
+            except LLMUnavailable:
+                print("⚡ LLM unavailable; streaming static analysis only")
+                result = _static_only_result(code, lang, static)
+                yield sse_event({"delta": result["explanation"]})
+                yield sse_event(result, event="done")
+                return
+            
+            explanation = "".join(parts)
+            print(f"✅ Analysis streamed ({units_summary(unit_stats)['message']})")
+            
+            yield sse_event({
+                "explanation": explanation,
+                "voice_text": _voice_text(code, lang, explanation),
+                "language": lang,
+                "line_count": len(code.split('\n')),
+                "static": static,
+                "units": units_summary(unit_stats),
+                "success": True
+            }, event="done")
+        except Exception as e:
+            print(f"❌ Analysis stream error: {e}")
+            yield sse_event({"error": f"Analysis failed: {e}", "success": False}, event="error")
+    
+    return sse_response(generate())
+
+
 @analyze.route("/analyze/page")
 @login_required
 def analyze_page():
@@ -1,15 +1,27 @@
 """
 TracePoint AI - Main Application
-Production-ready Flask app without forensic features
+create_app() builds the Flask app; `app` below is the default instance
+(gunicorn app:app). Nothing slow happens at import: the LLM client is
+created on first use and DB connections open per thread when needed.
 """
 
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, current_app, g, render_template, request, jsonify
 from flask_login import LoginManager, login_required, current_user
 from flask_cors import CORS
-from auth import auth, User
+from auth import auth, load_cached_user, loader_stats
 from analyze import analyze
 from chat import chat
-from db import init_db, get_conn
+from forensic import forensic
+from db import init_db, chat_writer_stats
+from cache import response_cache
+from ratelimit import RateLimited, limiter_stats
+from retention import start_retention, retention_stats
+from jobs import recover_orphaned_jobs
+from sandbox_limits import run_slots
+import health
+import math
+import metrics
+import time
 import os
 import sys
 
@@ -24,79 +36,42 @@ if not os.path.exists(TEMPLATE_FOLDER):
 if not os.path.exists(STATIC_FOLDER):
     STATIC_FOLDER = os.path.join(os.path.dirname(__file__), "static")
 
-# Create Flask app
-app = Flask(
-    __name__,
-    template_folder=TEMPLATE_FOLDER,
-    static_folder=STATIC_FOLDER,
-)
-
-# Security configuration
-app.config["SECRET_KEY"] = os.getenv("SECRET_KEY", "tracepoint-secure-key-2026-change-in-production")
-app.config["MAX_CONTENT_LENGTH"] = 10 * 1024 * 1024  # 10MB max upload
-app.config["SESSION_COOKIE_SECURE"] = False  # Set True in production with HTTPS
-app.config["SESSION_COOKIE_HTTPONLY"] = True
-app.config["SESSION_COOKIE_SAMESITE"] = "Lax"
-
-# Enable CORS
-CORS(app, resources={
-    r"/api/*": {"origins": "*"},
-    r"/analyze": {"origins": "*"},
-    r"/chat": {"origins": "*"}
-})
-
-# Initialize login manager
+# Initialize login manager (bound to each app in create_app)
 login_manager = LoginManager()
 login_manager.login_view = "auth.login"
 login_manager.login_message = "Please log in to access this page."
-login_manager.init_app(app)
 
 @login_manager.user_loader
 def load_user(user_id):
-    """Load user from database"""
+    """Load user from the session identity, cache or database"""
     try:
-        with get_conn() as conn:
-            c = conn.cursor()
-            c.execute("SELECT * FROM users WHERE id=?", (user_id,))
-            row = c.fetchone()
-            return User(row) if row else None
+        return load_cached_user(user_id)
     except Exception as e:
         print(f"❌ Error loading user: {e}")
         return None
 
-# Register blueprints
-app.register_blueprint(auth)
-app.register_blueprint(analyze)
-app.register_blueprint(chat)
-
 # Routes
-@app.route("/")
 def index():
     """Landing page"""
     return render_template("index.html")
 
-@app.route("/dashboard")
 @login_required
 def dashboard():
     """User dashboard - requires login"""
     return render_template("dashboard.html", user=current_user)
 
-@app.route("/health")
-def health():
-    """Health check endpoint"""
-    try:
-        import llm
-        api_status, api_message = llm.test_llm_connection()
-    except Exception as e:
-        api_status = False
-        api_message = f"LLM module error: {str(e)}"
+def health_check():
+    """Health check endpoint (cached probe results, never blocks)"""
+    ready, report = health.readiness()
+    llm_check = report["checks"].get("llm") or {}
     
     return jsonify({
         "status": "online",
+        "ready": ready,
         "version": "2.0-Production",
         "app": "TracePoint AI",
-        "api_configured": api_status,
-        "api_status": api_message,
+        "api_configured": llm_check.get("ok", False),
+        "api_status": llm_check.get("status", "LLM check pending"),
         "features": {
             "code_analysis": True,
             "chat": True,
@@ -104,41 +79,76 @@ def health():
         }
     }), 200
 
-@app.route("/api/status")
+def health_live():
+    """Liveness: the process is serving requests"""
+    return jsonify(health.liveness()), 200
+
+def health_ready():
+    """Readiness: 503 until the latest probe round passes every critical check"""
+    ready, report = health.readiness()
+    return jsonify(report), 200 if ready else 503
+
 def api_status():
     """Detailed API status"""
-    try:
-        import llm
-        api_ok, api_msg = llm.test_llm_connection()
-    except Exception as e:
-        api_ok = False
-        api_msg = f"LLM import error: {str(e)}"
+    ready, report = health.readiness()
+    llm_check = report["checks"].get("llm") or {}
     
     return jsonify({
         "server": {
             "status": "running",
             "python_version": sys.version,
-            "flask_debug": app.debug
+            "flask_debug": current_app.debug
         },
         "openai_api": {
-            "configured": api_ok,
-            "status": api_msg
+            "configured": llm_check.get("ok", False),
+            "status": llm_check.get("status", "LLM check pending")
         },
+        "health": report,
         "database": {
-            "status": "connected",
+            "status": "connected" if report["checks"].get("database", {}).get("ok") else "unavailable",
             "path": "app.db"
-        }
+        },
+        "llm_cache": response_cache.stats(),
+        "user_loader": loader_stats(),
+        "rate_limiter": limiter_stats(),
+        "chat_writer": chat_writer_stats(),
+        "retention": retention_stats()
     }), 200
 
+# ==================== METRICS ====================
+
+LLM_IN_FLIGHT = metrics.gauge("tracepoint_llm_in_flight", "Upstream LLM calls holding a scheduler slot.")
+LLM_QUEUED = metrics.gauge("tracepoint_llm_queued", "LLM calls waiting for a scheduler slot.", ("priority",))
+CHAT_WRITER_PENDING = metrics.gauge("tracepoint_chat_writer_pending", "Chat rows buffered for the background writer.")
+LLM_BREAKER_OPEN = metrics.gauge("tracepoint_llm_breaker_open", "1 while the LLM circuit breaker rejects calls.")
+SANDBOX_RUNNING = metrics.gauge("tracepoint_sandbox_running", "Sandbox runs holding an execution slot.")
+SANDBOX_QUEUED = metrics.gauge("tracepoint_sandbox_queued", "Sandbox runs waiting for an execution slot.")
+
+@metrics.register_collector
+def _runtime_gauges():
+    limiter = limiter_stats()
+    if limiter:
+        LLM_IN_FLIGHT.set(limiter["in_flight"])
+        for priority, depth in limiter["queued"].items():
+            LLM_QUEUED.set(depth, priority=priority)
+    CHAT_WRITER_PENDING.set(chat_writer_stats()["pending"])
+    import llm
+    LLM_BREAKER_OPEN.set(0 if llm.llm_available() else 1)
+    slots = run_slots.snapshot()
+    SANDBOX_RUNNING.set(slots["running"])
+    SANDBOX_QUEUED.set(slots["queued"])
+
+def metrics_endpoint():
+    """Prometheus scrape endpoint"""
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
 # Error handlers
-@app.errorhandler(404)
 def not_found(e):
     """404 error handler"""
     if request.path.startswith('/api/'):
         return jsonify({"error": "Endpoint not found"}), 404
     return render_template("404.html") if os.path.exists(os.path.join(TEMPLATE_FOLDER, "404.html")) else jsonify({"error": "Page not found"}), 404
 
-@app.errorhandler(500)
 def internal_error(e):
     """500 error handler"""
     print(f"❌ Internal error: {e}")
@@ -146,25 +156,99 @@ def internal_error(e):
         return jsonify({"error": "Internal server error"}), 500
     return jsonify({"error": "Internal server error. Please try again."}), 500
 
-@app.errorhandler(413)
 def request_entity_too_large(e):
     """413 error handler - file too large"""
     return jsonify({"error": "File too large. Maximum size is 10MB."}), 413
 
-@app.before_request
+def rate_limited_error(e):
+    """429 with Retry-After when a user's LLM budget or the queue is exhausted"""
+    retry_after = math.ceil(e.retry_after)
+    response = jsonify({"error": str(e), "retry_after": retry_after})
+    response.status_code = 429
+    response.headers["Retry-After"] = str(retry_after)
+    return response
+
 def log_request():
     """Log all requests in debug mode"""
-    if app.debug:
+    g.request_started = time.perf_counter()
+    # Per worker, after gunicorn forks
+    metrics.start_multiprocess()
+    health.start_prober()
+    if current_app.debug:
         print(f"📥 {request.method} {request.path}")
 
-@app.after_request
 def after_request(response):
     """Add security headers"""
     response.headers["X-Content-Type-Options"] = "nosniff"
     response.headers["X-Frame-Options"] = "SAMEORIGIN"
     response.headers["X-XSS-Protection"] = "1; mode=block"
+    
+    started = g.get("request_started")
+    if started is not None:
+        # Route template, not the raw path, so label values stay bounded
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        metrics.HTTP_SECONDS.observe(
+            time.perf_counter() - started,
+            method=request.method, route=route, status=response.status_code
+        )
     return response
 
+# ==================== APP FACTORY ====================
+
+def create_app(config=None):
+    """
+    Build and configure the Flask app. Cheap by design (a few ms): no
+    database, network or LLM work happens here; see initialize_app for
+    the one-time setup a server process runs before taking traffic.
+    """
+    app = Flask(
+        __name__,
+        template_folder=TEMPLATE_FOLDER,
+        static_folder=STATIC_FOLDER,
+    )
+    
+    # Security configuration
+    app.config["SECRET_KEY"] = os.getenv("SECRET_KEY", "tracepoint-secure-key-2026-change-in-production")
+    app.config["MAX_CONTENT_LENGTH"] = 10 * 1024 * 1024  # 10MB max upload
+    app.config["SESSION_COOKIE_SECURE"] = False  # Set True in production with HTTPS
+    app.config["SESSION_COOKIE_HTTPONLY"] = True
+    app.config["SESSION_COOKIE_SAMESITE"] = "Lax"
+    app.config.update(config or {})
+    
+    # Enable CORS
+    CORS(app, resources={
+        r"/api/*": {"origins": "*"},
+        r"/analyze": {"origins": "*"},
+        r"/chat": {"origins": "*"}
+    })
+    
+    login_manager.init_app(app)
+    
+    # Register blueprints
+    app.register_blueprint(auth)
+    app.register_blueprint(analyze)
+    app.register_blueprint(chat)
+    app.register_blueprint(forensic)
+    
+    # Routes
+    app.add_url_rule("/", view_func=index)
+    app.add_url_rule("/dashboard", view_func=dashboard)
+    app.add_url_rule("/health", view_func=health_check)
+    app.add_url_rule("/health/live", view_func=health_live)
+    app.add_url_rule("/health/ready", view_func=health_ready)
+    app.add_url_rule("/api/status", view_func=api_status)
+    app.add_url_rule("/metrics", view_func=metrics_endpoint)
+    
+    # Error handlers
+    app.register_error_handler(404, not_found)
+    app.register_error_handler(500, internal_error)
+    app.register_error_handler(413, request_entity_too_large)
+    app.register_error_handler(RateLimited, rate_limited_error)
+    
+    app.before_request(log_request)
+    app.after_request(after_request)
+    return app
+
 def initialize_app():
     """Initialize application components"""
     print("\n" + "="*70)
@@ -180,6 +264,12 @@ def initialize_app():
         print(f"❌ Database initialization failed: {e}")
         return False
     
+    recover_orphaned_jobs()
+    if start_retention():
+        print("🗄️ Chat retention running in the background")
+    if health.start_prober():
+        print(f"🏥 Health prober running every {health.HEALTH_INTERVAL:g}s")
+    
     # Create directories
     print("\n📁 Creating directories...")
     try:
@@ -191,27 +281,19 @@ def initialize_app():
         print(f"❌ Directory creation failed: {e}")
         return False
     
-    # Test LLM connection
-    print("\n🤖 Testing LLM connection...")
-    try:
-        import llm
-        api_ok, api_msg = llm.test_llm_connection()
-        print(api_msg)
-        
-        if not api_ok:
-            print("\n⚠️  WARNING: OpenAI API not configured!")
-            print("   The app will run with limited functionality.")
-            print("   To enable AI features:")
-            print("   1. Get API key from: https://platform.openai.com/api-keys")
-            print("   2. Set: export OPENAI_API_KEY='your-key-here'")
-            print("   3. Restart the application")
-    except ImportError as e:
-        print(f"❌ Failed to import llm module: {e}")
-        print("   Make sure llm.py is in the same directory as app.py")
-        return False
-    except Exception as e:
-        print(f"⚠️  LLM test failed: {e}")
-        print("   The app will start but AI features may not work")
+    # LLM configuration (no network call; the client is built on first use)
+    print("\n🤖 Checking LLM configuration...")
+    import llm
+    api_ok, api_msg = llm.test_llm_connection()
+    print(api_msg)
+    
+    if not api_ok:
+        print("\n⚠️  WARNING: Gemini API not configured!")
+        print("   The app will run with limited functionality.")
+        print("   To enable AI features:")
+        print("   1. Get API key from: https://aistudio.google.com/apikey")
+        print("   2. Set: export GEMINI_API_KEY='your-key-here'")
+        print("   3. Restart the application")
     
     print("\n" + "="*70)
     print("✅ SERVER READY")
@@ -220,11 +302,14 @@ def initialize_app():
     print(f"📊 Dashboard: http://localhost:5000/dashboard")
     print(f"🔬 Analyze: http://localhost:5000/analyze/page")
     print(f"💬 Chat: http://localhost:5000/chat/page")
+    print(f"🕵️ Forensic: http://localhost:5000/forensic")
     print(f"🏥 Health: http://localhost:5000/health")
     print("="*70 + "\n")
     
     return True
 
+app = create_app()
+
 if __name__ == "__main__":
     if initialize_app():
         # Run server
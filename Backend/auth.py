@@ -1,9 +1,25 @@
-from flask import Blueprint, render_template, request, redirect, flash, url_for
-from flask_login import login_user, logout_user, UserMixin, current_user
-from db import create_user, get_user_by_email, verify_user
+from flask import Blueprint, render_template, request, redirect, flash, url_for, session
+from flask_login import login_user, logout_user, login_required, UserMixin, current_user
+from db import create_user, get_user_by_email, get_user_by_id, verify_user, update_user_password
+from cache import LRUCache
+import os
+import threading
 
 auth = Blueprint("auth", __name__)
 
+# ==================== USER LOADER CACHE ====================
+# Flask-Login resolves the user on every authenticated request. The minimal
+# identity lives in the signed session, with a small TTL'd cache behind it,
+# so the hot path does not touch SQLite.
+
+USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", "1024"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "300"))
+SESSION_IDENTITY_KEY = "_tp_identity"
+
+_user_cache = LRUCache(USER_CACHE_MAX_ENTRIES, USER_CACHE_TTL)
+_loader_counts = {"lookups": 0, "session_hits": 0, "cache_hits": 0, "db_loads": 0}
+_loader_lock = threading.Lock()
+
 class User(UserMixin):
     def __init__(self, row):
         self.id = row[0]
@@ -12,6 +28,62 @@ class User(UserMixin):
     
     def get_id(self):
         return str(self.id)
+    
+    def identity(self):
+        return [self.id, self.username, self.email]
+
+
+def _count(name):
+    with _loader_lock:
+        _loader_counts[name] += 1
+
+def remember_identity(user):
+    """Store the minimal identity in the signed session"""
+    session[SESSION_IDENTITY_KEY] = user.identity()
+
+def invalidate_user(user_id):
+    """Drop cached identity for user_id (and from this session)"""
+    _user_cache.delete(str(user_id))
+    identity = session.get(SESSION_IDENTITY_KEY)
+    if identity and str(identity[0]) == str(user_id):
+        session.pop(SESSION_IDENTITY_KEY, None)
+
+def load_cached_user(user_id):
+    """
+    user_loader implementation: session identity, then cache, then DB.
+    """
+    _count("lookups")
+    user_id = str(user_id)
+    
+    identity = session.get(SESSION_IDENTITY_KEY)
+    if identity and str(identity[0]) == user_id:
+        _count("session_hits")
+        return User(identity)
+    
+    user = _user_cache.get(user_id)
+    if user is not None:
+        _count("cache_hits")
+    else:
+        row = get_user_by_id(user_id)
+        _count("db_loads")
+        if not row:
+            return None
+        user = User(row)
+        _user_cache.set(user_id, user)
+    
+    # Restored from a remember-me cookie: seed the session for next time
+    remember_identity(user)
+    return user
+
+def loader_stats():
+    """Counters showing how user lookups were served"""
+    with _loader_lock:
+        stats = dict(_loader_counts)
+    served = stats["session_hits"] + stats["cache_hits"]
+    stats["served_from_cache"] = served
+    stats["cache_hit_rate"] = round(served / stats["lookups"], 4) if stats["lookups"] else 0.0
+    stats["cache_entries"] = len(_user_cache)
+    return stats
 
 @auth.route("/signup", methods=["GET", "POST"])
 def signup():
@@ -37,6 +109,9 @@ def signup():
         
         try:
             create_user(username, email, password)
+            user_row = get_user_by_email(email)
+            if user_row:
+                invalidate_user(user_row[0])
             flash("Account created successfully! Please log in.", "success")
             return redirect(url_for("auth.login"))
         except ValueError as e:
@@ -63,6 +138,7 @@ def login():
         if user_row:
             user = User(user_row)
             login_user(user, remember=True)
+            remember_identity(user)
             
             next_page = request.args.get("next")
             if next_page:
@@ -75,6 +151,27 @@ def login():
 
 @auth.route("/logout")
 def logout():
+    if current_user.is_authenticated:
+        invalidate_user(current_user.id)
     logout_user()
     flash("You have been logged out", "success")
     return redirect(url_for("index"))
+
+@auth.route("/password", methods=["POST"])
+@login_required
+def change_password():
+    current_password = request.form.get("current_password", "")
+    new_password = request.form.get("new_password", "")
+    
+    if not verify_user(current_user.email, current_password):
+        flash("Current password is incorrect", "error")
+        return redirect(url_for("dashboard"))
+    
+    if len(new_password) < 6:
+        flash("Password must be at least 6 characters", "error")
+        return redirect(url_for("dashboard"))
+    
+    update_user_password(current_user.id, new_password)
+    invalidate_user(current_user.id)
+    flash("Password updated", "success")
+    return redirect(url_for("dashboard"))
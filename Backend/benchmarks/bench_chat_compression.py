@@ -0,0 +1,128 @@
+"""
+Chat payload compression report: bytes saved, dictionary vs no dictionary.
+
+Runs against a copy of a real database (recommended) or a synthetic one.
+Applies pending migrations, optionally compresses the pre-migration
+backlog, then prints db.chat_compression_report() and compares deflate
+with and without the trained dictionary on a sample of responses.
+
+Usage (from Backend/):
+    python benchmarks/bench_chat_compression.py --db /tmp/app-copy.db [--apply]
+    python benchmarks/bench_chat_compression.py --synthetic 5000 [--apply]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import zlib
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import db
+
+TOPICS = ["loops", "recursion", "list comprehensions", "decorators", "closures", "generators",
+          "exceptions", "classes", "dictionaries", "sorting", "file handling", "async code"]
+SECTIONS = ["## 📝 Explanation", "## 🔍 What the code does", "## ⚠️ Common mistakes",
+            "## ✅ Suggested fix", "## 💡 Example", "## 🧠 Key idea"]
+
+
+def synthetic_response(rng, i):
+    """Markdown shaped like our LLM answers, with enough variety not to be trivial"""
+    topic = rng.choice(TOPICS)
+    parts = []
+    for section in rng.sample(SECTIONS, rng.randint(2, 4)):
+        words = " ".join(rng.choice(["the", "value", "function", "returns", "list", "each", "item",
+                                     "when", "you", "call", topic, f"x{rng.randint(0, 999)}"])
+                         for _ in range(rng.randint(20, 60)))
+        parts.append(f"{section}\n{words.capitalize()}.")
+    parts.append(f"```python\ndef example_{i}(items):\n    return [item * {rng.randint(2, 9)} for item in items]\n```")
+    return "\n\n".join(parts)
+
+
+def build_synthetic(path, rows):
+    conn = db._open_conn(path)
+    conn.execute("""
+    CREATE TABLE chat_history (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        message TEXT NOT NULL,
+        response TEXT NOT NULL,
+        timestamp TEXT DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    rng = random.Random(7)
+    conn.executemany(
+        "INSERT INTO chat_history (user_id, message, response) VALUES (?, ?, ?)",
+        [(rng.randint(1, 50), f"How do {rng.choice(TOPICS)} work? ({i})", synthetic_response(rng, i))
+         for i in range(rows)]
+    )
+    conn.commit()
+    conn.close()
+
+
+def compare_dictionary(sample):
+    """Total deflate output for the sample with the active dictionary vs none"""
+    dict_id, zdict = db._current_zdict()
+    raw = plain = primed = 0
+    for text in sample:
+        data = text.encode("utf-8")
+        raw += len(data)
+        comp = zlib.compressobj(db.CHAT_COMPRESS_LEVEL, zlib.DEFLATED, -15)
+        plain += len(comp.compress(data) + comp.flush())
+        comp = zlib.compressobj(db.CHAT_COMPRESS_LEVEL, zlib.DEFLATED, -15, 9, zlib.Z_DEFAULT_STRATEGY, zdict)
+        primed += len(comp.compress(data) + comp.flush())
+    return dict_id, len(zdict), raw, plain, primed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", help="database file (work on a copy)")
+    parser.add_argument("--synthetic", type=int, default=0, help="build a synthetic database with N turns")
+    parser.add_argument("--apply", action="store_true", help="compress the pre-migration backlog")
+    parser.add_argument("--sample", type=int, default=500)
+    args = parser.parse_args()
+
+    if args.synthetic:
+        args.db = args.db or tempfile.mktemp(suffix=".db")
+        build_synthetic(args.db, args.synthetic)
+        print(f"📦 Built {args.synthetic:,} synthetic turns in {args.db}")
+    if not args.db:
+        parser.error("pass --db or --synthetic")
+
+    db.DB_PATH = args.db
+    db.migrate()
+
+    if args.apply:
+        started = time.perf_counter()
+        backlog = db.compress_chat_backlog()
+        print(f"🗜️ Backfill: {backlog['rows']:,} rows, {backlog['bytes_before']:,} -> "
+              f"{backlog['bytes_after']:,} bytes in {time.perf_counter() - started:.1f}s")
+
+    report = db.chat_compression_report()
+    print("\ncolumn     rows   compressed   stored bytes      raw bytes    saved")
+    for column in ("message", "response"):
+        r = report[column]
+        ratio = r["raw_bytes"] / r["stored_bytes"] if r["stored_bytes"] else 0
+        print(f"{column:<9} {r['rows']:>6} {r['compressed_rows']:>12} {r['stored_bytes']:>14,} "
+              f"{r['raw_bytes']:>14,}  {r['saved_bytes']:>8,} ({ratio:.2f}x)")
+    print(f"pages: {report['page_count']:,} ({report['freelist_count']:,} free)")
+
+    with db.get_conn() as conn:
+        sample = [row[0] for row in conn.execute(
+            "SELECT tp_decompress(response) FROM chat_history WHERE length(tp_decompress(response)) >= ? "
+            "ORDER BY random() LIMIT ?",
+            (db.CHAT_COMPRESS_MIN_CHARS, args.sample)
+        )]
+    if sample:
+        dict_id, dict_size, raw, plain, primed = compare_dictionary(sample)
+        print(f"\nsample of {len(sample)} responses, {raw:,} bytes:")
+        print(f"  deflate alone:            {plain:>10,} bytes ({raw / plain:.2f}x)")
+        print(f"  deflate + dictionary {dict_id:<3} {primed:>10,} bytes ({raw / primed:.2f}x, "
+              f"dictionary {dict_size:,} bytes)")
+
+
+if __name__ == "__main__":
+    main()
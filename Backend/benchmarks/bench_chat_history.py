@@ -0,0 +1,158 @@
+"""
+Chat history query benchmark: baseline schema vs migrated schema.
+
+Builds a chat_history table with the original indexes (user_id and
+timestamp), measures the per-user queries the app runs, applies
+db.migrate() and measures again. Prints EXPLAIN QUERY PLAN for each query.
+
+Usage (from Backend/):
+    python benchmarks/bench_chat_history.py [--rows 10000000] [--users 20000]
+        [--db /tmp/bench_chat.db] [--runs 200]
+
+The power user owns --power-share of all rows (default 0.5%, 50k turns
+at 10M rows); the rest are spread evenly over the other users.
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import db
+
+QUERIES = {
+    "history latest 50": (
+        "SELECT id, message, response, timestamp FROM chat_history "
+        "WHERE user_id=? AND id<? ORDER BY id DESC LIMIT 50",
+        lambda uid, mid: (uid, 2 ** 63 - 1),
+    ),
+    "history deep page": (
+        "SELECT id, message, response, timestamp FROM chat_history "
+        "WHERE user_id=? AND id<? ORDER BY id DESC LIMIT 50",
+        lambda uid, mid: (uid, mid),
+    ),
+    "sessions latest 20": (
+        "SELECT id, message, timestamp FROM chat_history "
+        "WHERE user_id=? ORDER BY id DESC LIMIT 20",
+        lambda uid, mid: (uid,),
+    ),
+    "count (scan)": (
+        "SELECT COUNT(*) FROM chat_history WHERE user_id=?",
+        lambda uid, mid: (uid,),
+    ),
+}
+
+COUNTER_QUERY = ("count (counter)", "SELECT total FROM chat_counts WHERE user_id=?")
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def build(path, rows, users, power_share):
+    """Baseline schema (as before migrations) filled with synthetic turns"""
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    conn = db._open_conn(path)
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("""
+    CREATE TABLE chat_history (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        message TEXT NOT NULL,
+        response TEXT NOT NULL,
+        timestamp TEXT DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    power_rows = int(rows * power_share)
+    rng = random.Random(42)
+
+    def generate():
+        for i in range(rows):
+            # Power user's turns are interleaved through the whole table
+            user_id = 1 if rng.random() < power_share and power_rows else rng.randint(2, users)
+            yield (user_id, f"question {i} about loops", f"answer {i}: loops repeat a block", f"2026-01-01T00:00:{i % 60:02d}")
+
+    started = time.perf_counter()
+    batch = []
+    for row in generate():
+        batch.append(row)
+        if len(batch) == 100_000:
+            conn.executemany("INSERT INTO chat_history (user_id, message, response, timestamp) VALUES (?, ?, ?, ?)", batch)
+            conn.commit()
+            batch.clear()
+    if batch:
+        conn.executemany("INSERT INTO chat_history (user_id, message, response, timestamp) VALUES (?, ?, ?, ?)", batch)
+    conn.execute("CREATE INDEX idx_chat_user_id ON chat_history(user_id)")
+    conn.execute("CREATE INDEX idx_chat_timestamp ON chat_history(timestamp)")
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.close()
+    print(f"📦 Built {rows:,} rows for {users:,} users in {time.perf_counter() - started:.1f}s")
+
+
+def measure(conn, label, sql, params, runs):
+    plan = " | ".join(row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params))
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        conn.execute(sql, params).fetchall()
+        samples.append((time.perf_counter() - start) * 1000)
+    print(f"  {label:<20} p50={percentile(samples, 50):8.3f} ms  p99={percentile(samples, 99):8.3f} ms  "
+          f"mean={statistics.mean(samples):8.3f} ms")
+    print(f"  {'':<20} plan: {plan}")
+
+
+def run_suite(conn, users, runs, with_counter):
+    power_mid = conn.execute(
+        "SELECT id FROM chat_history WHERE user_id=1 ORDER BY id LIMIT 1 OFFSET "
+        "(SELECT COUNT(*) / 2 FROM chat_history WHERE user_id=1)"
+    ).fetchone()
+    typical = users // 2
+    for who, uid, mid in (("power user", 1, power_mid[0] if power_mid else 1), ("typical user", typical, 2 ** 62)):
+        count = conn.execute("SELECT COUNT(*) FROM chat_history WHERE user_id=?", (uid,)).fetchone()[0]
+        print(f" {who} (user {uid}, {count:,} turns)")
+        for label, (sql, params) in QUERIES.items():
+            measure(conn, label, sql, params(uid, mid), runs)
+        if with_counter:
+            measure(conn, COUNTER_QUERY[0], COUNTER_QUERY[1], (uid,), runs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--users", type=int, default=20_000)
+    parser.add_argument("--power-share", type=float, default=0.005)
+    parser.add_argument("--db", default=os.path.join("/tmp", "bench_chat.db"))
+    parser.add_argument("--runs", type=int, default=200)
+    parser.add_argument("--reuse", action="store_true", help="skip building if --db exists")
+    args = parser.parse_args()
+
+    if not (args.reuse and os.path.exists(args.db)):
+        build(args.db, args.rows, args.users, args.power_share)
+
+    db.DB_PATH = args.db
+    conn = db.get_conn()
+
+    print(f"\nBEFORE (schema version {db.schema_version(conn)})")
+    run_suite(conn, args.users, args.runs, with_counter=False)
+
+    started = time.perf_counter()
+    # Only the index and counter migrations; later ones rewrite data this benchmark doesn't measure
+    db.migrate(target=2)
+    conn.execute("ANALYZE")
+    print(f"\nmigrations took {time.perf_counter() - started:.1f}s")
+
+    print(f"\nAFTER (schema version {db.schema_version(conn)})")
+    run_suite(conn, args.users, args.runs, with_counter=True)
+
+
+if __name__ == "__main__":
+    main()
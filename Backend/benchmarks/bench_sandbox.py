@@ -0,0 +1,142 @@
+"""
+Sandbox latency benchmark: cold interpreter start vs warm worker pool.
+
+--parallel N also pushes --runs mixed-language runs through
+sandbox.execute from N threads (so through the run slots, SANDBOX_MAX_CONCURRENT)
+and reports throughput, queue wait and per-run CPU time / peak RSS.
+--limits runs a few abusive snippets (huge output, memory hog, fork bomb,
+busy loop) and prints how each one was stopped.
+
+Usage (from Backend/):
+    python benchmarks/bench_sandbox.py [--runs 200] [--langs py,js] [--parallel 8] [--limits]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import sandbox
+import sandbox_limits
+import sandbox_pool
+
+SNIPPETS = {
+    "py": "total = sum(i * i for i in range(1000))\nprint(total)",
+    "js": "let total = 0; for (let i = 0; i < 1000; i++) total += i * i; console.log(total);",
+}
+
+ABUSE = {
+    "huge output": ("py", "while True:\n    print('x' * 1000)"),
+    "memory hog": ("py", "blocks = []\nwhile True:\n    blocks.append(bytearray(16 * 1024 * 1024))"),
+    "fork bomb": ("py", "import os\nwhile True:\n    os.fork()"),
+    "busy loop": ("py", "while True:\n    pass"),
+    "js huge output": ("js", "while (true) console.log('x'.repeat(1000));"),
+    "js memory hog": ("js", "const a = []; while (true) a.push(new Array(1e6).fill(1.5));"),
+}
+
+COLD_CONFIG = {
+    "py": {"ext": ".py", "cmd": ["python3"]},
+    "js": {"ext": ".js", "cmd": ["node"]},
+}
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def measure(fn, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def report(label, samples):
+    print(
+        f"  {label:<6} p50={percentile(samples, 50):8.2f} ms  "
+        f"p99={percentile(samples, 99):8.2f} ms  mean={statistics.mean(samples):8.2f} ms"
+    )
+
+
+def parallel(langs, runs, threads):
+    """Mixed-language runs through sandbox.execute from many threads"""
+    jobs = [langs[i % len(langs)] for i in range(runs)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        reports = list(executor.map(lambda lang: sandbox.execute(SNIPPETS[lang], lang), jobs))
+    elapsed = time.perf_counter() - started
+
+    slots = sandbox.run_slots.snapshot()
+    print(f"parallel: {runs} runs from {threads} threads, {slots['limit']} slots, {runs / elapsed:.1f} runs/s")
+    for lang in langs:
+        done = [r for job, r in zip(jobs, reports) if job == lang and r["outcome"] == "ok"]
+        if not done:
+            print(f"  {lang}: no successful runs")
+            continue
+        wall = [r["wall_seconds"] * 1000 for r in done]
+        queued = [r["queued_seconds"] * 1000 for r in done]
+        print(
+            f"  {lang:<4} ok={len(done):<5} wall p50={percentile(wall, 50):7.2f} ms p99={percentile(wall, 99):7.2f} ms  "
+            f"queued p99={percentile(queued, 99):7.2f} ms  "
+            f"cpu mean={statistics.mean(r['cpu_seconds'] for r in done) * 1000:6.2f} ms  "
+            f"peak rss max={max(r['peak_rss_kb'] for r in done) / 1024:6.1f} MB"
+        )
+    failed = [r["outcome"] for r in reports if r["outcome"] != "ok"]
+    if failed:
+        print(f"  not ok: {dict((o, failed.count(o)) for o in set(failed))}")
+
+
+def limits():
+    """How the resource caps stop abusive snippets"""
+    print(f"limits: cpu={sandbox_limits.cpu_seconds_for(5)}s memory={sandbox_limits.SANDBOX_MEMORY_MB} MB "
+          f"procs={sandbox_limits.SANDBOX_MAX_PROCS} output={sandbox_limits.SANDBOX_MAX_OUTPUT} bytes "
+          f"cgroup={'yes' if sandbox_limits.SANDBOX_CGROUP_ROOT else 'no'}")
+    for name, (lang, code) in ABUSE.items():
+        report = sandbox.execute(code, lang)
+        cpu = report["cpu_seconds"]
+        rss = report["peak_rss_kb"]
+        print(
+            f"  {name:<15} {report['outcome']:<8} wall={report['wall_seconds']:6.2f}s "
+            f"cpu={'-' if cpu is None else f'{cpu:.2f}s':>6} "
+            f"rss={'-' if rss is None else f'{rss / 1024:.0f} MB':>7}  {report['output'].splitlines()[0][:60]}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=200)
+    parser.add_argument("--langs", default="py,js")
+    parser.add_argument("--parallel", type=int, default=0, help="threads for the concurrent run")
+    parser.add_argument("--limits", action="store_true", help="run the abusive snippets")
+    args = parser.parse_args()
+
+    for lang in args.langs.split(","):
+        code = SNIPPETS[lang]
+        print(f"{lang}: {args.runs} runs")
+
+        cold = measure(lambda: sandbox._run_cold(code, lang, COLD_CONFIG[lang]), args.runs)
+        report("cold", cold)
+
+        pool = sandbox_pool.get_pool(lang)
+        pool.run(code)  # first request may land on a worker still starting up
+        warm = measure(lambda: pool.run(code), args.runs)
+        report("pool", warm)
+
+    if args.parallel:
+        parallel(args.langs.split(","), args.runs, args.parallel)
+    if args.limits:
+        limits()
+
+    sandbox_pool.shutdown_pools()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""
+Startup benchmark: import-time profile and time to first request.
+
+Every measurement runs in a fresh interpreter, like a new gunicorn worker:
+
+  import app          module import (blueprints, db, llm, ...)
+  create_app()        building one more app instance
+  first request       GET /health/live through the test client
+  first LLM request   POST /analyze with the stub LLM (builds the lazy
+                      client and loads google.genai on this request,
+                      since the health prober that normally pre-warms
+                      it is disabled here)
+  next LLM request    POST /analyze again, different code
+
+--importtime prints the slowest modules from `python -X importtime`.
+--server dev|gunicorn also times spawning a real server until
+/health/live answers (gunicorn must be installed).
+
+Usage (from Backend/):
+    python benchmarks/bench_startup.py [--runs 5] [--importtime] [--server gunicorn]
+        [--budget-ms 500]
+
+Exits with status 1 if the median import + create_app + first request
+exceeds --budget-ms.
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+CHILD = r'''
+import json, time
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+extra = app.create_app()
+t2 = time.perf_counter()
+import db
+db.init_db()
+db.create_user("bench", "bench@example.com", "bench-password")
+client = app.app.test_client()
+t3 = time.perf_counter()
+client.get("/health/live")
+t4 = time.perf_counter()
+client.post("/login", data={"email": "bench@example.com", "password": "bench-password"})
+t5 = time.perf_counter()
+client.post("/analyze", json={"code": "print('first')", "lang": "py"})
+t6 = time.perf_counter()
+client.post("/analyze", json={"code": "print('second')", "lang": "py"})
+t7 = time.perf_counter()
+print(json.dumps({
+    "import app": (t1 - t0) * 1000,
+    "create_app()": (t2 - t1) * 1000,
+    "first request": (t4 - t3) * 1000,
+    "first LLM request": (t6 - t5) * 1000,
+    "next LLM request": (t7 - t6) * 1000,
+}))
+'''
+
+PHASES = ["import app", "create_app()", "first request", "first LLM request", "next LLM request"]
+BUDGET_PHASES = ["import app", "create_app()", "first request"]
+
+
+def child_env(db_path):
+    env = dict(os.environ)
+    env.update({
+        "DB_PATH": db_path,
+        "LLM_PROVIDER": "stub",
+        "LLM_STUB_LATENCY": "fixed:0",
+        "LLM_CACHE_PERSIST": "0",
+        "RATE_LIMIT_ENABLED": "0",
+        "CHAT_RETENTION_INTERVAL": "0",
+        "HEALTH_INTERVAL": "0",
+    })
+    return env
+
+
+def run_child(workdir):
+    db_path = tempfile.mktemp(suffix=".db", dir=workdir)
+    out = subprocess.run(
+        [sys.executable, "-c", CHILD], cwd=BACKEND_DIR, env=child_env(db_path),
+        capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def import_profile(top):
+    """Slowest modules by cumulative import time (microseconds from -X importtime)"""
+    err = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"], cwd=BACKEND_DIR,
+        env=child_env(tempfile.mktemp(suffix=".db")), capture_output=True, text=True, check=True,
+    ).stderr
+    rows = []
+    for line in err.splitlines():
+        if not line.startswith("import time:") or "|" not in line or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative_us), int(self_us), name.rstrip()))
+    rows.sort(reverse=True)
+    print(f"\nimport profile (top {top} by cumulative time)")
+    print(f"  {'cumulative':>10} {'self':>8}  module")
+    for cumulative_us, self_us, name in rows[:top]:
+        print(f"  {cumulative_us / 1000:>8.1f}ms {self_us / 1000:>6.1f}ms  {name}")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def time_server(kind, workers, workdir):
+    """Seconds from spawning the server to the first 200 from /health/live"""
+    port = free_port()
+    db_path = tempfile.mktemp(suffix=".db", dir=workdir)
+    env = child_env(db_path)
+    subprocess.run([sys.executable, "-c", "import db; db.init_db()"], cwd=BACKEND_DIR, env=env,
+                   capture_output=True, check=True)
+    if kind == "dev":
+        cmd = [sys.executable, "-c", f"import app; app.app.run(port={port}, threaded=True, debug=False)"]
+    else:
+        cmd = ["gunicorn", "app:app", "--bind", f"127.0.0.1:{port}", "--workers", str(workers)]
+    started = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - started < 30:
+            if proc.poll() is not None:
+                raise RuntimeError(f"{kind} server exited early")
+            try:
+                urllib.request.urlopen(f"http://127.0.0.1:{port}/health/live", timeout=1).read()
+                return time.perf_counter() - started
+            except (urllib.error.URLError, OSError):
+                time.sleep(0.01)
+        raise RuntimeError(f"{kind} server did not come up")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--importtime", action="store_true", help="print the slowest imports")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--server", choices=["dev", "gunicorn"], help="also time a real server spawn")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("STARTUP_BUDGET_MS", "500")),
+                        help="cold-start budget for import + create_app + first request")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="tracepoint-startup-") as workdir:
+        samples = {phase: [] for phase in PHASES}
+        cold = []
+        for _ in range(args.runs):
+            result = run_child(workdir)
+            for phase in PHASES:
+                samples[phase].append(result[phase])
+            cold.append(sum(result[phase] for phase in BUDGET_PHASES))
+
+        print(f"fresh interpreter, {args.runs} runs (ms)")
+        for phase in PHASES:
+            values = samples[phase]
+            print(f"  {phase:<20} median={statistics.median(values):8.1f}  min={min(values):8.1f}  max={max(values):8.1f}")
+        cold_median = statistics.median(cold)
+        print(f"  {'cold start':<20} median={cold_median:8.1f}  (budget {args.budget_ms:g})")
+
+        if args.importtime:
+            import_profile(args.top)
+
+        if args.server:
+            spawns = [time_server(args.server, args.workers, workdir) for _ in range(args.runs)]
+            print(f"\n{args.server} spawn to first /health/live: median={statistics.median(spawns) * 1000:.0f} ms "
+                  f"min={min(spawns) * 1000:.0f} ms max={max(spawns) * 1000:.0f} ms")
+
+    if cold_median > args.budget_ms:
+        print(f"\n❌ Cold start {cold_median:.0f} ms exceeds the {args.budget_ms:g} ms budget")
+        sys.exit(1)
+    print(f"\n✅ Cold start within the {args.budget_ms:g} ms budget")
+
+
+if __name__ == "__main__":
+    main()
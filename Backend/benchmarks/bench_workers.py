@@ -0,0 +1,95 @@
+"""
+gunicorn worker model comparison: sync vs gthread vs gevent.
+
+Runs benchmarks/loadtest.py once per worker class against a fresh
+gunicorn (gunicorn.conf.py, stub LLM) and prints one line per class:
+overall throughput, the slowest endpoint p99 and the error count.
+Per-endpoint reports are kept as JSON next to each other in --out.
+
+The stub's latency (LLM_STUB_LATENCY, default lognormal ~800 ms) stands
+in for Gemini, so the comparison is about waiting on I/O, which is
+what our endpoints mostly do. Classes whose dependency is missing (gevent)
+are reported as skipped.
+
+Usage (from Backend/):
+    python benchmarks/bench_workers.py [--classes sync,gthread,gevent] [--workers 2]
+        [--threads 16] [--connections 256] [--concurrency 64] [--duration 30]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def available(worker_class):
+    """gunicorn can load the worker class here (gevent is optional)"""
+    module = {"sync": "gunicorn.workers.sync", "gthread": "gunicorn.workers.gthread",
+              "gevent": "gunicorn.workers.ggevent"}[worker_class]
+    probe = subprocess.run([sys.executable, "-c", f"import {module}"], capture_output=True, text=True)
+    return probe.returncode == 0, probe.stderr.strip().splitlines()[-1:] or [""]
+
+
+def run(worker_class, args, out_dir):
+    report_path = os.path.join(out_dir, f"workers-{worker_class}.json")
+    env = dict(os.environ, WEB_WORKER_CONNECTIONS=str(args.connections))
+    cmd = [
+        sys.executable, "benchmarks/loadtest.py", "--server", "gunicorn",
+        "--worker-class", worker_class, "--workers", str(args.workers), "--threads", str(args.threads),
+        "--concurrency", str(args.concurrency), "--duration", str(args.duration),
+        "--warmup", str(args.warmup), "--users", str(args.users), "--port", str(args.port),
+        "--json", report_path,
+    ]
+    subprocess.run(cmd, cwd=BACKEND_DIR, env=env, check=True,
+                   stdout=None if args.verbose else subprocess.DEVNULL)
+    with open(report_path) as f:
+        return json.load(f)["endpoints"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--classes", default="sync,gthread,gevent")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=16, help="gthread threads per worker")
+    parser.add_argument("--connections", type=int, default=256, help="gevent connections per worker")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--users", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--warmup", type=float, default=5)
+    parser.add_argument("--port", type=int, default=5056)
+    parser.add_argument("--out", help="directory for the per-class JSON reports")
+    parser.add_argument("--verbose", action="store_true", help="show each loadtest run")
+    args = parser.parse_args()
+
+    out_dir = args.out or tempfile.mkdtemp(prefix="tracepoint-workers-")
+    os.makedirs(out_dir, exist_ok=True)
+    rows = []
+    for worker_class in [c.strip() for c in args.classes.split(",") if c.strip()]:
+        ok, reason = available(worker_class)
+        if not ok:
+            rows.append((worker_class, None, reason[0]))
+            continue
+        print(f"⏱️ {worker_class}: {args.workers} workers, {args.concurrency} clients, {args.duration:.0f}s ...")
+        rows.append((worker_class, run(worker_class, args, out_dir), ""))
+
+    print(f"\n{'class':<9}{'reqs':>8}{'rps':>9}{'err':>6}{'worst p50':>11}{'worst p99':>11}  slowest endpoint")
+    for worker_class, report, reason in rows:
+        if report is None:
+            print(f"{worker_class:<9} skipped: {reason}")
+            continue
+        reqs = sum(r["requests"] for r in report.values())
+        errors = sum(r["errors"] for r in report.values())
+        slowest = max(report, key=lambda name: report[name]["p99_ms"])
+        print(
+            f"{worker_class:<9}{reqs:>8}{reqs / args.duration:>9.2f}{errors:>6}"
+            f"{max(r['p50_ms'] for r in report.values()):>11.1f}{report[slowest]['p99_ms']:>11.1f}  {slowest}"
+        )
+    print(f"\nlatencies in ms; per-endpoint reports in {out_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,379 @@
+"""
+Load-test harness: drives the Flask app with a weighted mix of
+authenticated requests and reports throughput and p50/p95/p99 latency per
+endpoint.
+
+Point it at a running server, or let it start one against a scratch
+database with the offline stub LLM (LLM_PROVIDER=stub):
+
+Usage (from Backend/):
+    python benchmarks/loadtest.py --server dev --duration 30 --concurrency 16
+    python benchmarks/loadtest.py --server gunicorn --workers 4 --threads 8
+    python benchmarks/loadtest.py --server gunicorn --worker-class gevent --workers 2
+    python benchmarks/loadtest.py --url http://127.0.0.1:5000 --users 5
+
+Stub behaviour is set through the LLM_STUB_* variables (see llm_providers.py),
+e.g. LLM_STUB_LATENCY=lognormal:800,0.5 LLM_STUB_FAILURE_RATE=0.02.
+"""
+
+import argparse
+import http.cookiejar
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+DEFAULT_MIX = "analyze=4,analyze_stream=1,chat=4,chat_stream=1,chat_code=2,forensic=1"
+
+SAMPLE_PY = '''def fizzbuzz(n):
+    out = []
+    for i in range(1, n + 1):
+        if i % 15 == 0:
+            out.append("FizzBuzz")
+        elif i % 3 == 0:
+            out.append("Fizz")
+        elif i % 5 == 0:
+            out.append("Buzz")
+        else:
+            out.append(str(i))
+    return out
+
+
+class Counter:
+    def __init__(self):
+        self.count = 0
+
+    def add(self, amount=1):
+        self.count += amount
+        return self.count
+'''
+
+# llm.py reports upstream failures as "⚠️ ..." text inside a 200 response
+DEGRADED_MARKERS = ("\u26a0".encode("utf-8"), b"\\u26a0")
+
+QUESTIONS = [
+    "What is a closure?",
+    "How do I reverse a list in Python?",
+    "Explain recursion with an example.",
+    "What is the difference between a list and a tuple?",
+    "When should I use a dictionary?",
+]
+
+# ==================== REQUEST MIX ====================
+
+def _nonce(cacheable):
+    """Make payloads unique unless the run is meant to exercise the response cache"""
+    return "" if cacheable else f"  # run {random.getrandbits(48):012x}"
+
+
+def build_request(endpoint, cacheable):
+    """Return (method, path, json_body, streaming) for one request"""
+    if endpoint == "analyze":
+        return "POST", "/analyze", {"code": SAMPLE_PY + _nonce(cacheable), "lang": "py"}, False
+    if endpoint == "analyze_stream":
+        return "POST", "/analyze/stream", {"code": SAMPLE_PY + _nonce(cacheable), "lang": "py"}, True
+    if endpoint == "chat":
+        return "POST", "/chat", {"message": random.choice(QUESTIONS) + _nonce(cacheable)}, False
+    if endpoint == "chat_stream":
+        return "POST", "/chat/stream", {"message": random.choice(QUESTIONS) + _nonce(cacheable)}, True
+    if endpoint == "chat_code":
+        body = {
+            "question": "What does fizzbuzz return?",
+            "code": SAMPLE_PY + _nonce(cacheable),
+            "language": "py",
+        }
+        return "POST", "/chat/code", body, False
+    if endpoint == "forensic":
+        body = {"code": SAMPLE_PY + _nonce(cacheable), "filename": "sample.py"}
+        return "POST", "/forensic/api", body, False
+    raise ValueError(f"Unknown endpoint '{endpoint}'")
+
+
+def parse_mix(spec):
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight or 1)
+    for name in mix:
+        build_request(name, True)  # validates the name
+    return mix
+
+# ==================== CLIENT ====================
+
+class Session:
+    """One logged-in user with its own cookie jar"""
+
+    def __init__(self, base_url, timeout):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar())
+        )
+
+    def form(self, path, fields):
+        data = urllib.parse.urlencode(fields).encode("utf-8")
+        with self.opener.open(self.base_url + path, data=data, timeout=self.timeout) as resp:
+            return resp.status, resp.geturl()
+
+    def call(self, method, path, body, streaming):
+        """
+        Perform one request.
+
+        Returns:
+            (status, total_seconds, first_byte_seconds, degraded)
+        """
+        data = json.dumps(body).encode("utf-8") if body is not None else None
+        req = urllib.request.Request(
+            self.base_url + path,
+            data=data,
+            method=method,
+            headers={"Content-Type": "application/json"},
+        )
+        start = time.perf_counter()
+        first_byte = None
+        degraded = False
+        try:
+            with self.opener.open(req, timeout=self.timeout) as resp:
+                status = resp.status
+                if streaming:
+                    while True:
+                        chunk = resp.read1(65536)
+                        if first_byte is None:
+                            first_byte = time.perf_counter() - start
+                        if not chunk:
+                            break
+                        if b"event: error" in chunk:
+                            status = 599  # stream started but failed upstream
+                        degraded = degraded or any(m in chunk for m in DEGRADED_MARKERS)
+                else:
+                    payload = resp.read()
+                    degraded = any(m in payload for m in DEGRADED_MARKERS)
+        except urllib.error.HTTPError as e:
+            status = e.code
+            e.read()
+        except (urllib.error.URLError, OSError):
+            status = 0
+        total = time.perf_counter() - start
+        return status, total, first_byte if first_byte is not None else total, degraded
+
+    def login(self, index, run_id):
+        email = f"load{run_id}-{index}@example.com"
+        password = "loadtest-password"
+        self.form("/signup", {"username": f"load{run_id}{index}", "email": email, "password": password})
+        _, final_url = self.form("/login", {"email": email, "password": password})
+        if "/login" in final_url:
+            raise RuntimeError(f"login failed for {email}")
+
+# ==================== SERVER ====================
+
+def start_server(kind, host, port, workers, threads, db_path, rate_limit=False, worker_class="gthread"):
+    """Start the app against a scratch database with the stub LLM"""
+    env = dict(os.environ)
+    env.setdefault("LLM_PROVIDER", "stub")
+    env.setdefault("LLM_CACHE_PERSIST", "0")
+    # A handful of load users would hit their per-user budgets within seconds
+    env.setdefault("RATE_LIMIT_ENABLED", "1" if rate_limit else "0")
+    if not rate_limit:
+        # The global upstream budget (RATE_GLOBAL) would cap the stub at 10 calls/s
+        env.setdefault("RATE_GLOBAL", "100000/s")
+    env["DB_PATH"] = db_path
+
+    subprocess.run([sys.executable, "-c", "import db; db.init_db()"], cwd=BACKEND_DIR, env=env, check=True)
+
+    if kind == "dev":
+        cmd = [
+            sys.executable, "-c",
+            f"import app; app.app.run(host={host!r}, port={port}, threaded=True, debug=False)",
+        ]
+    else:
+        # The production config (gunicorn.conf.py), sized through its WEB_* variables
+        env.update({
+            "WEB_BIND": f"{host}:{port}",
+            "WEB_WORKER_CLASS": worker_class,
+            "WEB_CONCURRENCY": str(workers),
+            "WEB_THREADS": str(threads),
+            "WEB_ACCESS_LOG": "",
+        })
+        cmd = ["gunicorn", "-c", "gunicorn.conf.py", "wsgi:app"]
+    log = open(db_path + ".server.log", "w")
+    proc = subprocess.Popen(cmd, cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+    url = f"http://{host}:{port}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"server exited early, see {log.name}")
+        try:
+            urllib.request.urlopen(url + "/", timeout=1).read()
+            return proc, url
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError(f"server did not come up, see {log.name}")
+
+# ==================== RUN ====================
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def preflight(session, mix):
+    """Drop endpoints the server does not expose (404) so they do not skew results"""
+    for name in list(mix):
+        method, path, body, streaming = build_request(name, False)
+        status = session.call(method, path, body, streaming)[0]
+        if status == 404:
+            print(f"⚠️ {path} is not registered on this server; dropping '{name}' from the mix")
+            del mix[name]
+    if not mix:
+        raise RuntimeError("no endpoint in the mix is available")
+
+
+def run_load(sessions, mix, concurrency, duration, warmup, cacheable):
+    names = list(mix)
+    weights = [mix[n] for n in names]
+    results = {name: [] for name in names}
+    lock = threading.Lock()
+    start = time.monotonic()
+    measure_from = start + warmup
+    stop_at = measure_from + duration
+
+    def worker(index):
+        session = sessions[index % len(sessions)]
+        rng = random.Random(index)
+        while True:
+            now = time.monotonic()
+            if now >= stop_at:
+                return
+            name = rng.choices(names, weights)[0]
+            method, path, body, streaming = build_request(name, cacheable)
+            sample = session.call(method, path, body, streaming)
+            if now >= measure_from:
+                with lock:
+                    results[name].append(sample)
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+def summarize(results, duration):
+    report = {}
+    for name, samples in results.items():
+        if not samples:
+            continue
+        latencies = [s[1] * 1000 for s in samples]
+        first_bytes = [s[2] * 1000 for s in samples]
+        statuses = {}
+        for status, _, _, _ in samples:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        errors = sum(1 for s in samples if not 200 <= s[0] < 300)
+        report[name] = {
+            "requests": len(samples),
+            "errors": errors,
+            "degraded": sum(1 for s in samples if s[3]),
+            "statuses": statuses,
+            "throughput_rps": round(len(samples) / duration, 2),
+            "p50_ms": round(percentile(latencies, 50), 1),
+            "p95_ms": round(percentile(latencies, 95), 1),
+            "p99_ms": round(percentile(latencies, 99), 1),
+            "max_ms": round(max(latencies), 1),
+            "mean_ms": round(statistics.mean(latencies), 1),
+            "ttfb_p50_ms": round(percentile(first_bytes, 50), 1),
+        }
+    return report
+
+
+def print_report(report, duration):
+    total = sum(r["requests"] for r in report.values())
+    print(f"\n{'endpoint':<15}{'reqs':>7}{'err':>6}{'llm!':>6}{'rps':>8}{'p50':>9}{'p95':>9}{'p99':>9}{'ttfb50':>9}")
+    for name, r in report.items():
+        print(
+            f"{name:<15}{r['requests']:>7}{r['errors']:>6}{r['degraded']:>6}{r['throughput_rps']:>8.2f}"
+            f"{r['p50_ms']:>9.1f}{r['p95_ms']:>9.1f}{r['p99_ms']:>9.1f}{r['ttfb_p50_ms']:>9.1f}"
+        )
+    print(f"\ntotal: {total} requests in {duration:.0f}s = {total / duration:.2f} req/s (latencies in ms)")
+    print("err = non-2xx or failed stream, llm! = 2xx carrying an upstream LLM error")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="target an already running server")
+    parser.add_argument("--server", choices=["dev", "gunicorn"], help="start a server with the stub LLM")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn workers")
+    parser.add_argument("--threads", type=int, default=8, help="gunicorn threads per worker")
+    parser.add_argument("--worker-class", choices=["gthread", "gevent", "sync"], default="gthread",
+                        help="gunicorn worker model (see gunicorn.conf.py)")
+    parser.add_argument("--users", type=int, default=8)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=30, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="unmeasured seconds before measuring")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="endpoint=weight list")
+    parser.add_argument("--rate-limit", action="store_true", help="keep per-user rate limits on in a started server")
+    parser.add_argument("--cacheable", action="store_true", help="repeat identical payloads (exercise the LLM cache)")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    if bool(args.url) == bool(args.server):
+        parser.error("pass exactly one of --url or --server")
+
+    mix = parse_mix(args.mix)
+    proc = None
+    workdir = tempfile.mkdtemp(prefix="tracepoint-load-")
+    try:
+        if args.server:
+            proc, url = start_server(
+                args.server, args.host, args.port, args.workers, args.threads,
+                os.path.join(workdir, "load.db"), args.rate_limit, args.worker_class,
+            )
+            print(f"🚀 Started {args.server} server at {url} (logs in {workdir})")
+        else:
+            url = args.url
+
+        run_id = f"{int(time.time())}{random.randint(0, 999):03d}"
+        sessions = []
+        for index in range(args.users):
+            session = Session(url, args.timeout)
+            session.login(index, run_id)
+            sessions.append(session)
+        print(f"👥 {len(sessions)} users logged in")
+
+        preflight(sessions[0], mix)
+        print(f"🔥 {args.concurrency} concurrent clients, {args.warmup:.0f}s warmup + {args.duration:.0f}s measured")
+        results = run_load(sessions, mix, args.concurrency, args.duration, args.warmup, args.cacheable)
+        report = summarize(results, args.duration)
+        print_report(report, args.duration)
+
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump({"config": vars(args), "url": url, "endpoints": report}, f, indent=2)
+            print(f"📝 Report written to {args.json}")
+    finally:
+        if proc is not None:
+            proc.terminate()
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+
+if __name__ == "__main__":
+    main()
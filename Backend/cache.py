@@ -0,0 +1,331 @@
+"""
+TracePoint AI - Response Cache
+Content-addressed cache for LLM responses with an in-process LRU tier
+and an optional persistent SQLite tier.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from db import DB_PATH, get_pooled_conn
+
+# ==================== CONFIGURATION ====================
+
+CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "512"))
+CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "86400"))  # seconds
+CACHE_PERSIST = os.getenv("LLM_CACHE_PERSIST", "1") == "1"
+CACHE_DB_PATH = os.getenv(
+    "LLM_CACHE_DB_PATH",
+    os.path.join(os.path.dirname(DB_PATH), "llm_cache.db")
+)
+
+class LeaderAbandoned(Exception):
+    """The leader of a claim stopped without a result (disconnect, interrupt): claim again"""
+
+
+# ==================== KEYS ====================
+
+def normalize_code(code):
+    """Normalize code so cosmetic whitespace changes hit the same entry"""
+    if not code:
+        return ""
+    lines = code.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    return "\n".join(line.rstrip() for line in lines).strip("\n")
+
+
+def make_key(function, model, system_prompt, audience=None, lang=None,
+             code="", question=None, **extra):
+    """
+    Build a content-addressed cache key.
+
+    Every input that changes the prompt sent upstream must be part of the
+    key, otherwise two different prompts would share one answer.
+    """
+    payload = [
+        function,
+        model,
+        system_prompt,
+        audience,
+        lang,
+        normalize_code(code),
+        (question or "").strip(),
+        sorted(extra.items()),
+    ]
+    raw = json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+# ==================== TIERS ====================
+
+class LRUCache:
+    """Thread-safe in-memory LRU with a size bound and per-entry TTL"""
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at is not None and expires_at < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.time() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteCache:
+    """Persistent cache tier stored in its own SQLite file"""
+
+    def __init__(self, path=CACHE_DB_PATH, ttl=CACHE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._ready = False
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        conn = get_pooled_conn(self.path)
+        if not self._ready:
+            with self._lock:
+                conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    expires_at REAL
+                )
+                """)
+                conn.commit()
+                self._ready = True
+        return conn
+
+    def get(self, key):
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT value, expires_at FROM llm_cache WHERE key=?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] is not None and row[1] < time.time():
+                conn.execute("DELETE FROM llm_cache WHERE key=?", (key,))
+                return None
+            return row[0]
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.time() + ttl if ttl else None
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, expires_at)
+            )
+
+    def delete(self, key):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM llm_cache WHERE key=?", (key,))
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM llm_cache")
+
+    def prune(self):
+        """Drop expired rows; returns the number removed"""
+        with self._connect() as conn:
+            cur = conn.execute(
+                "DELETE FROM llm_cache WHERE expires_at IS NOT NULL AND expires_at < ?",
+                (time.time(),)
+            )
+            return cur.rowcount
+
+# ==================== RESPONSE CACHE ====================
+
+class ResponseCache:
+    """
+    Multi-tier response cache.
+
+    Tiers are consulted in order; a hit in a slower tier is promoted into
+    the faster ones. Any object with get/set/delete/clear can be a tier.
+
+    get_or_compute is single-flight: concurrent misses on the same key wait
+    for one compute() instead of each calling upstream.
+    """
+
+    def __init__(self, tiers):
+        self.tiers = list(tiers)
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "stores": 0, "errors": 0, "computes": 0, "coalesced": 0}
+        self._tier_hits = [0] * len(self.tiers)
+        self._inflight = {}  # key -> Future shared by the leader and its waiters
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def get(self, key):
+        for index, tier in enumerate(self.tiers):
+            try:
+                value = tier.get(key)
+            except Exception as e:
+                print(f"⚠️ Cache tier {type(tier).__name__} read failed: {e}")
+                self._count("errors")
+                continue
+            if value is not None:
+                with self._lock:
+                    self._counters["hits"] += 1
+                    self._tier_hits[index] += 1
+                for faster in self.tiers[:index]:
+                    try:
+                        faster.set(key, value)
+                    except Exception as e:
+                        print(f"⚠️ Cache tier {type(faster).__name__} promotion failed: {e}")
+                        self._count("errors")
+                return value
+        self._count("misses")
+        return None
+
+    def set(self, key, value):
+        if value is None:
+            return
+        for tier in self.tiers:
+            try:
+                tier.set(key, value)
+            except Exception as e:
+                print(f"⚠️ Cache tier {type(tier).__name__} write failed: {e}")
+                self._count("errors")
+        self._count("stores")
+
+    def get_or_compute(self, key, compute):
+        """
+        Return the cached value for key, or compute, store and return it.
+
+        If another thread is already computing key, wait for its result (or
+        its exception) instead of computing again. If that thread is
+        interrupted rather than failing, one of the waiters takes over.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        while True:
+            future, leader = self.claim(key)
+            if leader:
+                break
+            try:
+                return future.result()
+            except LeaderAbandoned:
+                continue
+
+        try:
+            # The previous leader may have stored the value just before we took over
+            value = self.tiers[0].get(key) if self.tiers else None
+            if value is None:
+                value = compute()
+        except Exception as e:
+            self.resolve(key, future, error=e)
+            raise
+        except BaseException:
+            self.abandon(key, future)
+            raise
+        self.resolve(key, future, value)
+        return value
+
+    def claim(self, key):
+        """
+        Register interest in computing key.
+
+        Returns:
+            (future, leader): the leader must call resolve(); everyone else
+            waits on future.result()
+        """
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self._counters["coalesced"] += 1
+                return future, False
+            future = Future()
+            self._inflight[key] = future
+            self._counters["computes"] += 1
+            return future, True
+
+    def resolve(self, key, future, value=None, error=None):
+        """Leader side of claim(): store value (unless error) and wake waiters"""
+        try:
+            if error is None:
+                self.set(key, value)
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            if error is None:
+                future.set_result(value)
+            else:
+                future.set_exception(error)
+
+    def abandon(self, key, future):
+        """
+        Leader side of claim() when it stops without a result or an error of
+        its own (GeneratorExit, KeyboardInterrupt): waiters get
+        LeaderAbandoned and claim again, so one of them takes over.
+        """
+        with self._lock:
+            self._inflight.pop(key, None)
+        future.set_exception(LeaderAbandoned(key))
+
+    def clear(self):
+        for tier in self.tiers:
+            tier.clear()
+
+    def stats(self):
+        """Hit/miss counters for status endpoints"""
+        with self._lock:
+            stats = dict(self._counters)
+            stats["inflight"] = len(self._inflight)
+            lookups = stats["hits"] + stats["misses"]
+            stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+            stats["tiers"] = [
+                {"tier": type(tier).__name__, "hits": hits}
+                for tier, hits in zip(self.tiers, self._tier_hits)
+            ]
+        memory = next((t for t in self.tiers if isinstance(t, LRUCache)), None)
+        if memory is not None:
+            stats["memory_entries"] = len(memory)
+            stats["memory_max_entries"] = memory.max_entries
+        return stats
+
+
+def build_default_cache():
+    """Memory LRU, plus the SQLite tier unless LLM_CACHE_PERSIST=0"""
+    tiers = [LRUCache(CACHE_MAX_ENTRIES, CACHE_TTL)]
+    if CACHE_PERSIST:
+        tiers.append(SQLiteCache(CACHE_DB_PATH, CACHE_TTL))
+    return ResponseCache(tiers)
+
+
+response_cache = build_default_cache()
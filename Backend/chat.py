@@ -5,42 +5,88 @@ Better conversation handling and AI integration
 
 from flask import Blueprint, request, jsonify, render_template
 from flask_login import login_required, current_user
-from llm import chat_response, answer_code_question
-from db import save_chat, get_history
+from llm import chat_response, chat_response_stream, answer_code_question
+from db import save_chat, get_history_page, search_history
+from sse import sse_event, sse_response
+from llm_client import LLMUnavailable, request_deadline
+from ratelimit import rate_limited
+import conversation
+import base64
+import json
+import math
 
 chat = Blueprint("chat", __name__)
 
+
+def _unavailable_response(error):
+    """503 with Retry-After while the AI service is down; nothing was saved"""
+    retry_after = max(1, math.ceil(error.retry_after))
+    response = jsonify({
+        "error": "The AI service is temporarily unavailable. Please try again shortly.",
+        "retry_after": retry_after
+    })
+    response.status_code = 503
+    response.headers["Retry-After"] = str(retry_after)
+    return response
+
+
+def _parse_chat_request(data):
+    """Validate a chat payload; returns (message, audience, error)"""
+    if not data or "message" not in data:
+        return None, None, "No message provided"
+    
+    msg = data["message"].strip()
+    if not msg:
+        return None, None, "Message cannot be empty"
+    
+    if len(msg) > 5000:
+        return None, None, "Message too long. Maximum 5000 characters."
+    
+    # Get audience level from request or default to beginner
+    audience = data.get("audience", "beginner").strip().lower()
+    if audience not in ["beginner", "developer", "researcher"]:
+        audience = "beginner"
+    
+    return msg, audience, None
+
+
+def _encode_cursor(value):
+    """Opaque pagination cursor"""
+    raw = json.dumps(value, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor):
+    """Inverse of _encode_cursor; raises ValueError on a malformed cursor"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
 @chat.route("/chat", methods=["POST"])
 @login_required
+@rate_limited("chat")
 def chat_api():
     """
     Main chat endpoint - handles general programming questions
     Enhanced with better context and responses
     """
     try:
-        data = request.get_json()
-        if not data or "message" not in data:
-            return jsonify({"error": "No message provided"}), 400
-        
-        msg = data["message"].strip()
-        if not msg:
-            return jsonify({"error": "Message cannot be empty"}), 400
-        
-        if len(msg) > 5000:
-            return jsonify({"error": "Message too long. Maximum 5000 characters."}), 400
-        
-        # Get audience level from request or default to beginner
-        audience = data.get("audience", "beginner").strip().lower()
-        if audience not in ["beginner", "developer", "researcher"]:
-            audience = "beginner"
+        msg, audience, error = _parse_chat_request(request.get_json())
+        if error:
+            return jsonify({"error": error}), 400
         
         print(f"💬 Chat request from user {current_user.id}: {msg[:50]}...")
         
-        # Generate response
-        reply = chat_response(msg, audience)
+        # Generate response with recent turns and the rolling summary as context
+        history = conversation.build_history(current_user.id)
+        reply = chat_response(msg, audience, history, request_deadline(user_id=current_user.id, priority="chat"))
         
-        # Save to history
+        # Save to history (chat_response raises instead of returning an error)
         save_chat(current_user.id, msg, reply)
+        conversation.after_turn(current_user.id)
         
         print(f"✅ Chat response generated ({len(reply)} chars)")
         
@@ -50,6 +96,9 @@ def chat_api():
             "audience": audience
         }), 200
     
+    except LLMUnavailable as e:
+        print(f"⚡ LLM unavailable for chat: {e}")
+        return _unavailable_response(e)
     except Exception as e:
         error_msg = str(e)
         print(f"❌ Chat error: {error_msg}")
@@ -59,8 +108,57 @@ def chat_api():
         }), 500
 
 
+@chat.route("/chat/stream", methods=["POST"])
+@login_required
+@rate_limited("chat")
+def chat_stream():
+    """
+    Streaming chat endpoint - pushes reply tokens as Server-Sent Events.
+    Emits 'delta' frames while generating and a final 'done' frame;
+    the assembled reply is saved to history once the stream finishes.
+    If generation fails part-way, an 'error' frame replaces 'done' and
+    nothing is saved.
+    """
+    msg, audience, error = _parse_chat_request(request.get_json(silent=True))
+    if error:
+        return jsonify({"error": error}), 400
+    
+    user_id = current_user.id
+    print(f"💬 Streaming chat request from user {user_id}: {msg[:50]}...")
+    deadline = request_deadline(user_id=user_id, priority="chat")
+    
+    def generate():
+        parts = []
+        try:
+            history = conversation.build_history(user_id)
+            for text in chat_response_stream(msg, audience, history, deadline):
+                parts.append(text)
+                yield sse_event({"delta": text})
+        except Exception as e:
+            print(f"❌ Chat stream error after {len(parts)} fragments: {e}")
+            yield sse_event({
+                "error": "Sorry, I encountered an error. Please try again.",
+                "partial": bool(parts)
+            }, event="error")
+            return
+        
+        try:
+            reply = "".join(parts)
+            save_chat(user_id, msg, reply)
+            conversation.after_turn(user_id)
+            print(f"✅ Chat response streamed ({len(reply)} chars)")
+            
+            yield sse_event({"reply": reply, "timestamp": "now", "audience": audience}, event="done")
+        except Exception as e:
+            print(f"❌ Chat stream error: {e}")
+            yield sse_event({"error": "Sorry, I encountered an error. Please try again."}, event="error")
+    
+    return sse_response(generate())
+
+
 @chat.route("/chat/code", methods=["POST"])
 @login_required
+@rate_limited("chat")
 def chat_with_code():
     """
     Chat endpoint for code-specific questions
@@ -97,7 +195,7 @@ def chat_with_code():
         print(f"   Code: {len(code)} chars, Language: {language}")
         
         # Get answer with code context
-        answer = answer_code_question(question, code, language, audience)
+        answer = answer_code_question(question, code, language, audience, deadline=request_deadline(user_id=current_user.id, priority="chat"))
         
         # Save to history
         save_chat(current_user.id, f"[Code Question] {question}", answer)
@@ -111,6 +209,9 @@ def chat_with_code():
             "audience": audience
         }), 200
     
+    except LLMUnavailable as e:
+        print(f"⚡ LLM unavailable for code Q&A: {e}")
+        return _unavailable_response(e)
     except Exception as e:
         error_msg = str(e)
         print(f"❌ Code Q&A error: {error_msg}")
@@ -124,19 +225,28 @@ def chat_with_code():
 @login_required
 def chat_history():
     """
-    Get chat history for the current user
+    Get chat history for the current user, newest first.
+    Pass the returned next_cursor as ?cursor= to fetch the next older page.
     """
     try:
         # Get limit from query params (default 50, max 200)
         limit = min(int(request.args.get("limit", 50)), 200)
         
-        history = get_history(current_user.id, limit)
+        before_id = None
+        if request.args.get("cursor"):
+            try:
+                before_id = int(_decode_cursor(request.args["cursor"]))
+            except (ValueError, TypeError):
+                return jsonify({"error": "Invalid cursor"}), 400
+        
+        history = get_history_page(current_user.id, limit, before_id)
         
         formatted_history = [
             {
-                "message": row[0],
-                "response": row[1],
-                "timestamp": row[2]
+                "id": row[0],
+                "message": row[1],
+                "response": row[2],
+                "timestamp": row[3]
             }
             for row in history
         ]
@@ -144,7 +254,8 @@ def chat_history():
         return jsonify({
             "history": formatted_history,
             "count": len(formatted_history),
-            "limit": limit
+            "limit": limit,
+            "next_cursor": _encode_cursor(history[-1][0]) if len(history) == limit else None
         }), 200
     
     except Exception as e:
@@ -156,6 +267,52 @@ def chat_history():
         }), 500
 
 
+@chat.route("/chat/search", methods=["GET"])
+@login_required
+def chat_search():
+    """
+    Full-text search over the current user's chat history.
+    Results are ranked by relevance; snippets are HTML-escaped with the
+    matched terms wrapped in <mark>.
+    """
+    try:
+        query = (request.args.get("q") or "").strip()
+        if not query:
+            return jsonify({"error": "Search query cannot be empty"}), 400
+        if len(query) > 200:
+            return jsonify({"error": "Search query too long. Maximum 200 characters."}), 400
+        
+        limit = min(int(request.args.get("limit", 20)), 100)
+        
+        after = None
+        if request.args.get("cursor"):
+            try:
+                rank, last_id = _decode_cursor(request.args["cursor"])
+                after = (float(rank), int(last_id))
+            except (ValueError, TypeError):
+                return jsonify({"error": "Invalid cursor"}), 400
+        
+        results = search_history(current_user.id, query, limit, after)
+        
+        return jsonify({
+            "results": results,
+            "count": len(results),
+            "query": query,
+            "next_cursor": (
+                _encode_cursor([results[-1]["rank"], results[-1]["id"]])
+                if len(results) == limit else None
+            )
+        }), 200
+    
+    except Exception as e:
+        error_msg = str(e)
+        print(f"❌ Chat search error: {error_msg}")
+        return jsonify({
+            "error": "Search failed",
+            "details": error_msg
+        }), 500
+
+
 @chat.route("/chat/clear", methods=["POST"])
 @login_required
 def clear_history():
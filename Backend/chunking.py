@@ -0,0 +1,206 @@
+"""
+TracePoint AI - Code Chunking
+Splits large sources on syntactic boundaries so they can be analyzed as
+independent pieces: top-level functions/classes for Python, top-level
+brace blocks for C-like languages, blank-line paragraphs otherwise.
+"""
+
+import ast
+import os
+import re
+
+from static_analysis import parse_python
+
+CHUNK_MAX_CHARS = int(os.getenv("CHUNK_MAX_CHARS", "12000"))
+
+BRACE_LANGS = {"js", "java", "c", "cpp", "css"}
+
+
+def _unit(lines, start, end, name, kind):
+    """start/end are 1-based inclusive line numbers"""
+    return {
+        "name": name,
+        "kind": kind,
+        "start_line": start,
+        "end_line": end,
+        "code": "\n".join(lines[start - 1:end]),
+    }
+
+# ==================== UNIT SPLITTERS ====================
+
+def _python_units(code, lines):
+    """One unit per top-level def/class; other statements grouped between them"""
+    tree = parse_python(code)
+    units = []
+    loose_start = None
+
+    def flush_loose(before):
+        nonlocal loose_start
+        if loose_start is not None and loose_start < before:
+            units.append(_unit(lines, loose_start, before - 1, "module", "statements"))
+        loose_start = None
+
+    for node in tree.body:
+        start = node.lineno
+        if getattr(node, "decorator_list", None):
+            start = min(d.lineno for d in node.decorator_list)
+        end = getattr(node, "end_lineno", start)
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            flush_loose(start)
+            kind = "class" if isinstance(node, ast.ClassDef) else "function"
+            units.append(_unit(lines, start, end, node.name, kind))
+        elif loose_start is None:
+            loose_start = start
+    flush_loose(len(lines) + 1)
+    return _attach_gaps(units, lines)
+
+
+_BRACE_TOKEN = re.compile(
+    r"//[^\n]*|/\*.*?\*/|\"(?:\\.|[^\"\\\n])*\"|'(?:\\.|[^'\\\n])*'|`(?:\\.|[^`\\])*`|[{};\n]",
+    re.S,
+)
+_DECL_NAME = re.compile(r"(?:class|function|struct|interface|enum)\s+([A-Za-z_$][\w$]*)|([A-Za-z_$][\w$]*)\s*\([^()]*\)\s*(?:const\s*)?(?:throws [\w., ]+)?\s*$")
+
+
+def _brace_units(code, lines):
+    """Split wherever brace depth returns to zero at a '}' or top-level ';'"""
+    units = []
+    depth = 0
+    line = 1
+    start = 1
+    for match in _BRACE_TOKEN.finditer(code):
+        text = match.group()
+        if text == "\n":
+            line += 1
+            continue
+        if text[0] in "/\"'`":
+            line += text.count("\n")
+            continue
+        if text == "{":
+            depth += 1
+        elif text == "}":
+            depth = max(0, depth - 1)
+            if depth == 0:
+                units.append(_unit(lines, start, line, _guess_name(lines[start - 1:line]), "block"))
+                start = line + 1
+        elif text == ";" and depth == 0:
+            units.append(_unit(lines, start, line, "statements", "statements"))
+            start = line + 1
+    if start <= len(lines):
+        units.append(_unit(lines, start, len(lines), "statements", "statements"))
+    return [u for u in units if u["code"].strip()]
+
+
+def _guess_name(block_lines):
+    for text in block_lines:
+        head = text.split("{", 1)[0].strip()
+        if not head or head.startswith(("//", "/*", "*")):
+            continue
+        m = _DECL_NAME.search(head)
+        if m:
+            return m.group(1) or m.group(2)
+    return "block"
+
+
+def _paragraph_units(code, lines):
+    """Blank-line separated paragraphs (HTML, SQL, unknown languages)"""
+    units = []
+    start = None
+    for number, text in enumerate(lines, 1):
+        if text.strip():
+            if start is None:
+                start = number
+        elif start is not None:
+            units.append(_unit(lines, start, number - 1, "section", "section"))
+            start = None
+    if start is not None:
+        units.append(_unit(lines, start, len(lines), "section", "section"))
+    return units
+
+
+def _attach_gaps(units, lines):
+    """Keep comments/blank lines between units so chunks cover every line"""
+    covered = []
+    previous_end = 0
+    for unit in units:
+        if unit["start_line"] > previous_end + 1:
+            unit = _unit(lines, previous_end + 1, unit["end_line"], unit["name"], unit["kind"])
+        covered.append(unit)
+        previous_end = unit["end_line"]
+    if covered and previous_end < len(lines):
+        last = covered[-1]
+        covered[-1] = _unit(lines, last["start_line"], len(lines), last["name"], last["kind"])
+    return covered
+
+
+def _split_oversized(unit, lines, max_chars):
+    """Cut a unit that alone exceeds max_chars at line boundaries"""
+    if len(unit["code"]) <= max_chars:
+        return [unit]
+    pieces = []
+    start = unit["start_line"]
+    size = 0
+    for number in range(unit["start_line"], unit["end_line"] + 1):
+        line_size = len(lines[number - 1]) + 1
+        if size and size + line_size > max_chars:
+            pieces.append(_unit(lines, start, number - 1, f"{unit['name']} (part {len(pieces) + 1})", unit["kind"]))
+            start = number
+            size = 0
+        size += line_size
+    if start <= unit["end_line"]:
+        pieces.append(_unit(lines, start, unit["end_line"], f"{unit['name']} (part {len(pieces) + 1})", unit["kind"]))
+    return pieces
+
+# ==================== PUBLIC API ====================
+
+def split_units(code, lang):
+    """
+    Split code into syntactic units without size packing.
+
+    Returns:
+        list of dicts: name, kind, start_line, end_line, code
+    """
+    lines = code.split("\n")
+    if lang == "py":
+        try:
+            return _python_units(code, lines)
+        except SyntaxError:
+            return _paragraph_units(code, lines)
+    if lang in BRACE_LANGS:
+        return _brace_units(code, lines)
+    return _paragraph_units(code, lines)
+
+
+def split_code(code, lang, max_chars=CHUNK_MAX_CHARS):
+    """
+    Split code into chunks of at most ~max_chars, never cutting through a
+    syntactic unit unless that unit alone is larger than max_chars.
+    """
+    lines = code.split("\n")
+    units = []
+    for unit in split_units(code, lang):
+        units.extend(_split_oversized(unit, lines, max_chars))
+
+    chunks = []
+    current = []
+    size = 0
+    for unit in units:
+        unit_size = len(unit["code"]) + 1
+        if current and size + unit_size > max_chars:
+            chunks.append(current)
+            current, size = [], 0
+        current.append(unit)
+        size += unit_size
+    if current:
+        chunks.append(current)
+
+    return [
+        {
+            "index": index,
+            "names": [u["name"] for u in group],
+            "start_line": group[0]["start_line"],
+            "end_line": group[-1]["end_line"],
+            "code": "\n".join(lines[group[0]["start_line"] - 1:group[-1]["end_line"]]),
+        }
+        for index, group in enumerate(chunks)
+    ]
@@ -0,0 +1,108 @@
+"""
+TracePoint AI - Conversation Context
+Builds the history passed to llm.chat_response from chat_history: recent
+turns up to a token budget, preceded by a rolling summary of older turns.
+Per-turn prompt size stays roughly constant however long a chat gets.
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import llm
+from llm_client import Deadline, LLM_REQUEST_TIMEOUT
+from db import get_turns_after, get_turns_between, get_chat_summary, save_chat_summary
+
+HISTORY_TOKEN_BUDGET = int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", "2000"))
+HISTORY_MAX_TURNS = int(os.getenv("CHAT_HISTORY_MAX_TURNS", "20"))
+# Older turns are folded into the summary once this many have piled up
+SUMMARY_MIN_TURNS = int(os.getenv("CHAT_SUMMARY_MIN_TURNS", "4"))
+# At most this many turns are folded per pass; long backlogs catch up over several turns
+SUMMARY_MAX_TURNS = int(os.getenv("CHAT_SUMMARY_MAX_TURNS", "40"))
+
+_summarizer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chat-summary")
+_in_progress = set()
+_lock = threading.Lock()
+
+
+def estimate_tokens(text):
+    """Cheap token estimate (~4 chars per token)"""
+    return len(text or "") // 4 + 1
+
+
+# Error replies older versions saved as answers, before chat_response raised
+_LEGACY_ERROR_PREFIXES = ("⚠️ Chat Error:", "⚠️ Q&A Error:")
+
+
+def _usable(message, response):
+    """Skip legacy error replies and code Q&A turns whose code isn't in the chat"""
+    return not (response or "").startswith(_LEGACY_ERROR_PREFIXES) and not message.startswith("[Code Question]")
+
+
+def _window(user_id):
+    """
+    Returns (summary, covered_id, window) where window is the newest
+    turns fitting the budget, oldest first.
+    """
+    summary_row = get_chat_summary(user_id)
+    summary, covered_id = (summary_row[0], summary_row[1]) if summary_row else (None, 0)
+
+    budget = HISTORY_TOKEN_BUDGET - (estimate_tokens(summary) if summary else 0)
+    window = []
+    for row in get_turns_after(user_id, covered_id, HISTORY_MAX_TURNS):
+        if not _usable(row["message"], row["response"]):
+            continue
+        cost = estimate_tokens(row["message"]) + estimate_tokens(row["response"])
+        if cost > budget:
+            break
+        budget -= cost
+        window.append(row)
+    window.reverse()
+    return summary, covered_id, window
+
+
+def build_history(user_id):
+    """
+    History for llm.chat_response, in the google-genai content format.
+    """
+    summary, _, window = _window(user_id)
+    history = []
+    if summary:
+        history.append({"role": "user", "parts": [{"text": f"Summary of our conversation so far: {summary}"}]})
+        history.append({"role": "model", "parts": [{"text": "Thanks, I'll keep that in mind."}]})
+    for row in window:
+        history.append({"role": "user", "parts": [{"text": row["message"]}]})
+        history.append({"role": "model", "parts": [{"text": row["response"]}]})
+    return history
+
+
+def after_turn(user_id):
+    """Schedule background summarization once enough turns fall out of the window"""
+    with _lock:
+        if user_id in _in_progress:
+            return
+        _in_progress.add(user_id)
+    _summarizer.submit(_summarize, user_id)
+
+
+def _summarize(user_id):
+    try:
+        summary, covered_id, window = _window(user_id)
+        # Everything newer than the summary but older than the window
+        oldest_in_window = window[0]["id"] if window else float("inf")
+        rows = get_turns_between(user_id, covered_id, oldest_in_window, SUMMARY_MAX_TURNS)
+        overflow = [(row["message"], row["response"]) for row in rows if _usable(row["message"], row["response"])]
+        if len(rows) < SUMMARY_MIN_TURNS:
+            return
+        last_id = rows[-1]["id"]
+        if not overflow:
+            # Only unusable turns (errors, code Q&A): skip past them
+            save_chat_summary(user_id, summary or "", last_id)
+            return
+        save_chat_summary(user_id, llm.summarize_conversation(summary, overflow, Deadline(LLM_REQUEST_TIMEOUT, user_id, "batch")), last_id)
+        print(f"🧠 Folded {len(overflow)} turns into the summary for user {user_id}")
+    except Exception as e:
+        print(f"⚠️ Chat summarization failed for user {user_id}: {e}")
+    finally:
+        with _lock:
+            _in_progress.discard(user_id)
@@ -1,15 +1,78 @@
+import atexit
+import functools
+import gzip
+import json
 import sqlite3
+import html
+import re
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
 import os
+import threading
+import time
+import zlib
+from metrics import DB_SECONDS, timed_query
 
-DB_PATH = os.path.join(os.path.dirname(__file__), "app.db")
+DB_PATH = os.getenv("DB_PATH", os.path.join(os.path.dirname(__file__), "app.db"))
 
-def get_conn():
-    conn = sqlite3.connect(DB_PATH)
+# ==================== CONNECTIONS ====================
+# One connection per thread and database file, reused across calls.
+# WAL lets readers proceed while a writer holds the lock.
+
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", str(64 * 1024 * 1024)))
+DB_STATEMENT_CACHE = int(os.getenv("DB_STATEMENT_CACHE", "256"))
+
+_local = threading.local()
+
+def _open_conn(path):
+    """Open and tune a new connection"""
+    conn = sqlite3.connect(
+        path,
+        timeout=DB_BUSY_TIMEOUT_MS / 1000,
+        cached_statements=DB_STATEMENT_CACHE,
+    )
     conn.row_factory = sqlite3.Row
+    conn.create_function("tp_decompress", 1, unpack_text, deterministic=True)
+    # Takes effect only on a new file (and must precede WAL); lets freed pages go back to the OS
+    conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}")
+    conn.execute(f"PRAGMA mmap_size={DB_MMAP_SIZE}")
     return conn
 
+def get_pooled_conn(path):
+    """
+    Return this thread's connection to path, opening it on first use.
+    Connections are dropped after a fork so children never share a handle.
+    """
+    pid = os.getpid()
+    if getattr(_local, "pid", None) != pid:
+        _local.pid = pid
+        _local.conns = {}
+    conn = _local.conns.get(path)
+    if conn is None:
+        conn = _open_conn(path)
+        _local.conns[path] = conn
+    return conn
+
+def get_conn():
+    """
+    Connection to the main database for the current thread.
+    Use as a context manager to commit or roll back; do not close it.
+    """
+    return get_pooled_conn(DB_PATH)
+
+def close_thread_conns():
+    """Close every connection held by the current thread"""
+    for conn in getattr(_local, "conns", {}).values():
+        try:
+            conn.close()
+        except Exception:
+            pass
+    _local.conns = {}
+
 def init_db():
     """Initialize the database with all required tables"""
     with get_conn() as conn:
@@ -49,11 +112,528 @@ def init_db():
         ON chat_history(timestamp)
         """)
         
+        _init_chat_search(c)
+        
+        # Forensic batch jobs and their per-file results
+        c.execute("""
+        CREATE TABLE IF NOT EXISTS forensic_jobs (
+            id TEXT PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            total INTEGER NOT NULL,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            finished_at TEXT,
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        )
+        """)
+        
+        c.execute("""
+        CREATE TABLE IF NOT EXISTS forensic_job_files (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            job_id TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            filename TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            analysis TEXT,
+            error TEXT,
+            updated_at TEXT,
+            FOREIGN KEY (job_id) REFERENCES forensic_jobs(id)
+        )
+        """)
+        
+        c.execute("""
+        CREATE INDEX IF NOT EXISTS idx_job_files_job_id 
+        ON forensic_job_files(job_id, position)
+        """)
+        
+        # Rolling summary of each user's older chat turns
+        c.execute("""
+        CREATE TABLE IF NOT EXISTS chat_summaries (
+            user_id INTEGER PRIMARY KEY,
+            summary TEXT NOT NULL,
+            last_message_id INTEGER NOT NULL,
+            updated_at TEXT,
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        )
+        """)
+        
+        # Per-unit (function/class/chunk) analysis results keyed by content hash
+        c.execute("""
+        CREATE TABLE IF NOT EXISTS analysis_units (
+            fingerprint TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            explanation TEXT NOT NULL,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            last_used_at TEXT
+        )
+        """)
+        
         conn.commit()
+    
+    migrate()
     print("Database initialized successfully")
 
+# ==================== MIGRATIONS ====================
+# Schema changes after the baseline tables above. Each migration runs once,
+# in order, inside its own transaction; PRAGMA user_version records the
+# last one applied. Append new migrations, never edit or reorder old ones.
+
+def _m001_chat_user_id_index(c):
+    """Composite (user_id, id DESC) index for per-user newest-first reads"""
+    c.execute("""
+    CREATE INDEX IF NOT EXISTS idx_chat_user_id_id 
+    ON chat_history(user_id, id DESC)
+    """)
+    # Superseded: the composite index serves every lookup it did
+    c.execute("DROP INDEX IF EXISTS idx_chat_user_id")
+
+def _m002_chat_counts(c):
+    """Per-user turn counter maintained by triggers, so counts are O(1)"""
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS chat_counts (
+        user_id INTEGER PRIMARY KEY,
+        total INTEGER NOT NULL DEFAULT 0
+    )
+    """)
+    c.execute("""
+    CREATE TRIGGER IF NOT EXISTS chat_counts_insert AFTER INSERT ON chat_history BEGIN
+        INSERT INTO chat_counts (user_id, total) VALUES (new.user_id, 1)
+        ON CONFLICT(user_id) DO UPDATE SET total = total + 1;
+    END
+    """)
+    c.execute("""
+    CREATE TRIGGER IF NOT EXISTS chat_counts_delete AFTER DELETE ON chat_history BEGIN
+        UPDATE chat_counts SET total = total - 1 WHERE user_id = old.user_id;
+    END
+    """)
+    c.execute("DELETE FROM chat_counts")
+    c.execute("""
+    INSERT INTO chat_counts (user_id, total) 
+    SELECT user_id, COUNT(*) FROM chat_history GROUP BY user_id
+    """)
+
+def _m003_chat_archive(c):
+    """Compressed segments of archived chat turns, plus an archived count per user"""
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS chat_archive (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        first_id INTEGER NOT NULL,
+        last_id INTEGER NOT NULL,
+        first_timestamp TEXT,
+        last_timestamp TEXT,
+        row_count INTEGER NOT NULL,
+        codec TEXT NOT NULL,
+        raw_bytes INTEGER NOT NULL,
+        data BLOB NOT NULL,
+        created_at TEXT NOT NULL
+    )
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_chat_archive_user ON chat_archive(user_id, last_id DESC)")
+    columns = [row[1] for row in c.execute("PRAGMA table_info(chat_counts)")]
+    if "archived" not in columns:
+        c.execute("ALTER TABLE chat_counts ADD COLUMN archived INTEGER NOT NULL DEFAULT 0")
+
+def _m004_chat_compression(c):
+    """Trained zlib dictionary for chat payloads, FTS over decompressed text, backfill cursor"""
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS chat_zdicts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        data BLOB NOT NULL,
+        samples INTEGER NOT NULL,
+        created_at TEXT NOT NULL
+    )
+    """)
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS chat_backfill (
+        name TEXT PRIMARY KEY,
+        next_id INTEGER NOT NULL,
+        end_id INTEGER NOT NULL,
+        rows INTEGER NOT NULL DEFAULT 0,
+        bytes_before INTEGER NOT NULL DEFAULT 0,
+        bytes_after INTEGER NOT NULL DEFAULT 0
+    )
+    """)
+    _train_zdict(c)  # new writes pick it up from the table once this commits
+    if FTS_ENABLED:
+        # Rebuild chat_fts so it reads through chat_text instead of the raw columns
+        for trigger in ("chat_fts_insert", "chat_fts_delete", "chat_fts_update"):
+            c.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        c.execute("DROP TABLE IF EXISTS chat_fts")
+        _init_chat_search(c)
+    # Rows up to here were written uncompressed; compress_chat_backlog() rewrites them
+    end_id = c.execute("SELECT COALESCE(MAX(id), 0) FROM chat_history").fetchone()[0]
+    c.execute(
+        "INSERT OR REPLACE INTO chat_backfill (name, next_id, end_id) VALUES ('compress', 0, ?)",
+        (end_id,)
+    )
+
+def _m005_purge_failed_analysis_units(c):
+    """Drop analysis units stored from streams that failed part-way"""
+    c.execute("DELETE FROM analysis_units WHERE explanation LIKE '%⚠️ AI Analysis Error:%'")
+
+def _m006_forensic_job_owner(c):
+    """Record which process runs each forensic job, so orphaned jobs can be failed"""
+    columns = [row[1] for row in c.execute("PRAGMA table_info(forensic_jobs)")]
+    if "owner" not in columns:
+        c.execute("ALTER TABLE forensic_jobs ADD COLUMN owner TEXT")
+
+def _m007_chat_fts_without_triggers(c):
+    """Keep chat_fts in sync from db.py, so the schema needs no app-only SQL function"""
+    for trigger in ("chat_fts_insert", "chat_fts_delete", "chat_fts_update"):
+        c.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+
+def _m008_chat_archive_search(c):
+    """Contentless search index over archived turns, backfilled from existing segments"""
+    if not FTS_ENABLED:
+        return
+    c.execute("""
+    CREATE VIRTUAL TABLE IF NOT EXISTS chat_archive_fts USING fts5(
+        message, response, owner,
+        content='',
+        tokenize='porter unicode61'
+    )
+    """)
+    # owner only scopes a query to one user: rank on the text columns
+    c.execute("INSERT INTO chat_archive_fts(chat_archive_fts, rank) VALUES ('rank', 'bm25(1.0, 1.0, 0.0)')")
+    for segment in c.execute("SELECT user_id, codec, data FROM chat_archive").fetchall():
+        _index_archived(c, segment[0], json.loads(_decompress(segment[2], segment[1])))
+
+def _m009_forensic_file_degraded(c):
+    """Flag forensic job files answered by the static scan while the LLM was unavailable"""
+    columns = [row[1] for row in c.execute("PRAGMA table_info(forensic_job_files)")]
+    if "degraded" not in columns:
+        c.execute("ALTER TABLE forensic_job_files ADD COLUMN degraded INTEGER NOT NULL DEFAULT 0")
+
+MIGRATIONS = [
+    (1, _m001_chat_user_id_index),
+    (2, _m002_chat_counts),
+    (3, _m003_chat_archive),
+    (4, _m004_chat_compression),
+    (5, _m005_purge_failed_analysis_units),
+    (6, _m006_forensic_job_owner),
+    (7, _m007_chat_fts_without_triggers),
+    (8, _m008_chat_archive_search),
+    (9, _m009_forensic_file_degraded),
+]
+
+def schema_version(conn=None):
+    conn = conn or get_conn()
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate(target=None):
+    """Apply pending migrations up to target (default: latest)"""
+    conn = get_conn()
+    current = schema_version(conn)
+    for version, step in MIGRATIONS:
+        if version <= current or (target is not None and version > target):
+            continue
+        started = time.perf_counter()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            # Another process may have applied it while we waited for the lock
+            if schema_version(conn) >= version:
+                continue
+            step(conn.cursor())
+            conn.execute(f"PRAGMA user_version={version}")
+        print(f"🧱 Applied migration {version:03d} ({step.__doc__}) in {time.perf_counter() - started:.2f}s")
+
+# ==================== CHAT SEARCH ====================
+# chat_fts is an external-content FTS5 index over chat_history: it stores
+# only the index and reads text through the chat_text view. db.py indexes
+# the plain text of every row it writes and un-indexes rows it deletes, in
+# the same transaction; there are no triggers, so plain sqlite3 clients
+# can still write chat_history. chat_text needs tp_decompress() and is
+# app-only. Rows written outside the app are searchable after
+# rebuild_chat_search().
+
+FTS_ENABLED = True
+
+def _init_chat_search(c):
+    """Create chat_fts; backfill it the first time"""
+    global FTS_ENABLED
+    exists = c.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='chat_fts'"
+    ).fetchone()
+    try:
+        # Payloads may be compressed, so the index reads text through this view
+        c.execute("""
+        CREATE VIEW IF NOT EXISTS chat_text AS 
+        SELECT id, tp_decompress(message) AS message, tp_decompress(response) AS response 
+        FROM chat_history
+        """)
+        c.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS chat_fts USING fts5(
+            message, response,
+            content='chat_text', content_rowid='id',
+            tokenize='porter unicode61'
+        )
+        """)
+    except sqlite3.OperationalError as e:
+        FTS_ENABLED = False
+        print(f"⚠️ FTS5 unavailable ({e}); /chat/search falls back to LIKE scans")
+        return
+    
+    if not exists:
+        c.execute("INSERT INTO chat_fts(chat_fts) VALUES ('rebuild')")
+        print("🔎 Built chat search index")
+
+def rebuild_chat_search():
+    """Re-index chat_fts from chat_history (after writes from outside the app)"""
+    if FTS_ENABLED:
+        with get_conn() as conn:
+            conn.execute("INSERT INTO chat_fts(chat_fts) VALUES ('rebuild')")
+
+def _index_chat(conn, chat_id, message, response):
+    if FTS_ENABLED:
+        conn.execute(
+            "INSERT INTO chat_fts(rowid, message, response) VALUES (?, ?, ?)",
+            (chat_id, message, response)
+        )
+
+def _unindex_chats(conn, rows):
+    """Drop (id, message, response) rows, with their plain text as indexed, from chat_fts"""
+    if FTS_ENABLED:
+        conn.executemany(
+            "INSERT INTO chat_fts(chat_fts, rowid, message, response) VALUES ('delete', ?, ?, ?)",
+            rows
+        )
+
+def fts_query(text):
+    """
+    Turn free text into a safe FTS5 query: every word must match, the last
+    one as a prefix (search-as-you-type). Returns None if nothing searchable.
+    """
+    words = re.findall(r"\w+", text or "")
+    if not words:
+        return None
+    quoted = [f'"{w}"' for w in words]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+def _highlight(snippet):
+    """Escape a snippet for HTML, then turn the \x02/\x03 match markers into <mark>"""
+    return html.escape(snippet or "").replace("\x02", "<mark>").replace("\x03", "</mark>")
+
+# ==================== CHAT COMPRESSION ====================
+# message/response values of CHAT_COMPRESS_MIN_CHARS or more are stored as
+# BLOBs: 1 format byte, 2 bytes of dictionary id, then raw deflate primed
+# with a dictionary trained on our own chat corpus (chat_zdicts). Short
+# texts compress far better with a shared dictionary than alone. Every
+# connection registers tp_decompress(), which returns plain text for both
+# forms; queries and the chat_text view go through it. Nothing in the
+# schema itself (triggers, defaults) calls it.
+
+CHAT_COMPRESS = os.getenv("CHAT_COMPRESS", "1") == "1"
+CHAT_COMPRESS_MIN_CHARS = int(os.getenv("CHAT_COMPRESS_MIN_CHARS", "256"))
+CHAT_COMPRESS_LEVEL = int(os.getenv("CHAT_COMPRESS_LEVEL", "6"))
+CHAT_COMPRESS_BATCH = int(os.getenv("CHAT_COMPRESS_BATCH", "500"))  # rows per backfill transaction
+ZDICT_SIZE = 32 * 1024  # deflate only looks back 32 KB
+ZDICT_SAMPLES = int(os.getenv("CHAT_ZDICT_SAMPLES", "2000"))
+
+_PACKED = 1  # format byte
+# Fallback dictionary content before there is a corpus to train on
+_ZDICT_SEED = (
+    "```python\n```\n## Explanation\n## Summary\n### Example\n**Note:** "
+    "def return self import from for in if else elif while try except print( "
+    "The code defines a function that takes returns the result of the "
+    "This function This means that For example, you can "
+)
+
+_zdicts = {}
+_active_zdict = None  # (id, data) used for new writes
+_zdict_lock = threading.Lock()
+
+def train_zdict(samples, size=ZDICT_SIZE):
+    """
+    Build a deflate dictionary from sample texts: lines, then words, that
+    recur across samples. The most frequent go last, where they are the
+    cheapest to reference.
+    """
+    lines, words = {}, {}
+    for text in samples:
+        for line in set(text.splitlines()):
+            line = line.strip()
+            if 8 <= len(line) <= 200:
+                lines[line] = lines.get(line, 0) + 1
+        for word in set(re.findall(r"\S{5,30}", text)):
+            words[word] = words.get(word, 0) + 1
+    chosen, used = [], 0
+    candidates = sorted(lines.items(), key=lambda kv: -kv[1] * len(kv[0])) + \
+        sorted(words.items(), key=lambda kv: -kv[1] * len(kv[0]))
+    for piece, count in candidates:
+        if count < 2:
+            continue
+        data = (piece + "\n").encode("utf-8")
+        if used + len(data) > size:
+            continue
+        chosen.append(data)
+        used += len(data)
+    seed = _ZDICT_SEED.encode("utf-8")
+    return (seed + b"".join(reversed(chosen)))[-size:]
+
+def _train_zdict(c, limit=ZDICT_SAMPLES):
+    """
+    Train on the newest turns and insert the result, in the caller's
+    transaction. Not published here: until that commits, the id may still
+    be rolled back and handed to a different dictionary.
+    """
+    samples = []
+    for row in c.execute(
+        "SELECT tp_decompress(message), tp_decompress(response) FROM chat_history ORDER BY id DESC LIMIT ?",
+        (limit,)
+    ):
+        samples.extend(text for text in row if text)
+    data = train_zdict(samples)
+    c.execute(
+        "INSERT INTO chat_zdicts (data, samples, created_at) VALUES (?, ?, ?)",
+        (data, len(samples), datetime.utcnow().isoformat())
+    )
+    return c.lastrowid, data, len(samples)
+
+def retrain_zdict():
+    """
+    Train a new dictionary from the current corpus. New writes use it; rows
+    written with older dictionaries keep decoding with theirs.
+    Returns (dictionary id, dictionary bytes, samples used).
+    """
+    global _active_zdict
+    with get_conn() as conn:
+        dict_id, data, samples = _train_zdict(conn.cursor())
+    # Committed: safe for new writes to reference
+    with _zdict_lock:
+        _zdicts[dict_id] = data
+        _active_zdict = (dict_id, data)
+    return dict_id, len(data), samples
+
+def _zdict(dict_id):
+    data = _zdicts.get(dict_id)
+    if data is None:
+        # Separate connection: this can run inside a tp_decompress() call
+        conn = sqlite3.connect(DB_PATH)
+        try:
+            row = conn.execute("SELECT data FROM chat_zdicts WHERE id=?", (dict_id,)).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            raise ValueError(f"Unknown chat compression dictionary {dict_id}")
+        data = _zdicts.setdefault(dict_id, row[0])
+    return data
+
+def _current_zdict():
+    global _active_zdict
+    if _active_zdict is None:
+        try:
+            row = get_conn().execute("SELECT id, data FROM chat_zdicts ORDER BY id DESC LIMIT 1").fetchone()
+        except sqlite3.OperationalError:
+            return None  # migration 004 not applied yet
+        if row is None:
+            return None
+        with _zdict_lock:
+            _zdicts[row[0]] = row[1]
+            _active_zdict = (row[0], row[1])
+    return _active_zdict
+
+def pack_text(text):
+    """Compressed BLOB for long text, else the text unchanged"""
+    if not CHAT_COMPRESS or not isinstance(text, str) or len(text) < CHAT_COMPRESS_MIN_CHARS:
+        return text
+    current = _current_zdict()
+    if current is None:
+        return text
+    dict_id, data = current
+    raw = text.encode("utf-8")
+    comp = zlib.compressobj(CHAT_COMPRESS_LEVEL, zlib.DEFLATED, -15, 9, zlib.Z_DEFAULT_STRATEGY, data)
+    blob = bytes([_PACKED]) + dict_id.to_bytes(2, "big") + comp.compress(raw) + comp.flush()
+    return blob if len(blob) < len(raw) else text
+
+def unpack_text(value):
+    """Inverse of pack_text; registered in SQLite as tp_decompress()"""
+    if not isinstance(value, bytes) or value[:1] != bytes([_PACKED]):
+        return value
+    dict_id = int.from_bytes(value[1:3], "big")
+    decomp = zlib.decompressobj(-15, _zdict(dict_id))
+    return (decomp.decompress(value[3:]) + decomp.flush()).decode("utf-8")
+
+def _stored_size(value):
+    if value is None:
+        return 0
+    return len(value) if isinstance(value, bytes) else len(value.encode("utf-8"))
+
+@timed_query
+def compress_chat_backlog(batch_size=CHAT_COMPRESS_BATCH, max_batches=None):
+    """
+    Compress rows written before migration 004, one transaction per batch.
+    Resumable: progress is kept in chat_backfill.
+    Returns {"rows", "bytes_before", "bytes_after", "done"} for this call.
+    """
+    report = {"rows": 0, "bytes_before": 0, "bytes_after": 0, "done": False}
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        with get_conn() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            state = conn.execute("SELECT next_id, end_id FROM chat_backfill WHERE name='compress'").fetchone()
+            if state is None or state[0] >= state[1]:
+                report["done"] = True
+                return report
+            rows = conn.execute(
+                "SELECT id, message, response FROM chat_history WHERE id>? AND id<=? ORDER BY id LIMIT ?",
+                (state[0], state[1], batch_size)
+            ).fetchall()
+            updates, before, after = [], 0, 0
+            for row in rows:
+                message, response = pack_text(row[1]), pack_text(row[2])
+                if message is not row[1] or response is not row[2]:
+                    updates.append((message, response, row[0]))
+                    before += _stored_size(row[1]) + _stored_size(row[2])
+                    after += _stored_size(message) + _stored_size(response)
+            conn.executemany("UPDATE chat_history SET message=?, response=? WHERE id=?", updates)
+            conn.execute(
+                """UPDATE chat_backfill 
+                   SET next_id=?, rows=rows+?, bytes_before=bytes_before+?, bytes_after=bytes_after+? 
+                   WHERE name='compress'""",
+                (rows[-1][0] if rows else state[1], len(updates), before, after)
+            )
+        report["rows"] += len(updates)
+        report["bytes_before"] += before
+        report["bytes_after"] += after
+        batches += 1
+    return report
+
+def chat_compression_report():
+    """
+    Stored vs uncompressed bytes of chat_history payloads (full scan), plus
+    backfill progress.
+    """
+    with get_conn() as conn:
+        report = {}
+        for column in ("message", "response"):
+            row = conn.execute(f"""
+                SELECT COUNT(*), 
+                       SUM(typeof({column}) = 'blob'), 
+                       COALESCE(SUM(length(CAST({column} AS BLOB))), 0), 
+                       COALESCE(SUM(length(CAST(tp_decompress({column}) AS BLOB))), 0) 
+                FROM chat_history
+            """).fetchone()
+            report[column] = {
+                "rows": row[0],
+                "compressed_rows": row[1] or 0,
+                "stored_bytes": row[2],
+                "raw_bytes": row[3],
+                "saved_bytes": row[3] - row[2],
+            }
+        backfill = conn.execute(
+            "SELECT next_id, end_id, rows, bytes_before, bytes_after FROM chat_backfill WHERE name='compress'"
+        ).fetchone()
+        if backfill:
+            report["backfill"] = dict(zip(("next_id", "end_id", "rows", "bytes_before", "bytes_after"), backfill))
+        report["page_count"] = conn.execute("PRAGMA page_count").fetchone()[0]
+        report["freelist_count"] = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    return report
+
 # ==================== USER AUTH ====================
 
+@timed_query
 def create_user(username, email, password):
     """Create a new user account"""
     if not username or not email or not password:
@@ -75,6 +655,7 @@ def create_user(username, email, password):
             else:
                 raise ValueError("Email already registered")
 
+@timed_query
 def get_user_by_email(email):
     """Retrieve user by email"""
     with get_conn() as conn:
@@ -82,6 +663,7 @@ def get_user_by_email(email):
         c.execute("SELECT * FROM users WHERE email=?", (email.lower(),))
         return c.fetchone()
 
+@timed_query
 def get_user_by_id(user_id):
     """Retrieve user by ID"""
     with get_conn() as conn:
@@ -89,6 +671,21 @@ def get_user_by_id(user_id):
         c.execute("SELECT * FROM users WHERE id=?", (user_id,))
         return c.fetchone()
 
+@timed_query
+def update_user_password(user_id, new_password):
+    """Replace a user's password hash"""
+    if not new_password:
+        raise ValueError("Password is required")
+    
+    with get_conn() as conn:
+        c = conn.cursor()
+        c.execute(
+            "UPDATE users SET password=? WHERE id=?",
+            (generate_password_hash(new_password, method='pbkdf2:sha256'), user_id)
+        )
+        conn.commit()
+
+@timed_query
 def verify_user(email, password):
     """Verify user credentials"""
     user = get_user_by_email(email)
@@ -96,24 +693,281 @@ def verify_user(email, password):
         return user
     return None
 
+# ==================== CHAT WRITE-BEHIND ====================
+# save_chat hands rows to a background thread that inserts them in batches,
+# so /chat responses don't wait on the SQLite write lock. Buffered rows are
+# merged into (or flushed before) the same user's reads in this process.
+# Other gunicorn workers see them after at most CHAT_WRITE_INTERVAL_MS.
+# A crash (not a clean shutdown) loses at most the buffered rows.
+
+CHAT_WRITE_BEHIND = os.getenv("CHAT_WRITE_BEHIND", "1") == "1"
+CHAT_WRITE_BATCH = int(os.getenv("CHAT_WRITE_BATCH", "64"))  # flush once this many rows are queued
+CHAT_WRITE_INTERVAL = float(os.getenv("CHAT_WRITE_INTERVAL_MS", "50")) / 1000  # max age of a queued row
+CHAT_WRITE_MAX_PENDING = int(os.getenv("CHAT_WRITE_MAX_PENDING", "5000"))  # beyond this, callers wait
+CHAT_WRITE_MAX_ATTEMPTS = int(os.getenv("CHAT_WRITE_MAX_ATTEMPTS", "3"))  # failed batch tries before rows go one by one
+
+class _PendingChat:
+    __slots__ = ("seq", "user_id", "message", "response", "timestamp", "queued_at")
+
+    def __init__(self, seq, user_id, message, response, timestamp):
+        self.queued_at = time.monotonic()
+        self.seq = seq
+        self.user_id = user_id
+        self.message = message
+        self.response = response
+        self.timestamp = timestamp
+
+class ChatWriter:
+    """
+    Batches chat_history inserts on a background thread.
+    Flushes when CHAT_WRITE_BATCH rows are queued, when the oldest row is
+    CHAT_WRITE_INTERVAL old, on sync()/flush(), and at interpreter exit.
+    A batch that fails CHAT_WRITE_MAX_ATTEMPTS times is written row by row;
+    rows that still fail (other than on a busy/locked database) are dropped
+    and counted, so one bad row cannot block the queue behind it.
+    """
+
+    def __init__(self, batch_size=CHAT_WRITE_BATCH, interval=CHAT_WRITE_INTERVAL,
+                 max_pending=CHAT_WRITE_MAX_PENDING):
+        self.batch_size = max(1, batch_size)
+        self.interval = interval
+        self.max_pending = max_pending
+        self._cond = threading.Condition()
+        # Held while a batch commits and leaves the queue, and by readers merging the queue
+        self._commit_lock = threading.Lock()
+        self._pending = []
+        self._per_user = {}
+        self._seq = 0
+        self._committed_seq = 0
+        self._flush_now = False
+        self._closed = False
+        self._thread = None
+        self._pid = None
+        self.stats = {"queued": 0, "written": 0, "batches": 0, "errors": 0, "dropped": 0, "waited_full": 0}
+
+    def _ensure_thread(self):
+        """Start the writer thread (again after a fork); call with _cond held"""
+        if self._pid == os.getpid() and self._thread is not None:
+            return
+        if self._pid is not None:
+            # Forked child: the parent's thread and queue stay with the parent
+            self._pending, self._per_user = [], {}
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name="chat-writer", daemon=True)
+        self._thread.start()
+
+    def add(self, user_id, message, response, timestamp):
+        """Queue one row; False means the caller should write it directly"""
+        with self._cond:
+            if self._closed:
+                return False
+            self._ensure_thread()
+            if len(self._pending) >= self.max_pending:
+                self.stats["waited_full"] += 1
+                self._flush_now = True
+                self._cond.notify_all()
+                if not self._cond.wait_for(lambda: len(self._pending) < self.max_pending,
+                                           DB_BUSY_TIMEOUT_MS / 1000):
+                    return False
+            self._seq += 1
+            self._pending.append(_PendingChat(self._seq, user_id, message, response, timestamp))
+            self._per_user[user_id] = self._per_user.get(user_id, 0) + 1
+            self.stats["queued"] += 1
+            if len(self._pending) == 1 or len(self._pending) >= self.batch_size:
+                self._cond.notify_all()
+            return True
+
+    def pending_count(self, user_id):
+        with self._cond:
+            return self._per_user.get(user_id, 0)
+
+    def read(self, user_id, query):
+        """
+        Run query(conn) and snapshot the user's buffered rows (newest first)
+        without a batch committing in between.
+        Returns (pending, query result).
+        """
+        if not self.pending_count(user_id):
+            return [], query(get_conn())
+        with self._commit_lock:
+            with self._cond:
+                pending = [p for p in reversed(self._pending) if p.user_id == user_id]
+            return pending, query(get_conn())
+
+    def sync(self, user_id=None, timeout=None):
+        """Block until this user's (or everyone's) buffered rows are committed"""
+        with self._cond:
+            mine = [p.seq for p in self._pending if user_id is None or p.user_id == user_id]
+            if not mine:
+                return True
+            target = mine[-1]
+            self._flush_now = True
+            self._cond.notify_all()
+            done = self._cond.wait_for(
+                lambda: self._committed_seq >= target or not self._thread.is_alive(),
+                timeout if timeout is not None else DB_BUSY_TIMEOUT_MS / 1000 * 2,
+            )
+            return done and self._committed_seq >= target
+
+    def flush(self, timeout=None):
+        return self.sync(None, timeout)
+
+    def _next_batch(self):
+        """Wait for a batch to be due; None once closed and drained"""
+        with self._cond:
+            while True:
+                if self._pending:
+                    due = self._pending[0].queued_at + self.interval - time.monotonic()
+                    if self._closed or self._flush_now or len(self._pending) >= self.batch_size or due <= 0:
+                        self._flush_now = False
+                        return self._pending[:self.batch_size]
+                    self._cond.wait(due)
+                elif self._closed:
+                    return None
+                else:
+                    self._cond.wait()
+
+    def _run(self):
+        failures = 0
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            try:
+                if failures >= CHAT_WRITE_MAX_ATTEMPTS:
+                    self._write_each(batch)
+                else:
+                    self._write(batch)
+                failures = 0
+            except Exception as e:
+                failures += 1
+                self.stats["errors"] += 1
+                print(f"⚠️ Chat write-behind batch failed ({e}); retrying")
+                time.sleep(min(2.0, 0.05 * 2 ** failures))
+
+    def _write_each(self, batch):
+        """
+        Write a repeatedly failing batch one row at a time and drop the rows
+        that fail on their own. A busy or locked database is not the row's
+        fault: that error is raised and the rest is retried later.
+        """
+        for p in batch:
+            try:
+                self._write([p])
+            except sqlite3.OperationalError:
+                raise
+            except Exception as e:
+                with self._commit_lock:
+                    self._retire([p], written=False)
+                print(f"🗑️ Dropped chat row (seq {p.seq}, user {p.user_id}) after repeated write failures: {e}")
+
+    def _write(self, batch):
+        conn = get_conn()
+        started = time.perf_counter()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            _store_chats(conn, [(p.user_id, p.message, p.response, p.timestamp) for p in batch])
+            with self._commit_lock:
+                conn.commit()
+                self._retire(batch)
+            DB_SECONDS.observe(time.perf_counter() - started, query="chat_write_batch")
+        except Exception:
+            conn.rollback()
+            raise
+
+    def _retire(self, batch, written=True):
+        """Take batch (the head of the queue) out of it; call with _commit_lock held"""
+        with self._cond:
+            del self._pending[:len(batch)]
+            for p in batch:
+                left = self._per_user[p.user_id] - 1
+                if left:
+                    self._per_user[p.user_id] = left
+                else:
+                    del self._per_user[p.user_id]
+            self._committed_seq = batch[-1].seq
+            if written:
+                self.stats["written"] += len(batch)
+                self.stats["batches"] += 1
+            else:
+                self.stats["dropped"] += len(batch)
+            self._cond.notify_all()
+
+    def close(self, timeout=10):
+        """Flush everything and stop the thread (flush-on-shutdown)"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            thread = self._thread if self._pid == os.getpid() else None
+        if thread is not None:
+            thread.join(timeout)
+        with self._cond:
+            leftover = list(self._pending) if self._pid == os.getpid() else []
+            self._pending, self._per_user = [], {}
+        if leftover:
+            rows = [(p.user_id, p.message, p.response, p.timestamp) for p in leftover]
+            try:
+                _insert_chats(rows)
+            except sqlite3.Error:
+                # Keep the good rows even if one is poison
+                for p, row in zip(leftover, rows):
+                    try:
+                        _insert_chats([row])
+                    except sqlite3.Error as e:
+                        self.stats["dropped"] += 1
+                        print(f"🗑️ Dropped chat row (seq {p.seq}, user {p.user_id}) at shutdown: {e}")
+        if self.stats["queued"]:
+            print(f"💾 Chat writer closed: {self.stats['written'] + len(leftover)} rows written in {self.stats['batches']} batches")
+
+    def snapshot(self):
+        with self._cond:
+            return dict(self.stats, pending=len(self._pending), enabled=CHAT_WRITE_BEHIND)
+
+_chat_writer = ChatWriter()
+atexit.register(_chat_writer.close)
+
+def flush_chat_writes(timeout=None):
+    """Commit every buffered chat row now; True if all made it"""
+    return _chat_writer.flush(timeout)
+
+def chat_writer_stats():
+    return _chat_writer.snapshot()
+
 # ==================== CHAT HISTORY ====================
 
+@timed_query
 def save_chat(user_id, message, response):
-    """Save a chat exchange to history"""
+    """
+    Save a chat exchange to history.
+    Queued for the background writer when write-behind is on; the user's
+    own reads see it straight away (see ChatWriter).
+    """
+    timestamp = datetime.utcnow().isoformat()
+    if CHAT_WRITE_BEHIND and _chat_writer.add(user_id, message, response, timestamp):
+        return
+    _insert_chats([(user_id, message, response, timestamp)])
+
+def _insert_chats(rows):
+    """Synchronous insert of (user_id, message, response, timestamp) rows"""
     with get_conn() as conn:
-        c = conn.cursor()
-        c.execute(
+        _store_chats(conn, rows)
+
+def _store_chats(conn, rows):
+    """Insert rows (packed) and index their plain text, in the caller's transaction"""
+    for user_id, message, response, timestamp in rows:
+        cursor = conn.execute(
             "INSERT INTO chat_history (user_id, message, response, timestamp) VALUES (?, ?, ?, ?)",
-            (user_id, message, response, datetime.utcnow().isoformat())
+            (user_id, pack_text(message), pack_text(response), timestamp)
         )
-        conn.commit()
+        _index_chat(conn, cursor.lastrowid, message, response)
 
+@timed_query
 def get_history(user_id, limit=50):
     """Get chat history for a user"""
-    with get_conn() as conn:
+    def query(conn):
         c = conn.cursor()
         c.execute(
-            """SELECT message, response, timestamp 
+            """SELECT tp_decompress(message) AS message, tp_decompress(response) AS response, timestamp 
                FROM chat_history 
                WHERE user_id=? 
                ORDER BY id DESC 
@@ -121,13 +975,113 @@ def get_history(user_id, limit=50):
             (user_id, limit)
         )
         return c.fetchall()
+    pending, rows = _chat_writer.read(user_id, query)
+    return ([(p.message, p.response, p.timestamp) for p in pending] + rows)[:limit]
+
+@timed_query
+def get_history_page(user_id, limit=50, before_id=None):
+    """
+    Keyset page of chat history, newest first.
+    Pass the last row's id as before_id to get the next (older) page; cost
+    depends on the page size, not on how deep the page is.
+
+    Buffered turns (id None) lead the first page. They are newer than any
+    stored turn, so later pages never contain them. Pages past the oldest
+    live turn come from chat_archive.
+    """
+    def query(conn):
+        c = conn.cursor()
+        c.execute(
+            """SELECT id, tp_decompress(message) AS message, tp_decompress(response) AS response, timestamp 
+               FROM chat_history 
+               WHERE user_id=? AND id<? 
+               ORDER BY id DESC 
+               LIMIT ?""",
+            (user_id, before_id if before_id is not None else 2 ** 63 - 1, limit)
+        )
+        return c.fetchall()
+    if before_id is None and _chat_writer.pending_count(user_id) >= limit:
+        # A page of only buffered turns would have no id for the next cursor
+        _chat_writer.sync(user_id)
+    pending, rows = _chat_writer.read(user_id, query)
+    if len(rows) < limit:
+        # Live rows ran out: continue into the archive, which holds only older ids
+        rows = list(rows) + get_archived_turns(
+            user_id, rows[-1][0] if rows else before_id, limit - len(rows)
+        )
+    if before_id is not None:
+        return rows
+    return ([(None, p.message, p.response, p.timestamp) for p in pending] + rows)[:limit]
+
+@timed_query
+def search_history(user_id, text, limit=20, after=None):
+    """
+    Ranked full-text search over a user's chat turns.
+
+    Args:
+        after: (rank, id) of the last result of the previous page, or None
+
+    Returns:
+        list of dicts: id, timestamp, rank, message_snippet, response_snippet
+        (snippets are HTML-escaped with matches wrapped in <mark>)
+    """
+    query = fts_query(text)
+    if query is None:
+        return []
+    
+    _chat_writer.sync(user_id)
+    with get_conn() as conn:
+        c = conn.cursor()
+        if not FTS_ENABLED:
+            like = f"%{text.strip()}%"
+            c.execute(
+                """SELECT id, timestamp, 0.0, tp_decompress(message), tp_decompress(response) 
+                   FROM chat_history 
+                   WHERE user_id=? AND (tp_decompress(message) LIKE ? OR tp_decompress(response) LIKE ?) AND id<? 
+                   ORDER BY id DESC 
+                   LIMIT ?""",
+                (user_id, like, like, after[1] if after else 2 ** 63 - 1, limit)
+            )
+            rows = [(r[0], r[1], r[2], r[3][:200], r[4][:200]) for r in c.fetchall()]
+        else:
+            rank, last_id = after if after else (float("-inf"), 0)
+            c.execute(
+                """SELECT h.id, h.timestamp, chat_fts.rank,
+                          snippet(chat_fts, 0, char(2), char(3), '…', 12),
+                          snippet(chat_fts, 1, char(2), char(3), '…', 24)
+                   FROM chat_fts 
+                   JOIN chat_history h ON h.id = chat_fts.rowid 
+                   WHERE chat_fts MATCH ? AND h.user_id=? 
+                     AND (chat_fts.rank > ? OR (chat_fts.rank = ? AND h.id > ?)) 
+                   ORDER BY chat_fts.rank, h.id 
+                   LIMIT ?""",
+                (query, user_id, rank, rank, last_id, limit)
+            )
+            rows = c.fetchall()
+            # Archived turns rank alongside live ones; keep the best of both
+            rows = sorted(
+                list(rows) + _search_archive(conn, user_id, text, query, rank, last_id, limit),
+                key=lambda r: (r[2], r[0])
+            )[:limit]
+    
+    return [
+        {
+            "id": r[0],
+            "timestamp": r[1],
+            "rank": r[2],
+            "message_snippet": _highlight(r[3]),
+            "response_snippet": _highlight(r[4]),
+        }
+        for r in rows
+    ]
 
+@timed_query
 def get_chat_sessions(user_id, limit=20):
     """Get chat sessions with first message preview"""
-    with get_conn() as conn:
+    def query(conn):
         c = conn.cursor()
         c.execute(
-            """SELECT id, message, timestamp 
+            """SELECT id, tp_decompress(message) AS message, timestamp 
                FROM chat_history 
                WHERE user_id=? 
                ORDER BY id DESC 
@@ -135,17 +1089,436 @@ def get_chat_sessions(user_id, limit=20):
             (user_id, limit)
         )
         return c.fetchall()
+    pending, rows = _chat_writer.read(user_id, query)
+    return ([(None, p.message, p.timestamp) for p in pending] + rows)[:limit]
+
+@timed_query
+def get_turns_after(user_id, after_id=0, limit=50):
+    """Newest-first chat turns with id > after_id (for conversation context)"""
+    _chat_writer.sync(user_id)
+    with get_conn() as conn:
+        c = conn.cursor()
+        c.execute(
+            """SELECT id, tp_decompress(message) AS message, tp_decompress(response) AS response 
+               FROM chat_history 
+               WHERE user_id=? AND id>? 
+               ORDER BY id DESC 
+               LIMIT ?""",
+            (user_id, after_id, limit)
+        )
+        return c.fetchall()
+
+@timed_query
+def get_turns_between(user_id, after_id, before_id, limit=50):
+    """Oldest-first chat turns with after_id < id < before_id"""
+    _chat_writer.sync(user_id)
+    with get_conn() as conn:
+        c = conn.cursor()
+        c.execute(
+            """SELECT id, tp_decompress(message) AS message, tp_decompress(response) AS response 
+               FROM chat_history 
+               WHERE user_id=? AND id>? AND id<? 
+               ORDER BY id 
+               LIMIT ?""",
+            (user_id, after_id, before_id, limit)
+        )
+        return c.fetchall()
+
+@timed_query
+def get_chat_summary(user_id):
+    """Rolling summary row (summary, last_message_id) or None"""
+    with get_conn() as conn:
+        c = conn.cursor()
+        c.execute("SELECT summary, last_message_id FROM chat_summaries WHERE user_id=?", (user_id,))
+        return c.fetchone()
+
+@timed_query
+def save_chat_summary(user_id, summary, last_message_id):
+    """Replace a user's rolling summary"""
+    with get_conn() as conn:
+        c = conn.cursor()
+        c.execute(
+            "INSERT OR REPLACE INTO chat_summaries (user_id, summary, last_message_id, updated_at) VALUES (?, ?, ?, ?)",
+            (user_id, summary, last_message_id, datetime.utcnow().isoformat())
+        )
+        conn.commit()
 
+@timed_query
 def delete_user_history(user_id):
     """Delete all chat history for a user"""
+    _chat_writer.sync(user_id)
     with get_conn() as conn:
         c = conn.cursor()
+        _unindex_chats(conn, c.execute(
+            "SELECT id, tp_decompress(message), tp_decompress(response) FROM chat_history WHERE user_id=?",
+            (user_id,)
+        ).fetchall())
+        if _archive_search_ready(conn):
+            for segment in c.execute("SELECT codec, data FROM chat_archive WHERE user_id=?", (user_id,)).fetchall():
+                _unindex_archived(conn, user_id, json.loads(_decompress(segment[1], segment[0])))
         c.execute("DELETE FROM chat_history WHERE user_id=?", (user_id,))
+        c.execute("DELETE FROM chat_archive WHERE user_id=?", (user_id,))
+        c.execute("UPDATE chat_counts SET archived=0 WHERE user_id=?", (user_id,))
+        c.execute("DELETE FROM chat_summaries WHERE user_id=?", (user_id,))
         conn.commit()
 
+@timed_query
 def get_chat_count(user_id):
-    """Get total number of chats for a user"""
+    """Get total number of chats for a user (live + archived counters + buffered turns)"""
+    def query(conn):
+        row = conn.execute("SELECT total + archived FROM chat_counts WHERE user_id=?", (user_id,)).fetchone()
+        return row[0] if row else 0
+    pending, total = _chat_writer.read(user_id, query)
+    return total + len(pending)
+
+
+# ==================== CHAT ARCHIVE ====================
+# Old turns move out of chat_history into compressed chat_archive segments
+# (see retention.py). Segments hold a contiguous, oldest-first run of one
+# user's ids, so every archived id is older than every live id.
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+CHAT_ARCHIVE_CODEC = os.getenv("CHAT_ARCHIVE_CODEC", "zstd" if zstandard else "gzip")
+
+def _compress(data, codec):
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return gzip.compress(data, compresslevel=9)
+
+def _decompress(blob, codec):
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("chat_archive segment is zstd-compressed but zstandard is not installed")
+        return zstandard.ZstdDecompressor().decompress(blob)
+    return gzip.decompress(blob)
+
+@functools.lru_cache(maxsize=32)
+def _load_segment(segment_id):
+    """Decoded rows [id, message, response, timestamp] of one segment (segments never change)"""
+    with get_conn() as conn:
+        row = conn.execute("SELECT codec, data FROM chat_archive WHERE id=?", (segment_id,)).fetchone()
+    if row is None:
+        return ()
+    return tuple(tuple(r) for r in json.loads(_decompress(row["data"], row["codec"])))
+
+# chat_archive_fts indexes archived turns so search still finds them. It is
+# contentless (the text already lives in the segments): it can rank and
+# filter but not quote, so snippets are cut here from the decoded segment.
+# The owner column holds "u<user_id>" and scopes every query to one user.
+
+def _index_archived(conn, user_id, rows):
+    """Add archived [id, message, response, timestamp] rows to chat_archive_fts"""
+    conn.executemany(
+        "INSERT INTO chat_archive_fts(rowid, message, response, owner) VALUES (?, ?, ?, ?)",
+        [(r[0], r[1], r[2], f"u{user_id}") for r in rows]
+    )
+
+def _unindex_archived(conn, user_id, rows):
+    conn.executemany(
+        "INSERT INTO chat_archive_fts(chat_archive_fts, rowid, message, response, owner) VALUES ('delete', ?, ?, ?, ?)",
+        [(r[0], r[1], r[2], f"u{user_id}") for r in rows]
+    )
+
+def _archive_search_ready(conn):
+    return FTS_ENABLED and conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='chat_archive_fts'"
+    ).fetchone() is not None
+
+def _snippet(text, words, size):
+    """
+    Like FTS5 snippet(): about size tokens around the first match, matches
+    wrapped in \x02/\x03. Tokens match a search word by prefix.
+    """
+    tokens = list(re.finditer(r"\w+", text or ""))
+    if not tokens:
+        return text or ""
+    words = [w.lower() for w in words]
+    hit = [any(t.group().lower().startswith(w) for w in words) for t in tokens]
+    first = hit.index(True) if True in hit else 0
+    start = max(0, min(first - size // 4, len(tokens) - size))
+    end = min(len(tokens), start + size)
+    parts = ["…"] if start else []
+    position = tokens[start].start()
+    for token, matched in zip(tokens[start:end], hit[start:end]):
+        parts.append(text[position:token.start()])
+        parts.append(f"\x02{token.group()}\x03" if matched else token.group())
+        position = token.end()
+    parts.append("…" if end < len(tokens) else text[position:])
+    return "".join(parts)
+
+def _search_archive(conn, user_id, text, query, rank, last_id, limit):
+    """Archived matches as (id, timestamp, rank, message snippet, response snippet) rows"""
+    if not _archive_search_ready(conn):
+        return []
+    hits = conn.execute(
+        """SELECT rowid, rank FROM chat_archive_fts 
+           WHERE chat_archive_fts MATCH ? 
+             AND (rank > ? OR (rank = ? AND rowid > ?)) 
+           ORDER BY rank, rowid 
+           LIMIT ?""",
+        (f'owner : "u{user_id}" AND {{message response}} : ({query})', rank, rank, last_id, limit)
+    ).fetchall()
+    words = re.findall(r"\w+", text)
+    rows = []
+    for chat_id, hit_rank in hits:
+        segment = conn.execute(
+            "SELECT id FROM chat_archive WHERE user_id=? AND first_id<=? AND last_id>=?",
+            (user_id, chat_id, chat_id)
+        ).fetchone()
+        turn = next((r for r in _load_segment(segment[0]) if r[0] == chat_id), None) if segment else None
+        if turn is not None:
+            rows.append((chat_id, turn[3], hit_rank, _snippet(turn[1], words, 12), _snippet(turn[2], words, 24)))
+    return rows
+
+@timed_query
+def archive_chat_rows(user_id, up_to_id, segment_rows=500):
+    """
+    Move one segment of the user's oldest live turns with id <= up_to_id
+    into chat_archive, in a single transaction.
+
+    Returns:
+        (rows archived, uncompressed bytes, stored bytes); rows is 0 when
+        nothing is left to archive
+    """
+    with get_conn() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        rows = conn.execute(
+            """SELECT id, tp_decompress(message), tp_decompress(response), timestamp 
+               FROM chat_history 
+               WHERE user_id=? AND id<=? 
+               ORDER BY id 
+               LIMIT ?""",
+            (user_id, up_to_id, segment_rows)
+        ).fetchall()
+        if not rows:
+            return 0, 0, 0
+        raw = json.dumps([tuple(r) for r in rows], separators=(",", ":")).encode("utf-8")
+        blob = _compress(raw, CHAT_ARCHIVE_CODEC)
+        conn.execute(
+            """INSERT INTO chat_archive 
+               (user_id, first_id, last_id, first_timestamp, last_timestamp, row_count, codec, raw_bytes, data, created_at) 
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            (user_id, rows[0][0], rows[-1][0], rows[0][3], rows[-1][3], len(rows),
+             CHAT_ARCHIVE_CODEC, len(raw), blob, datetime.utcnow().isoformat())
+        )
+        _unindex_chats(conn, [tuple(r[:3]) for r in rows])
+        if _archive_search_ready(conn):
+            _index_archived(conn, user_id, rows)
+        conn.execute(
+            "DELETE FROM chat_history WHERE user_id=? AND id BETWEEN ? AND ?",
+            (user_id, rows[0][0], rows[-1][0])
+        )
+        conn.execute("UPDATE chat_counts SET archived = archived + ? WHERE user_id=?", (len(rows), user_id))
+    return len(rows), len(raw), len(blob)
+
+@timed_query
+def get_archived_turns(user_id, before_id=None, limit=50):
+    """Newest-first archived turns (id, message, response, timestamp) with id < before_id"""
+    before_id = before_id if before_id is not None else 2 ** 63 - 1
+    with get_conn() as conn:
+        segments = conn.execute(
+            """SELECT id FROM chat_archive 
+               WHERE user_id=? AND first_id<? 
+               ORDER BY last_id DESC""",
+            (user_id, before_id)
+        ).fetchall()
+    turns = []
+    for segment in segments:
+        for row in reversed(_load_segment(segment[0])):
+            if row[0] < before_id:
+                turns.append(row)
+                if len(turns) >= limit:
+                    return turns
+    return turns
+
+@timed_query
+def retention_candidates(max_rows, cutoff):
+    """
+    (user_id, archive up to this id) for users over the per-user row cap
+    or with turns older than cutoff (ISO timestamp). 0/None disables a rule.
+    """
+    bounds = {}
+    with get_conn() as conn:
+        if max_rows:
+            for row in conn.execute("SELECT user_id FROM chat_counts WHERE total > ?", (max_rows,)).fetchall():
+                edge = conn.execute(
+                    "SELECT id FROM chat_history WHERE user_id=? ORDER BY id DESC LIMIT 1 OFFSET ?",
+                    (row[0], max_rows)
+                ).fetchone()
+                if edge:
+                    bounds[row[0]] = edge[0]
+        if cutoff:
+            for row in conn.execute(
+                "SELECT user_id, MAX(id) FROM chat_history WHERE timestamp < ? GROUP BY user_id", (cutoff,)
+            ).fetchall():
+                bounds[row[0]] = max(bounds.get(row[0], 0), row[1])
+    return sorted(bounds.items())
+
+def incremental_vacuum(pages):
+    """
+    Release up to pages free pages back to the file system.
+    Returns (pages freed, free pages left), or None when the database is
+    not in auto_vacuum=INCREMENTAL mode (needs a one-time VACUUM).
+    """
+    conn = get_conn()
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        return None
+    before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    # executescript steps the pragma to completion; execute() frees a single page
+    conn.executescript(f"PRAGMA incremental_vacuum({int(pages)});")
+    after = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    return before - after, after
+
+def enable_incremental_vacuum():
+    """Switch an existing database to auto_vacuum=INCREMENTAL (rewrites the whole file)"""
+    conn = get_conn()
+    conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    conn.execute("VACUUM")
+
+# ==================== FORENSIC JOBS ====================
+
+@timed_query
+def create_forensic_job(job_id, user_id, filenames, owner=None):
+    """Create a job row plus one queued row per file; owner identifies the running process"""
+    with get_conn() as conn:
+        c = conn.cursor()
+        c.execute(
+            "INSERT INTO forensic_jobs (id, user_id, status, total, created_at, owner) VALUES (?, ?, 'queued', ?, ?, ?)",
+            (job_id, user_id, len(filenames), datetime.utcnow().isoformat(), owner)
+        )
+        c.executemany(
+            "INSERT INTO forensic_job_files (job_id, position, filename) VALUES (?, ?, ?)",
+            [(job_id, position, filename) for position, filename in enumerate(filenames)]
+        )
+        conn.commit()
+
+@timed_query
+def update_forensic_job_file(job_id, position, status, analysis=None, error=None, degraded=False):
+    """Record the state or result of one file in a job"""
     with get_conn() as conn:
         c = conn.cursor()
-        c.execute("SELECT COUNT(*) FROM chat_history WHERE user_id=?", (user_id,))
-        return c.fetchone()[0]
+        c.execute(
+            """UPDATE forensic_job_files 
+               SET status=?, analysis=?, error=?, degraded=?, updated_at=? 
+               WHERE job_id=? AND position=?""",
+            (status, analysis, error, int(degraded), datetime.utcnow().isoformat(), job_id, position)
+        )
+        conn.commit()
+
+@timed_query
+def update_forensic_job_status(job_id, status, finished=False):
+    """Set the overall job status"""
+    with get_conn() as conn:
+        c = conn.cursor()
+        c.execute(
+            "UPDATE forensic_jobs SET status=?, finished_at=? WHERE id=?",
+            (status, datetime.utcnow().isoformat() if finished else None, job_id)
+        )
+        conn.commit()
+
+@timed_query
+def get_forensic_job(job_id, user_id):
+    """Get a job owned by user_id with per-status file counts"""
+    with get_conn() as conn:
+        c = conn.cursor()
+        c.execute(
+            "SELECT id, status, total, created_at, finished_at, owner FROM forensic_jobs WHERE id=? AND user_id=?",
+            (job_id, user_id)
+        )
+        job = c.fetchone()
+        if not job:
+            return None, {}
+        c.execute(
+            "SELECT status, COUNT(*) FROM forensic_job_files WHERE job_id=? GROUP BY status",
+            (job_id,)
+        )
+        return job, {row[0]: row[1] for row in c.fetchall()}
+
+@timed_query
+def get_unfinished_forensic_jobs():
+    """(id, owner) of every job still queued or running"""
+    with get_conn() as conn:
+        return conn.execute(
+            "SELECT id, owner FROM forensic_jobs WHERE status IN ('queued', 'running')"
+        ).fetchall()
+
+@timed_query
+def fail_forensic_job(job_id, error):
+    """
+    Fail a job and its unfinished files in one transaction (finished files
+    keep their results). Returns False if the job had already finished.
+    """
+    now = datetime.utcnow().isoformat()
+    with get_conn() as conn:
+        c = conn.cursor()
+        c.execute(
+            "UPDATE forensic_jobs SET status='failed', finished_at=? WHERE id=? AND status IN ('queued', 'running')",
+            (now, job_id)
+        )
+        if not c.rowcount:
+            return False
+        c.execute(
+            """UPDATE forensic_job_files 
+               SET status='failed', error=?, updated_at=? 
+               WHERE job_id=? AND status IN ('queued', 'running')""",
+            (error, now, job_id)
+        )
+        return True
+
+@timed_query
+def get_forensic_job_files(job_id):
+    """Get per-file rows for a job in submission order"""
+    with get_conn() as conn:
+        c = conn.cursor()
+        c.execute(
+            """SELECT position, filename, status, analysis, error, degraded, updated_at 
+               FROM forensic_job_files 
+               WHERE job_id=? 
+               ORDER BY position""",
+            (job_id,)
+        )
+        return c.fetchall()
+
+
+# ==================== INCREMENTAL ANALYSIS ====================
+
+@timed_query
+def get_analysis_units(fingerprints):
+    """Return {fingerprint: explanation} for the fingerprints already analyzed"""
+    if not fingerprints:
+        return {}
+    unique = list(dict.fromkeys(fingerprints))
+    found = {}
+    with get_conn() as conn:
+        c = conn.cursor()
+        # Stay well under SQLite's bound-parameter limit
+        for i in range(0, len(unique), 500):
+            batch = unique[i:i + 500]
+            placeholders = ",".join("?" * len(batch))
+            c.execute(
+                f"SELECT fingerprint, explanation FROM analysis_units WHERE fingerprint IN ({placeholders})",
+                batch
+            )
+            found.update({row[0]: row[1] for row in c.fetchall()})
+            c.execute(
+                f"UPDATE analysis_units SET last_used_at=? WHERE fingerprint IN ({placeholders})",
+                [datetime.utcnow().isoformat()] + batch
+            )
+        conn.commit()
+    return found
+
+@timed_query
+def save_analysis_unit(fingerprint, name, explanation):
+    """Store the analysis of one unit"""
+    now = datetime.utcnow().isoformat()
+    with get_conn() as conn:
+        c = conn.cursor()
+        c.execute(
+            "INSERT OR REPLACE INTO analysis_units (fingerprint, name, explanation, created_at, last_used_at) VALUES (?, ?, ?, ?, ?)",
+            (fingerprint, name, explanation, now, now)
+        )
+        conn.commit()
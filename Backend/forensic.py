@@ -3,9 +3,13 @@ TracePoint AI - Enhanced Forensic Analysis Module
 Comprehensive code forensics with AI
 """
 
-from flask import Blueprint, request, jsonify, render_template
-from flask_login import login_required
-from llm import forensic_analysis
+from flask import Blueprint, request, jsonify, render_template, url_for
+from flask_login import login_required, current_user
+from llm import forensic_analysis, ask_llm, chat_response, llm_available, static_fallback
+from jobs import submit_batch, get_job
+from llm_client import request_deadline, LLM_FORENSIC_TIMEOUT, LLMUnavailable
+from ratelimit import RateLimited, admit, rate_limited
+from static_analysis import analyze as static_analyze, language_for_filename
 from werkzeug.utils import secure_filename
 import os
 
@@ -18,6 +22,7 @@ ALLOWED_EXTENSIONS = {
 }
 
 MAX_FILE_SIZE = 1024 * 1024  # 1MB
+MAX_BATCH_FILES = int(os.getenv("FORENSIC_MAX_BATCH_FILES", "500"))
 
 def allowed_file(filename):
     """Check if file extension is allowed"""
@@ -29,6 +34,32 @@ def get_file_extension(filename):
     return filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
 
 
+def forensic_or_static(code, filename=None, static=None, deadline=None):
+    """
+    forensic_analysis, or the local static scan while the LLM is unavailable.
+
+    Returns:
+        (report, degraded)
+    """
+    if static is None:
+        static = static_analyze(code, language_for_filename(filename))
+    try:
+        if llm_available():
+            return forensic_analysis(code, filename, static, deadline), False
+    except LLMUnavailable:
+        pass
+    print("⚡ LLM unavailable; returning the static forensic scan")
+    return static_fallback(static, "Static Forensic Scan"), True
+
+
+def review_or_static(system, prompt, static, deadline=None):
+    """ask_llm for the focused API reviews, with the same static fallback"""
+    try:
+        return ask_llm(system, prompt, deadline), False
+    except LLMUnavailable:
+        return static_fallback(static, "Static Forensic Scan"), True
+
+
 @forensic.route("/forensic", methods=["GET", "POST"])
 @login_required
 def forensic_page():
@@ -38,6 +69,11 @@ def forensic_page():
     if request.method == "GET":
         return render_template("forensic.html")
     
+    try:
+        admit(current_user.id, "analyze")
+    except RateLimited as e:
+        return render_template("forensic.html", answer=f"⏳ {e} Try again in {int(e.retry_after)}s."), 429
+    
     try:
         answer = None
         
@@ -48,10 +84,10 @@ def forensic_page():
                 print(f"❓ Forensic question: {question[:50]}...")
                 
                 # Use forensic-specific AI response
-                from llm import chat_response
                 answer = chat_response(
                     f"As a code forensics expert, answer this: {question}",
-                    "developer"
+                    "developer",
+                    deadline=request_deadline(user_id=current_user.id, priority="chat")
                 )
         
         # Handle file upload
@@ -83,7 +119,7 @@ def forensic_page():
                         
                         if code_text:
                             print(f"🔍 Running forensic analysis on {filename} ({len(code_text)} chars)...")
-                            answer = forensic_analysis(code_text, filename)
+                            answer, _ = forensic_or_static(code_text, filename, deadline=request_deadline(LLM_FORENSIC_TIMEOUT, current_user.id))
                             print(f"✅ Forensic analysis complete")
                 
                 except Exception as e:
@@ -95,11 +131,11 @@ def forensic_page():
             
             if not code_text:
                 answer = "⚠️ No code provided"
-            elif len(code_text) > 100000:  # 100KB limit for pasted code
-                answer = f"❌ Code too long: {len(code_text)} characters\n\nMaximum: 100,000 characters"
+            elif len(code_text) > MAX_FILE_SIZE:  # large inputs are chunked by forensic_analysis
+                answer = f"❌ Code too long: {len(code_text)} characters\n\nMaximum: {MAX_FILE_SIZE:,} characters"
             else:
                 print(f"🔍 Running forensic analysis on pasted code ({len(code_text)} chars)...")
-                answer = forensic_analysis(code_text)
+                answer, _ = forensic_or_static(code_text, deadline=request_deadline(LLM_FORENSIC_TIMEOUT, current_user.id))
                 print(f"✅ Forensic analysis complete")
         
         else:
@@ -115,6 +151,7 @@ def forensic_page():
 
 @forensic.route("/forensic/api", methods=["POST"])
 @login_required
+@rate_limited("analyze")
 def forensic_api():
     """
     API endpoint for programmatic forensic analysis
@@ -128,13 +165,18 @@ def forensic_api():
         filename = data.get("filename")
         analysis_type = data.get("type", "comprehensive").lower()
         
-        if len(code) > 100000:
-            return jsonify({"error": "Code too long (max 100KB)"}), 400
+        if len(code) > MAX_FILE_SIZE:
+            return jsonify({"error": f"Code too long (max {MAX_FILE_SIZE // 1024}KB)"}), 400
         
-        # Different analysis types for API users
-        if analysis_type == "security":
-            from llm import ask_llm, get_enhanced_system_prompt
-            
+        static = static_analyze(code, data.get("lang") or language_for_filename(filename))
+        deadline = request_deadline(LLM_FORENSIC_TIMEOUT, current_user.id)
+        
+        # Different analysis types for API users; all get the static scan while the LLM is unavailable
+        degraded = not llm_available()
+        if degraded:
+            result = static_fallback(static, "Static Forensic Scan")
+        
+        elif analysis_type == "security":
             system = """You are a security analyst. Focus exclusively on:
 1. Security vulnerabilities (SQL injection, XSS, CSRF, etc.)
 2. Unsafe operations (eval, exec, system calls)
@@ -144,11 +186,9 @@ def forensic_api():
 
 Provide a prioritized list of security findings."""
             
-            result = ask_llm(system, f"Analyze this code for security issues:\n\n{code}")
+            result, degraded = review_or_static(system, f"Analyze this code for security issues:\n\n{code}", static, deadline)
         
         elif analysis_type == "quality":
-            from llm import ask_llm
-            
             system = """You are a code quality expert. Focus on:
 1. Code readability and clarity
 2. Design patterns and architecture
@@ -158,11 +198,9 @@ Provide a prioritized list of security findings."""
 
 Provide specific, actionable recommendations."""
             
-            result = ask_llm(system, f"Analyze this code for quality:\n\n{code}")
+            result, degraded = review_or_static(system, f"Analyze this code for quality:\n\n{code}", static, deadline)
         
         elif analysis_type == "performance":
-            from llm import ask_llm
-            
             system = """You are a performance optimization expert. Focus on:
 1. Algorithm complexity (Big-O analysis)
 2. Inefficient operations
@@ -172,16 +210,18 @@ Provide specific, actionable recommendations."""
 
 Provide specific optimization suggestions."""
             
-            result = ask_llm(system, f"Analyze this code for performance:\n\n{code}")
+            result, degraded = review_or_static(system, f"Analyze this code for performance:\n\n{code}", static, deadline)
         
         else:  # comprehensive (default)
-            result = forensic_analysis(code, filename)
+            result, degraded = forensic_or_static(code, filename, static, deadline)
         
         return jsonify({
             "analysis": result,
+            "static": static,
             "type": analysis_type,
             "code_length": len(code),
-            "filename": filename
+            "filename": filename,
+            "degraded": degraded
         }), 200
     
     except Exception as e:
@@ -197,7 +237,8 @@ Provide specific optimization suggestions."""
 @login_required
 def batch_analysis():
     """
-    Analyze multiple code files in batch
+    Submit multiple code files for batch analysis.
+    Returns a job id immediately; poll /forensic/jobs/<job_id> for progress.
     """
     try:
         data = request.get_json()
@@ -208,49 +249,69 @@ def batch_analysis():
         if not isinstance(files, list):
             return jsonify({"error": "Files must be an array"}), 400
         
-        if len(files) > 10:
-            return jsonify({"error": "Maximum 10 files per batch"}), 400
+        if not files:
+            return jsonify({"error": "No files provided"}), 400
+        
+        if len(files) > MAX_BATCH_FILES:
+            return jsonify({"error": f"Maximum {MAX_BATCH_FILES} files per batch"}), 400
         
-        results = []
+        batch = []
         
         for file_data in files:
+            if not isinstance(file_data, dict):
+                batch.append({"filename": "unknown", "error": "Invalid file entry"})
+                continue
+            
+            filename = file_data.get("filename", "unnamed")
+            
             if "code" not in file_data:
-                results.append({"error": "Missing code", "filename": file_data.get("filename", "unknown")})
+                batch.append({"filename": file_data.get("filename", "unknown"), "error": "Missing code"})
                 continue
             
             code = file_data["code"]
-            filename = file_data.get("filename", "unnamed")
             
-            if len(code) > 50000:
-                results.append({
-                    "error": "File too large",
-                    "filename": filename,
-                    "size": len(code)
-                })
+            if len(code) > MAX_FILE_SIZE:
+                batch.append({"filename": filename, "error": f"File too large ({len(code)} chars)"})
                 continue
             
-            try:
-                analysis = forensic_analysis(code, filename)
-                results.append({
-                    "filename": filename,
-                    "analysis": analysis,
-                    "success": True
-                })
-            except Exception as e:
-                results.append({
-                    "filename": filename,
-                    "error": str(e),
-                    "success": False
-                })
+            batch.append({"filename": filename, "code": code})
+        
+        # Batch budget is counted in files, so one large batch cannot drain the shared quota
+        admit(current_user.id, "batch", cost=sum(1 for f in batch if "code" in f))
+        
+        job_id = submit_batch(current_user.id, batch)
         
         return jsonify({
-            "results": results,
-            "total": len(files),
-            "successful": sum(1 for r in results if r.get("success", False))
-        }), 200
+            "job_id": job_id,
+            "status_url": url_for("forensic.job_status", job_id=job_id),
+            "total": len(batch)
+        }), 202
     
+    except RateLimited:
+        raise
     except Exception as e:
         return jsonify({
             "error": "Batch analysis failed",
             "details": str(e)
-        }), 500
\ No newline at end of file
+        }), 500
+
+
+@forensic.route("/forensic/jobs/<job_id>", methods=["GET"])
+@login_required
+def job_status(job_id):
+    """
+    Poll a batch job. Pass ?results=0 to get progress counters only.
+    """
+    try:
+        include_results = request.args.get("results", "1") != "0"
+        job = get_job(job_id, current_user.id, include_results)
+        if not job:
+            return jsonify({"error": "Job not found"}), 404
+        
+        return jsonify(job), 200
+    
+    except Exception as e:
+        return jsonify({
+            "error": "Failed to get job status",
+            "details": str(e)
+        }), 500
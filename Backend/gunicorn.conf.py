@@ -0,0 +1,95 @@
+"""
+TracePoint AI - gunicorn configuration
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Requests spend most of their time waiting on the LLM API (seconds), not
+on CPU, so the default profile is gthread: a few processes, many threads
+each. Profiles (WEB_WORKER_CLASS):
+
+- gthread (default): WEB_CONCURRENCY processes x WEB_THREADS threads.
+  No extra dependency; one blocked upstream call ties up one thread.
+- gevent: cooperative greenlets, WEB_WORKER_CONNECTIONS per process.
+  Best when thousands of requests wait at once; needs `pip install gevent`.
+  The stdlib is monkey-patched below, before the app is imported.
+- sync: one request per process at a time. Only for comparison; a slow
+  LLM call blocks the whole worker.
+
+Every setting below can be overridden by an environment variable
+(e.g. WEB_THREADS=32). Reload code with `kill -HUP <master pid>`, which
+replaces workers gracefully. With WEB_PRELOAD=1 the application lives in
+the master, so new code needs a full restart (or USR2 + QUIT for a
+zero-downtime binary upgrade).
+"""
+
+import multiprocessing
+import os
+import shutil
+
+worker_class = os.getenv("WEB_WORKER_CLASS", "gthread").strip().lower()
+
+if worker_class == "gevent":
+    # Must run before wsgi/app (and their threading, socket, ssl imports) load
+    from gevent import monkey
+    monkey.patch_all()
+
+# ==================== SERVER ====================
+
+bind = os.getenv("WEB_BIND", "0.0.0.0:5000")
+cpus = multiprocessing.cpu_count()
+
+if worker_class == "sync":
+    # One request per process: more processes make up for it
+    workers = int(os.getenv("WEB_CONCURRENCY", str(cpus * 2 + 1)))
+else:
+    # Threads/greenlets provide the concurrency; a process per core is enough
+    workers = int(os.getenv("WEB_CONCURRENCY", str(max(2, cpus))))
+
+threads = int(os.getenv("WEB_THREADS", "16")) if worker_class == "gthread" else 1
+worker_connections = int(os.getenv("WEB_WORKER_CONNECTIONS", "256"))
+
+# The longest legitimate request is a forensic report (LLM_FORENSIC_TIMEOUT, 180s).
+# gthread/gevent workers keep heartbeating during it; sync workers do not.
+timeout = int(os.getenv("WEB_TIMEOUT", "210"))
+graceful_timeout = int(os.getenv("WEB_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("WEB_KEEPALIVE", "5"))
+
+# Recycle workers now and then so slow leaks cannot grow without bound
+max_requests = int(os.getenv("WEB_MAX_REQUESTS", "5000"))
+max_requests_jitter = int(os.getenv("WEB_MAX_REQUESTS_JITTER", "500"))
+
+# Import the app once in the master: workers fork with it loaded
+# (faster spawn, shared memory pages). Incompatible with reload.
+reload = os.getenv("WEB_RELOAD", "0") == "1"
+preload_app = os.getenv("WEB_PRELOAD", "1") == "1" and not reload
+
+accesslog = os.getenv("WEB_ACCESS_LOG", "-") or None
+errorlog = "-"
+loglevel = os.getenv("WEB_LOG_LEVEL", "info")
+
+# ==================== HOOKS ====================
+
+def on_starting(server):
+    """Master, once: stale per-worker metrics from a previous run would be summed in"""
+    multiproc_dir = os.getenv("METRICS_MULTIPROC_DIR", "").strip()
+    if multiproc_dir:
+        shutil.rmtree(multiproc_dir, ignore_errors=True)
+        os.makedirs(multiproc_dir, exist_ok=True)
+    import wsgi
+    wsgi.init_server()
+    server.log.info(
+        f"TracePoint AI: {worker_class} x {workers} workers"
+        + (f" x {threads} threads" if worker_class == "gthread" else "")
+        + (f" x {worker_connections} connections" if worker_class == "gevent" else "")
+        + (", preloaded" if preload_app else "")
+    )
+
+
+def post_fork(server, worker):
+    import wsgi
+    wsgi.init_worker()
+
+
+def worker_exit(server, worker):
+    import wsgi
+    wsgi.shutdown_worker()
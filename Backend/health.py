@@ -0,0 +1,202 @@
+"""
+TracePoint AI - Health Checks
+A background prober runs every registered check each HEALTH_INTERVAL
+seconds and keeps the latest results in memory. /health, /health/live,
+/health/ready and /api/status only read that snapshot, so a load balancer
+polling every second costs a dictionary copy, not a database round trip
+or an upstream LLM call.
+
+Liveness: the process is up and serving requests.
+Readiness: every critical check passed in a snapshot that is not stale.
+"""
+
+import os
+import threading
+import time
+from datetime import datetime
+
+from db import get_conn, schema_version, chat_writer_stats, MIGRATIONS, CHAT_WRITE_MAX_PENDING
+from sandbox_pool import pool_stats, SANDBOX_POOL_ENABLED
+from sandbox_limits import run_slots, SANDBOX_CGROUP_ROOT
+
+# ==================== CONFIGURATION ====================
+
+HEALTH_INTERVAL = float(os.getenv("HEALTH_INTERVAL", "10"))  # seconds between probe rounds
+# Readiness fails once the snapshot is this old (the prober itself is stuck)
+HEALTH_STALE_AFTER = float(os.getenv("HEALTH_STALE_AFTER", str(HEALTH_INTERVAL * 3)))
+
+_checks = {}
+_lock = threading.Lock()
+_snapshot = {"checks": {}, "checked_at": None, "checked_monotonic": None, "rounds": 0}
+_thread = None
+_thread_pid = None
+_started = time.monotonic()
+
+
+def register_check(name, fn, critical=True):
+    """
+    Add a check to the probe round.
+
+    fn() returns (ok, details) where details is a JSON-serialisable dict.
+    A failing critical check makes the instance not ready; other checks
+    are reported but do not affect readiness.
+    """
+    with _lock:
+        _checks[name] = (fn, critical)
+    return fn
+
+
+def run_checks():
+    """Run every check once and store the results"""
+    with _lock:
+        checks = dict(_checks)
+    results = {}
+    for name, (fn, critical) in checks.items():
+        started = time.perf_counter()
+        try:
+            ok, details = fn()
+        except Exception as e:
+            ok, details = False, {"error": str(e)}
+        results[name] = {
+            "ok": bool(ok),
+            "critical": critical,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+            **details,
+        }
+    with _lock:
+        _snapshot["checks"] = results
+        _snapshot["checked_at"] = datetime.utcnow().isoformat()
+        _snapshot["checked_monotonic"] = time.monotonic()
+        _snapshot["rounds"] += 1
+    return results
+
+
+def _loop(interval):
+    while True:
+        try:
+            run_checks()
+        except Exception as e:
+            print(f"⚠️ Health probe round failed: {e}")
+        time.sleep(interval)
+
+
+def start_prober(interval=HEALTH_INTERVAL):
+    """Start the prober thread once per process (again after a fork)"""
+    global _thread, _thread_pid
+    if interval <= 0 or _thread_pid == os.getpid():
+        return False
+    with _lock:
+        if _thread_pid == os.getpid():
+            return False
+        _thread_pid = os.getpid()
+        _thread = threading.Thread(target=_loop, args=(interval,), name="health-prober", daemon=True)
+        _thread.start()
+    return True
+
+# ==================== SNAPSHOT ====================
+
+def liveness():
+    return {
+        "status": "alive",
+        "pid": os.getpid(),
+        "uptime_seconds": round(time.monotonic() - _started, 1),
+    }
+
+
+def readiness():
+    """
+    Latest probe results without running any check.
+
+    Returns:
+        tuple: (ready, report)
+    """
+    with _lock:
+        checks = {name: dict(result) for name, result in _snapshot["checks"].items()}
+        checked_at = _snapshot["checked_at"]
+        checked_monotonic = _snapshot["checked_monotonic"]
+        rounds = _snapshot["rounds"]
+        prober_running = _thread is not None and _thread.is_alive() and _thread_pid == os.getpid()
+
+    age = None if checked_monotonic is None else time.monotonic() - checked_monotonic
+    if age is None:
+        status = "starting"
+    elif age > HEALTH_STALE_AFTER:
+        status = "stale"
+    elif all(r["ok"] for r in checks.values() if r["critical"]):
+        status = "ready"
+    else:
+        status = "not_ready"
+
+    return status == "ready", {
+        "status": status,
+        "checked_at": checked_at,
+        "age_seconds": None if age is None else round(age, 3),
+        "rounds": rounds,
+        "prober_running": prober_running,
+        "checks": checks,
+    }
+
+
+def check_result(name):
+    """One check's latest result, or None before the first round"""
+    with _lock:
+        result = _snapshot["checks"].get(name)
+        return dict(result) if result else None
+
+# ==================== BUILT-IN CHECKS ====================
+
+def _check_database():
+    conn = get_conn()
+    conn.execute("SELECT 1").fetchone()
+    version = schema_version(conn)
+    latest = MIGRATIONS[-1][0]
+    writer = chat_writer_stats()
+    backlog_ok = writer["pending"] < CHAT_WRITE_MAX_PENDING
+    return version == latest and backlog_ok, {
+        "schema_version": version,
+        "latest_version": latest,
+        "writer_pending": writer["pending"],
+    }
+
+
+def _check_sandbox():
+    pools = pool_stats()
+    slots = run_slots.snapshot()
+    details = {
+        "pool_enabled": SANDBOX_POOL_ENABLED,
+        "pools": {lang: {"size": p["size"], "idle": p["idle"]} for lang, p in pools.items()},
+        "slots": slots,
+        "cgroup": bool(SANDBOX_CGROUP_ROOT),
+    }
+    # Every warm worker busy, or runs waiting for a slot (reported, never blocks readiness)
+    saturated = [lang for lang, p in pools.items() if p["idle"] == 0]
+    if slots["queued"]:
+        saturated.append("slots")
+    if saturated:
+        details["saturated"] = saturated
+    return not saturated, details
+
+
+def _check_llm():
+    # Configuration, scheduler and circuit-breaker state only; never an upstream call
+    import llm
+    configured, message = llm.test_llm_connection()
+    # The first round builds the client and loads its imports here, off the request path
+    llm.warm_up()
+    client = llm.get_client()
+    scheduler = client.scheduler.snapshot()
+    breaker = client.breaker.snapshot()
+    return configured and breaker["state"] == "closed", {
+        "status": message,
+        "breaker": breaker,
+        "in_flight": scheduler["in_flight"],
+        "queued": sum(scheduler["queued"].values()),
+        "calls": client.stats["calls"],
+        "failures": client.stats["failures"],
+    }
+
+
+register_check("database", _check_database)
+register_check("sandbox", _check_sandbox, critical=False)
+# Static analysis and history still work without the LLM
+register_check("llm", _check_llm, critical=False)
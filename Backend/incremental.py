@@ -0,0 +1,141 @@
+"""
+TracePoint AI - Incremental Re-Analysis
+Splits code into units (functions, classes, module sections), fingerprints
+each one and only sends changed or new units to the LLM. The explanation
+is stitched from stored fragments plus fresh ones.
+"""
+
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import chunking
+import llm
+from cache import normalize_code
+from db import get_analysis_units, save_analysis_unit
+
+INCREMENTAL_WORKERS = int(os.getenv("INCREMENTAL_WORKERS", "4"))
+
+# Bump when the per-unit prompt changes so old fragments are not reused
+UNIT_PROMPT_VERSION = "1"
+
+_executor = ThreadPoolExecutor(max_workers=INCREMENTAL_WORKERS, thread_name_prefix="analyze-unit")
+
+
+def fingerprint(unit_code, lang, audience, whole_file=False):
+    """Content hash of one unit; line numbers are deliberately excluded"""
+    raw = "\x1f".join([
+        UNIT_PROMPT_VERSION, llm.MODEL, lang, audience,
+        "file" if whole_file else "unit", normalize_code(unit_code),
+    ])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def plan(code, lang, audience):
+    """
+    Split code into units and look up which ones were analyzed before.
+
+    Returns:
+        (units, known) where each unit carries its 'fingerprint' and
+        known maps fingerprint -> stored explanation
+    """
+    units = chunking.split_units(code, lang)
+    if len(units) <= 1:
+        units = [{"name": "file", "kind": "file", "start_line": 1,
+                  "end_line": code.count("\n") + 1, "code": code}]
+    whole_file = len(units) == 1
+    for unit in units:
+        unit["fingerprint"] = fingerprint(unit["code"], lang, audience, whole_file)
+    return units, get_analysis_units([u["fingerprint"] for u in units])
+
+
+def iter_analysis(code, lang, audience, static, stats, stream=True, deadline=None):
+    """
+    Yield the explanation piece by piece, in file order.
+
+    Stored fragments are yielded immediately; fresh units are analyzed
+    concurrently and yielded as soon as their turn comes. 'stats' is
+    filled with total/reused/analyzed/failed counts. 'deadline' bounds
+    every LLM call made for this request.
+    """
+    units, known = plan(code, lang, audience)
+    fresh = [u for u in units if u["fingerprint"] not in known]
+    stats.update(total=len(units), reused=len(units) - len(fresh), analyzed=0, failed=0)
+
+    # Small programs: one unit, analyzed (and streamed) as a whole file
+    if len(units) == 1:
+        unit = units[0]
+        if not fresh:
+            yield known[unit["fingerprint"]]
+            return
+        # Failures raise, so only a reply that finished is stored
+        try:
+            if stream:
+                parts = []
+                for text in llm.analyze_code_stream(code, lang, audience, static, deadline):
+                    parts.append(text)
+                    yield text
+                explanation = "".join(parts)
+            else:
+                explanation = llm.analyze_code_with_ai(code, lang, audience, static, deadline)
+                yield explanation
+        except Exception:
+            stats["failed"] = 1
+            raise
+        save_analysis_unit(unit["fingerprint"], unit["name"], explanation)
+        stats["analyzed"] = 1
+        return
+
+    futures = {
+        u["fingerprint"]: _executor.submit(
+            llm.explain_code_unit, u["code"], u["name"], u["kind"], lang, audience, deadline
+        )
+        for u in fresh
+    }
+
+    yield (
+        f"This {lang} file has {len(units)} parts "
+        f"({static['lines']['total']} lines, {len(static['functions'])} functions, "
+        f"{len(static['classes'])} classes).\n"
+    )
+    for unit in units:
+        yield f"\n### {unit['name']} (lines {unit['start_line']}-{unit['end_line']})\n"
+        fp = unit["fingerprint"]
+        if fp in known:
+            yield known[fp] + "\n"
+            continue
+        try:
+            explanation = futures[fp].result()
+            save_analysis_unit(fp, unit["name"], explanation)
+            stats["analyzed"] += 1
+            yield explanation + "\n"
+        except llm.LLMUnavailable:
+            # The breaker opened mid-request: the route answers from static analysis
+            raise
+        except Exception as e:
+            stats["failed"] += 1
+            print(f"❌ Unit analysis failed for {unit['name']}: {e}")
+            yield "⚠️ This part could not be analyzed right now. Re-submit to retry it.\n"
+
+
+def analyze_incrementally(code, lang, audience, static, deadline=None):
+    """
+    Non-streaming form of iter_analysis.
+
+    Returns:
+        (explanation, stats)
+    """
+    stats = {}
+    explanation = "".join(iter_analysis(code, lang, audience, static, stats, stream=False, deadline=deadline))
+    return explanation, stats
+
+
+def units_summary(stats):
+    """Response payload for the 'reused N of M units' stat"""
+    return {
+        "reused": stats.get("reused", 0),
+        "total": stats.get("total", 0),
+        "analyzed": stats.get("analyzed", 0),
+        "failed": stats.get("failed", 0),
+        "message": f"reused {stats.get('reused', 0)} of {stats.get('total', 0)} units",
+    }
@@ -0,0 +1,200 @@
+"""
+TracePoint AI - Forensic Job Queue
+Runs batch forensic analysis on a bounded worker pool so the HTTP request
+only has to submit the batch and return a job id.
+
+Progress lives in this process, so every job records its owner process.
+A job whose owner is gone (restart, recycled gunicorn worker) can never
+finish: it is failed at worker start and when it is polled, and the
+client is asked to resubmit. Files are not kept, so it cannot be re-run.
+"""
+
+import os
+import socket
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from db import (
+    create_forensic_job, update_forensic_job_file, update_forensic_job_status,
+    get_forensic_job, get_forensic_job_files, get_unfinished_forensic_jobs, fail_forensic_job,
+)
+from llm import forensic_analysis, static_fallback
+from llm_client import Deadline, LLM_FORENSIC_TIMEOUT, LLMUnavailable
+from static_analysis import analyze as static_analyze, language_for_filename
+
+# LLM calls are I/O bound, so threads are enough to fan files out concurrently
+JOB_WORKERS = int(os.getenv("FORENSIC_JOB_WORKERS", "4"))
+
+_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="forensic-job")
+_pending = {}  # job_id -> number of files not yet finished
+_lock = threading.Lock()
+
+ORPHANED_ERROR = "The server restarted before this file was analyzed. Please resubmit it."
+
+_HOST = socket.gethostname()
+_owner = None  # (pid, "host:pid:token") of this process
+
+
+def owner_id():
+    """Identity of this process; the token tells a reused pid from its predecessor"""
+    global _owner
+    if _owner is None or _owner[0] != os.getpid():
+        _owner = (os.getpid(), f"{_HOST}:{os.getpid()}:{uuid.uuid4().hex[:8]}")
+    return _owner[1]
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def is_orphaned(owner):
+    """True when the process that owns a job is gone (jobs from other hosts are left alone)"""
+    if not owner:
+        return True  # created before owners were recorded
+    try:
+        host, pid, token = owner.rsplit(":", 2)
+        pid = int(pid)
+    except ValueError:
+        return True
+    if host != _HOST:
+        return False
+    if pid == os.getpid():
+        return owner != owner_id()
+    return not _pid_alive(pid)
+
+
+def recover_orphaned_jobs():
+    """Fail every unfinished job whose owner is gone; returns how many"""
+    failed = sum(
+        1 for job_id, owner in get_unfinished_forensic_jobs()
+        if is_orphaned(owner) and fail_forensic_job(job_id, ORPHANED_ERROR)
+    )
+    if failed:
+        print(f"🧹 Failed {failed} forensic jobs orphaned by a restart")
+    return failed
+
+
+def submit_batch(user_id, files):
+    """
+    Queue a batch of files for analysis.
+
+    Args:
+        user_id: Owner of the job
+        files: list of dicts with 'filename' and either 'code' or a
+               precomputed 'error' (validation failures are stored as-is)
+
+    Returns:
+        str: job id
+    """
+    job_id = uuid.uuid4().hex
+    create_forensic_job(job_id, user_id, [f["filename"] for f in files], owner_id())
+
+    runnable = []
+    for position, file_data in enumerate(files):
+        if file_data.get("error"):
+            update_forensic_job_file(job_id, position, "failed", error=file_data["error"])
+        else:
+            runnable.append((position, file_data))
+
+    if not runnable:
+        update_forensic_job_status(job_id, "completed", finished=True)
+        return job_id
+
+    with _lock:
+        _pending[job_id] = len(runnable)
+    update_forensic_job_status(job_id, "running")
+
+    for position, file_data in runnable:
+        _executor.submit(_run_file, job_id, user_id, position, file_data["code"], file_data["filename"])
+
+    print(f"🗂️ Forensic job {job_id} queued ({len(runnable)} files, {JOB_WORKERS} workers)")
+    return job_id
+
+
+def _run_file(job_id, user_id, position, code, filename):
+    """Worker: analyze one file and persist its result"""
+    try:
+        update_forensic_job_file(job_id, position, "running")
+        static = static_analyze(code, language_for_filename(filename))
+        degraded = False
+        try:
+            # Each file gets its own deadline, counted from when a worker picks it up
+            analysis = forensic_analysis(code, filename, static, Deadline(LLM_FORENSIC_TIMEOUT, user_id, "batch"))
+        except LLMUnavailable:
+            # Outage or open breaker: the static scan instead of failing the file
+            analysis, degraded = static_fallback(static, "Static Forensic Scan"), True
+        update_forensic_job_file(job_id, position, "done", analysis=analysis, degraded=degraded)
+    except Exception as e:
+        print(f"❌ Forensic job {job_id} file {filename} failed: {e}")
+        try:
+            update_forensic_job_file(job_id, position, "failed", error=str(e))
+        except Exception:
+            pass
+    finally:
+        _finish_one(job_id)
+
+
+def _finish_one(job_id):
+    with _lock:
+        _pending[job_id] -= 1
+        done = _pending[job_id] == 0
+        if done:
+            del _pending[job_id]
+    if done:
+        update_forensic_job_status(job_id, "completed", finished=True)
+        print(f"✅ Forensic job {job_id} complete")
+
+
+def get_job(job_id, user_id, include_results=True):
+    """
+    Get job progress for its owner.
+
+    Returns:
+        dict or None if the job does not exist or belongs to someone else
+    """
+    job, counts = get_forensic_job(job_id, user_id)
+    if not job:
+        return None
+    if job["status"] in ("queued", "running") and is_orphaned(job["owner"]):
+        # Its process died after the startup sweep (e.g. a recycled worker)
+        fail_forensic_job(job_id, ORPHANED_ERROR)
+        job, counts = get_forensic_job(job_id, user_id)
+
+    total = job["total"]
+    done = counts.get("done", 0)
+    failed = counts.get("failed", 0)
+    result = {
+        "job_id": job["id"],
+        "status": job["status"],
+        "total": total,
+        "completed": done + failed,
+        "successful": done,
+        "failed": failed,
+        "running": counts.get("running", 0),
+        "queued": counts.get("queued", 0),
+        "progress": round((done + failed) / total, 4) if total else 1.0,
+        "created_at": job["created_at"],
+        "finished_at": job["finished_at"],
+    }
+
+    if include_results:
+        result["results"] = [
+            {
+                "filename": row["filename"],
+                "status": row["status"],
+                "analysis": row["analysis"],
+                "error": row["error"],
+                "success": row["status"] == "done",
+                "degraded": bool(row["degraded"]),
+            }
+            for row in get_forensic_job_files(job_id)
+        ]
+
+    return result
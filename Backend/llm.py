@@ -4,14 +4,33 @@ Integrated with Google Gemini 2.0 Flash for real-world AI reasoning.
 """
 
 import os
-from google import genai
-from google.genai import types
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from cache import LeaderAbandoned, response_cache, make_key
+import static_analysis
+import chunking
+from llm_client import LLMClient, LLMError, LLMUnavailable, is_upstream_failure
+from ratelimit import set_scheduler
+from metrics import llm_timed
 
-# Initialize Gemini Client
-# Ensure you have set GEMINI_API_KEY in your environment variables
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-client = genai.Client(api_key=GEMINI_API_KEY)
+# Gemini by default; LLM_PROVIDER=stub swaps in the offline backend (see llm_providers.py).
+# Every call goes through LLMClient for deadlines, retries and bounded concurrency.
+# Built on first use so importing this module stays cheap (see get_client).
+client = None
+_client_lock = threading.Lock()
+MODEL = "gemini-2.0-flash"
+
+def get_client():
+    """The process-wide LLMClient, created on first use"""
+    global client
+    if client is None:
+        with _client_lock:
+            if client is None:
+                built = LLMClient()
+                set_scheduler(built.scheduler)
+                client = built
+    return client
 
 # ==================== SYSTEM PROMPTS ====================
 # Explicitly telling the AI its role to improve accuracy
@@ -22,23 +41,125 @@ SYSTEM_PROMPTS = {
     "forensics": "You are a cybersecurity forensic expert. Deep-scan code for vulnerabilities, data leaks, and malicious logic. Provide a formal security audit."
 }
 
-def analyze_code_with_ai(code, lang, audience="beginner"):
+def _unavailable(error):
+    """
+    LLMUnavailable standing in for an upstream failure, for functions whose
+    routes have a static fallback: users get that, never the raw error.
+    """
+    retry_after = client.breaker.retry_after() if client is not None else 0.0
+    return LLMUnavailable(f"AI service failed: {error}", retry_after)
+
+def _failure(error, what):
+    """
+    What a failed call raises: LLMUnavailable for upstream failures,
+    LLMError otherwise. Never an error string, which callers could
+    mistake for an answer and save.
+    """
+    if is_upstream_failure(error):
+        return _unavailable(error)
+    return LLMError(f"{what}: {error}")
+
+def _nonempty(text):
+    """An empty reply is a failure, not an answer to cache or save"""
+    if not text:
+        raise LLMError("empty response")
+    return text
+
+def _static_context(static):
+    """Prompt section carrying locally computed static analysis facts"""
+    summary = static_analysis.prompt_summary(static)
+    return (
+        "Static analysis facts (computed locally, already verified):\n"
+        f"{summary}\n\n"
+        "Do not restate these counts; use them to focus on behaviour, logic and the flagged risks."
+    )
+
+def _analysis_prompt(code, lang, audience, static):
+    role_prompt = SYSTEM_PROMPTS.get(audience, SYSTEM_PROMPTS["beginner"])
+    if static is None:
+        static = static_analysis.analyze(code, lang)
+    context = _static_context(static)
+    full_prompt = f"{role_prompt}\n\nAnalyze this {lang} code and provide a detailed explanation.\n\n{context}\n\n{code}"
+    key = make_key("analyze_code_with_ai", MODEL, role_prompt, audience, lang, code, static=context)
+    return full_prompt, key
+
+@llm_timed
+def analyze_code_with_ai(code, lang, audience="beginner", static=None, deadline=None):
     """
     Performs high-level code analysis using Gemini.
+    'static' is a static_analysis.analyze() result; computed here if omitted.
+    'deadline' is the route's llm_client.Deadline (every function below takes one).
     """
     try:
-        role_prompt = SYSTEM_PROMPTS.get(audience, SYSTEM_PROMPTS["beginner"])
-        full_prompt = f"{role_prompt}\n\nAnalyze this {lang} code and provide a detailed explanation:\n\n{code}"
+        full_prompt, key = _analysis_prompt(code, lang, audience, static)
         
-        response = client.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=full_prompt
-        )
-        return response.text
+        def generate():
+            return _nonempty(get_client().generate(full_prompt, model=MODEL, deadline=deadline))
+        
+        return response_cache.get_or_compute(key, generate)
+    except (LLMUnavailable, LLMError):
+        # Routes answer from static analysis instead
+        raise
     except Exception as e:
-        return f"⚠️ AI Analysis Error: {str(e)}"
+        raise _failure(e, "AI analysis failed") from e
 
-def chat_response(message, audience="beginner", history=None):
+@llm_timed
+def explain_code_unit(unit_code, name, kind, lang, audience="beginner", deadline=None):
+    """
+    Explains one function/class/section of a larger file.
+    """
+    role_prompt = SYSTEM_PROMPTS.get(audience, SYSTEM_PROMPTS["beginner"])
+    prompt = (
+        f"{role_prompt}\n\nThis {kind} `{name}` is one part of a larger {lang} file. "
+        "Explain what it does, how it works and anything notable about it, in a few short paragraphs. "
+        "Do not describe the rest of the file.\n\n"
+        f"{unit_code}"
+    )
+    key = make_key("explain_code_unit", MODEL, role_prompt, audience, lang, unit_code, name, kind=kind)
+    
+    def generate():
+        return _nonempty(get_client().generate(prompt, model=MODEL, deadline=deadline))
+    
+    return response_cache.get_or_compute(key, generate)
+
+def warm_up():
+    """Build the client and load deferred imports; called from the health prober's first round"""
+    get_client().warm_up()
+
+def test_llm_connection():
+    """
+    Whether the LLM provider is configured. Makes no API call, so it is
+    cheap enough for startup and the health prober.
+
+    Returns:
+        tuple: (ok, message)
+    """
+    from llm_providers import LLM_PROVIDER
+    if LLM_PROVIDER == "stub":
+        return True, "✅ Stub LLM provider (offline)"
+    if not os.getenv("GEMINI_API_KEY"):
+        return False, "❌ GEMINI_API_KEY is not set"
+    return True, f"✅ Gemini configured ({MODEL})"
+
+def llm_available():
+    """False while the circuit breaker is open; routes then answer from static analysis"""
+    return client is None or client.available()
+
+def static_fallback(static, title="Static Analysis"):
+    """
+    Locally computed answer used while the LLM is unavailable.
+    Never cached or saved, so the AI version is produced once it recovers.
+    """
+    retry_after = get_client().breaker.retry_after()
+    retrying = f" (retrying in about {retry_after:.0f}s)" if retry_after >= 1 else ""
+    return (
+        f"ℹ️ The AI service is temporarily unavailable{retrying}. "
+        f"Here is the local {title.lower()} in the meantime.\n\n"
+        f"## {title}\n{static_analysis.prompt_summary(static)}"
+    )
+
+@llm_timed
+def chat_response(message, audience="beginner", history=None, deadline=None):
     """
     Handles conversational chat with context/history.
     'history' should be a list of dicts: [{'role': 'user', 'parts': [...]}, ...]
@@ -46,51 +167,252 @@ def chat_response(message, audience="beginner", history=None):
     try:
         role_prompt = SYSTEM_PROMPTS.get(audience, SYSTEM_PROMPTS["beginner"])
         
-        # Initialize chat with system instruction
-        chat = client.chats.create(
-            model="gemini-2.0-flash",
-            config=types.GenerateContentConfig(system_instruction=role_prompt),
-            history=history or []
-        )
-        
-        response = chat.send_message(message)
-        return response.text
+        # Chat seeded with history, under the role's system instruction
+        return _nonempty(get_client().chat(message, history, system=role_prompt, model=MODEL, deadline=deadline))
+    except (LLMUnavailable, LLMError):
+        raise
     except Exception as e:
-        return f"⚠️ Chat Error: {str(e)}"
+        raise _failure(e, "Chat failed") from e
 
-def answer_code_question(question, code, lang, audience="beginner"):
+@llm_timed
+def summarize_conversation(previous_summary, turns, deadline=None):
+    """
+    Folds older chat turns into a rolling summary.
+    'turns' is a list of (message, response) pairs, oldest first.
+    Raises on upstream failure so a bad summary is never stored.
+    """
+    transcript = "\n\n".join(f"User: {m}\nAssistant: {r}" for m, r in turns)
+    prompt = (
+        "Update the running summary of a tutoring conversation between a student and a coding assistant. "
+        "Keep facts the assistant will need later: the student's goals, level, languages, code they shared, "
+        "decisions made and open questions. Write at most 200 words of plain prose.\n\n"
+        f"Current summary:\n{previous_summary or '(none yet)'}\n\n"
+        f"New turns:\n{transcript}"
+    )
+    text = get_client().generate(prompt, model=MODEL, deadline=deadline)
+    if not text:
+        raise RuntimeError("empty summary")
+    return text.strip()
+
+@llm_timed
+def answer_code_question(question, code, lang, audience="beginner", deadline=None):
     """
     Answers a specific question about a provided block of code.
     """
     try:
         role_prompt = SYSTEM_PROMPTS.get(audience, SYSTEM_PROMPTS["beginner"])
         context_prompt = f"Code Context ({lang}):\n```\n{code}\n```\n\nQuestion: {question}"
+        key = make_key("answer_code_question", MODEL, role_prompt, audience, lang, code, question)
         
-        response = client.models.generate_content(
-            model="gemini-2.0-flash",
-            config=types.GenerateContentConfig(system_instruction=role_prompt),
-            contents=context_prompt
-        )
-        return response.text
+        def generate():
+            return _nonempty(get_client().generate(context_prompt, system=role_prompt, model=MODEL, deadline=deadline))
+        
+        return response_cache.get_or_compute(key, generate)
+    except (LLMUnavailable, LLMError):
+        raise
+    except Exception as e:
+        raise _failure(e, "Q&A failed") from e
+
+@llm_timed
+def ask_llm(system, prompt, deadline=None):
+    """
+    One prompt under a caller-supplied system instruction
+    (the forensic API's security / quality / performance reviews).
+    """
+    try:
+        key = make_key("ask_llm", MODEL, system, question=prompt)
+        
+        def generate():
+            return _nonempty(get_client().generate(prompt, system=system, model=MODEL, deadline=deadline))
+        
+        return response_cache.get_or_compute(key, generate)
+    except (LLMUnavailable, LLMError):
+        raise
     except Exception as e:
-        return f"⚠️ Q&A Error: {str(e)}"
+        raise _failure(e, "AI analysis failed") from e
 
-def forensic_analysis(code, filename=None):
+FORENSIC_REPORT_TEMPLATE = (
+    "Generate a formal Forensic Code Analysis Report. "
+    "Include sections for: 1. Executive Summary, 2. Structural Analysis, "
+    "3. Security Vulnerabilities (High/Med/Low), 4. Data Flow Integrity, and 5. Remediation Steps."
+)
+
+# Inputs larger than this are split into chunks analyzed in parallel
+FORENSIC_CHUNK_THRESHOLD = int(os.getenv("FORENSIC_CHUNK_THRESHOLD", str(chunking.CHUNK_MAX_CHARS)))
+FORENSIC_CHUNK_WORKERS = int(os.getenv("FORENSIC_CHUNK_WORKERS", "4"))
+
+_chunk_executor = ThreadPoolExecutor(max_workers=FORENSIC_CHUNK_WORKERS, thread_name_prefix="forensic-chunk")
+
+@llm_timed
+def forensic_analysis(code, filename=None, static=None, deadline=None):
     """
     Generates a professional forensic security report.
+    'static' is a static_analysis.analyze() result; computed here if omitted.
+    Inputs above FORENSIC_CHUNK_THRESHOLD chars are analyzed chunk by chunk
+    in parallel and merged (map-reduce).
     """
     try:
-        report_template = (
-            "Generate a formal Forensic Code Analysis Report. "
-            "Include sections for: 1. Executive Summary, 2. Structural Analysis, "
-            "3. Security Vulnerabilities (High/Med/Low), 4. Data Flow Integrity, and 5. Remediation Steps."
+        lang = static_analysis.language_for_filename(filename)
+        if static is None:
+            static = static_analysis.analyze(code, lang)
+        context = _static_context(static)
+        
+        if len(code) > FORENSIC_CHUNK_THRESHOLD:
+            chunks = chunking.split_code(code, lang, FORENSIC_CHUNK_THRESHOLD)
+            if len(chunks) > 1:
+                return _forensic_map_reduce(chunks, filename, context, deadline)
+        
+        report_template = f"{FORENSIC_REPORT_TEMPLATE}\n\n{context}"
+        key = make_key(
+            "forensic_analysis", MODEL, SYSTEM_PROMPTS["forensics"], "forensics",
+            code=code, question=report_template, filename=filename or "Input"
         )
         
-        response = client.models.generate_content(
-            model="gemini-2.0-flash",
-            config=types.GenerateContentConfig(system_instruction=SYSTEM_PROMPTS["forensics"]),
-            contents=f"{report_template}\n\nFile: {filename or 'Input'}\n\nCode:\n{code}"
+        def generate():
+            return _nonempty(get_client().generate(
+                f"{report_template}\n\nFile: {filename or 'Input'}\n\nCode:\n{code}",
+                system=SYSTEM_PROMPTS["forensics"], model=MODEL, deadline=deadline
+            ))
+        
+        return response_cache.get_or_compute(key, generate)
+    except (LLMUnavailable, LLMError):
+        raise
+    except Exception as e:
+        raise _failure(e, "Forensic engine failed") from e
+
+# ==================== CHUNKED FORENSICS ====================
+
+def _chunk_label(chunk, total):
+    names = ", ".join(chunk["names"][:6])
+    return f"Part {chunk['index'] + 1} of {total} (lines {chunk['start_line']}-{chunk['end_line']}: {names})"
+
+@llm_timed
+def _forensic_chunk_findings(chunk, total, filename, deadline=None):
+    """Map step: concise findings for one chunk"""
+    label = _chunk_label(chunk, total)
+    instructions = (
+        f"You are reviewing {label} of {filename or 'Input'}. "
+        "List concrete findings only, as short bullet points under the headings "
+        "Structure, Vulnerabilities (each with severity High/Med/Low and line numbers) and Data Flow. "
+        "Use line numbers from the original file. Keep it under 300 words."
+    )
+    key = make_key(
+        "forensic_chunk", MODEL, SYSTEM_PROMPTS["forensics"], "forensics",
+        code=chunk["code"], question=instructions
+    )
+    
+    def generate():
+        numbered = "\n".join(
+            f"{chunk['start_line'] + offset}: {line}"
+            for offset, line in enumerate(chunk["code"].split("\n"))
         )
-        return response.text
+        return get_client().generate(
+            f"{instructions}\n\nCode:\n{numbered}",
+            system=SYSTEM_PROMPTS["forensics"], model=MODEL, deadline=deadline
+        )
+    
+    return response_cache.get_or_compute(key, generate)
+
+def _forensic_map_reduce(chunks, filename, context, deadline=None):
+    """
+    Analyze chunks concurrently, then merge their findings into the
+    standard five-section report. A failed chunk is reported as a gap
+    instead of failing the whole analysis.
+    """
+    total = len(chunks)
+    print(f"🧩 Forensic map-reduce: {total} chunks, {FORENSIC_CHUNK_WORKERS} workers")
+    futures = [_chunk_executor.submit(_forensic_chunk_findings, chunk, total, filename, deadline) for chunk in chunks]
+    
+    sections = []
+    failures = 0
+    for chunk, future in zip(chunks, futures):
+        try:
+            findings = future.result()
+        except LLMUnavailable:
+            raise
+        except Exception as e:
+            failures += 1
+            findings = f"(Findings unavailable for this part: {e})"
+        sections.append(f"### {_chunk_label(chunk, total)}\n{findings}")
+    
+    if failures == total:
+        raise RuntimeError("all chunks failed to analyze")
+    
+    merged = "\n\n".join(sections)
+    reduce_prompt = (
+        f"{FORENSIC_REPORT_TEMPLATE}\n\n{context}\n\n"
+        f"The file {filename or 'Input'} was too large for one pass and was reviewed in {total} parts. "
+        "Merge the per-part findings below into a single report: deduplicate, keep line numbers, "
+        "rank vulnerabilities by severity and note any parts whose findings are unavailable.\n\n"
+        f"{merged}"
+    )
+    key = make_key("forensic_reduce", MODEL, SYSTEM_PROMPTS["forensics"], "forensics", question=reduce_prompt)
+    
+    def generate():
+        return _nonempty(get_client().generate(reduce_prompt, system=SYSTEM_PROMPTS["forensics"], model=MODEL, deadline=deadline))
+    
+    # Don't cache a merge that is missing parts; retry them next time
+    if failures:
+        return generate()
+    return response_cache.get_or_compute(key, generate)
+
+# ==================== STREAMING ====================
+# Generators that yield text fragments as Gemini produces them.
+# Like the blocking functions they raise on failure, even after some text
+# went out: a half reply must never pass for a complete one.
+
+@llm_timed
+def analyze_code_stream(code, lang, audience="beginner", static=None, deadline=None):
+    """
+    Streaming variant of analyze_code_with_ai.
+    Shares its cache entry, so a cached analysis is yielded in one piece.
+    Upstream failures raise LLMUnavailable, even after some text went out.
+    """
+    full_prompt, key = _analysis_prompt(code, lang, audience, static)
+    
+    cached = response_cache.get(key)
+    if cached is not None:
+        yield cached
+        return
+    
+    try:
+        # Identical prompt already in flight (streamed or not): wait and share it
+        while True:
+            future, leader = response_cache.claim(key)
+            if leader:
+                break
+            try:
+                shared = future.result()
+            except LeaderAbandoned:
+                continue  # its client went away: take over
+            yield shared
+            return
+        
+        parts = []
+        try:
+            for text in get_client().generate_stream(full_prompt, model=MODEL, deadline=deadline):
+                parts.append(text)
+                yield text
+        except Exception as e:
+            response_cache.resolve(key, future, error=e)
+            raise
+        except BaseException:
+            # Client disconnect (GeneratorExit): not a failure for the waiters
+            response_cache.abandon(key, future)
+            raise
+        response_cache.resolve(key, future, "".join(parts))
+    except LLMUnavailable:
+        raise
     except Exception as e:
-        return f"⚠️ Forensic Engine Error: {str(e)}"
\ No newline at end of file
+        if is_upstream_failure(e):
+            raise _unavailable(e) from e
+        raise
+
+@llm_timed
+def chat_response_stream(message, audience="beginner", history=None, deadline=None):
+    """
+    Streaming variant of chat_response.
+    """
+    role_prompt = SYSTEM_PROMPTS.get(audience, SYSTEM_PROMPTS["beginner"])
+    
+    yield from get_client().chat_stream(message, history, system=role_prompt, model=MODEL, deadline=deadline)
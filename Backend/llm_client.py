@@ -0,0 +1,473 @@
+"""
+TracePoint AI - LLM Client Layer
+Wraps the provider client from llm_providers with:
+- a per-request Deadline that routes pass down through llm.py
+- bounded concurrency (LLM_MAX_CONCURRENCY calls in flight per process),
+  granted by ratelimit.Scheduler in priority / per-user fair order
+- jittered exponential backoff on 429/5xx and transport errors
+- a circuit breaker that fails calls instantly with LLMUnavailable
+  after repeated upstream failures, then lets one probe call through
+  every LLM_BREAKER_RESET seconds until the provider recovers
+- thread-pool (submit) and asyncio (agenerate) entry points
+
+A stuck upstream call fails with LLMTimeout when its deadline passes
+instead of pinning the request thread.
+"""
+
+import asyncio
+import os
+import queue
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from llm_providers import build_client
+from ratelimit import Scheduler
+from metrics import LLM_ATTEMPT_SECONDS, LLM_QUEUE_SECONDS, add_upstream
+
+# ==================== CONFIGURATION ====================
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5"))  # seconds
+LLM_RETRY_MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_DELAY", "8"))
+# Deadline for interactive routes and for calls made without one
+LLM_REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", "60"))
+# Forensic reports (possibly map-reduce over many chunks) get longer
+LLM_FORENSIC_TIMEOUT = float(os.getenv("LLM_FORENSIC_TIMEOUT", "180"))
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+LLM_BREAKER_ENABLED = os.getenv("LLM_BREAKER_ENABLED", "1") == "1"
+# Consecutive failed attempts (timeouts, 5xx, transport errors) that open the breaker
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_RESET = float(os.getenv("LLM_BREAKER_RESET", "30"))  # seconds open before a probe
+
+
+class LLMTimeout(Exception):
+    """The request's deadline passed before the LLM answered"""
+
+
+class LLMUnavailable(Exception):
+    """The circuit breaker is open; the call was not attempted"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class LLMError(Exception):
+    """The LLM call failed for a reason other than an upstream failure (bad request, empty reply)"""
+
+
+class Deadline:
+    """
+    Absolute point in time a request must finish by, plus who the calls are
+    for (user_id, priority) so the scheduler can queue them fairly.
+    """
+
+    def __init__(self, seconds, user_id=None, priority="analyze"):
+        self.expires_at = time.monotonic() + seconds
+        self.user_id = user_id
+        self.priority = priority
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        return self.remaining() <= 0
+
+
+def request_deadline(seconds=LLM_REQUEST_TIMEOUT, user_id=None, priority="analyze"):
+    """Deadline for one HTTP request; pass it to every llm.* call the route makes"""
+    return Deadline(seconds, user_id, priority)
+
+
+def is_retryable(error):
+    """429/5xx API errors and transport failures are worth another attempt"""
+    if isinstance(error, LLMTimeout):
+        return False
+    code = getattr(error, "code", None) or getattr(error, "status_code", None)
+    if isinstance(code, int):
+        return code in RETRYABLE_STATUS
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    try:
+        import httpx
+        return isinstance(error, httpx.TransportError)
+    except ImportError:
+        return False
+
+
+def backoff_delay(attempt):
+    """Full-jitter exponential backoff"""
+    return random.uniform(0, min(LLM_RETRY_MAX_DELAY, LLM_RETRY_BASE_DELAY * (2 ** attempt)))
+
+
+def is_outage(error):
+    """
+    Failures that say the provider is down rather than that this request
+    was bad. 429 is left to the scheduler's adaptive rate.
+    """
+    if error is None:
+        return False
+    code = getattr(error, "code", None) or getattr(error, "status_code", None)
+    if code == 429:
+        return False
+    return isinstance(error, FutureTimeout) or is_retryable(error)
+
+def is_upstream_failure(error):
+    """
+    The provider failed (outage, throttling, deadline) rather than this
+    request being bad; callers with a static fallback serve it instead.
+    """
+    return isinstance(error, (LLMTimeout, LLMUnavailable)) or is_outage(error) or is_retryable(error)
+
+def _genai_types():
+    """google.genai.types, imported on first use: it alone takes ~0.2s, so it stays off the import path"""
+    from google.genai import types
+    return types
+
+# ==================== CIRCUIT BREAKER ====================
+
+class CircuitBreaker:
+    """
+    closed:    calls go through; consecutive outage failures are counted
+    open:      calls fail at once with LLMUnavailable for reset_timeout seconds
+    half_open: one probe call goes through; success closes, failure reopens
+    """
+
+    def __init__(self, failure_threshold=LLM_BREAKER_FAILURES, reset_timeout=LLM_BREAKER_RESET,
+                 enabled=LLM_BREAKER_ENABLED):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.enabled = enabled
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_started = None
+        self._lock = threading.Lock()
+        self.stats = {"opened": 0, "rejected": 0, "probes": 0}
+
+    def _retry_after(self, now):
+        if self.state == "open":
+            return max(0.0, self._opened_at + self.reset_timeout - now)
+        return max(0.0, self._probe_started + self.reset_timeout - now)
+
+    def _blocked(self, now):
+        if self.state == "open":
+            return now < self._opened_at + self.reset_timeout
+        if self.state == "half_open":
+            # A probe that never reported back (e.g. no scheduler slot) expires
+            return self._probe_started is not None and now < self._probe_started + self.reset_timeout
+        return False
+
+    def allow(self):
+        """
+        Admit one upstream attempt.
+
+        Raises:
+            LLMUnavailable: open, or half-open with the probe still in flight
+        """
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if self.state == "closed":
+                return
+            if self._blocked(now):
+                self.stats["rejected"] += 1
+                raise LLMUnavailable("AI service is temporarily unavailable", self._retry_after(now))
+            self.state = "half_open"
+            self._probe_started = now
+            self.stats["probes"] += 1
+
+    def available(self):
+        """Whether a call would be admitted right now (does not claim the probe)"""
+        if not self.enabled:
+            return True
+        with self._lock:
+            return not self._blocked(time.monotonic())
+
+    def retry_after(self):
+        with self._lock:
+            return self._retry_after(time.monotonic()) if self.state != "closed" else 0.0
+
+    def record(self, error=None):
+        """Feed back one attempt's outcome (error=None for success)"""
+        if not self.enabled:
+            return
+        with self._lock:
+            if not is_outage(error):
+                if self.state != "closed":
+                    print("✅ LLM circuit breaker closed; provider recovered")
+                self.state = "closed"
+                self._failures = 0
+                self._probe_started = None
+                return
+            self._failures += 1
+            if self.state == "half_open" or self._failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.stats["opened"] += 1
+                    print(f"🔌 LLM circuit breaker open after {self._failures} failures; "
+                          f"probing again in {self.reset_timeout:g}s")
+                self.state = "open"
+                self._opened_at = time.monotonic()
+                self._probe_started = None
+
+    def snapshot(self):
+        with self._lock:
+            now = time.monotonic()
+            return dict(
+                self.stats,
+                enabled=self.enabled,
+                state=self.state,
+                consecutive_failures=self._failures,
+                retry_after=round(self._retry_after(now), 1) if self.state != "closed" else 0.0,
+            )
+
+# ==================== CLIENT ====================
+
+class LLMClient:
+    """Deadline-, retry- and concurrency-aware front for a provider client"""
+
+    def __init__(self, provider_client=None, max_concurrency=LLM_MAX_CONCURRENCY,
+                 max_retries=LLM_MAX_RETRIES):
+        self.provider = provider_client if provider_client is not None else build_client()
+        self.max_retries = max_retries
+        self.scheduler = Scheduler(max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="llm-call")
+        # Entry points for callers that want a Future rather than blocking
+        self._submit_executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="llm-submit")
+        self.breaker = CircuitBreaker()
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "retries": 0, "timeouts": 0, "failures": 0, "short_circuited": 0}
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    @staticmethod
+    def _config(system, remaining):
+        """Per-attempt config; the HTTP timeout frees the worker thread near the deadline"""
+        types = _genai_types()
+        return types.GenerateContentConfig(
+            system_instruction=system,
+            http_options=types.HttpOptions(timeout=max(1, int(remaining * 1000))),
+        )
+
+    def _acquire(self, deadline):
+        """Wait for a scheduler slot; returns a done-callback that gives it back"""
+        queued = time.monotonic()
+        granted = self.scheduler.acquire(deadline.user_id, deadline.priority, deadline.remaining())
+        started = time.monotonic()
+        LLM_QUEUE_SECONDS.observe(started - queued, priority=deadline.priority)
+        if not granted:
+            self._count("timeouts")
+            raise LLMTimeout("no LLM slot was granted before the deadline")
+        return lambda _: self.scheduler.release(time.monotonic() - started)
+
+    def _allow(self):
+        try:
+            self.breaker.allow()
+        except LLMUnavailable:
+            self._count("short_circuited")
+            raise
+
+    def _observe(self, error=None):
+        """Feed upstream throttling back into the scheduler's adaptive rate, outages into the breaker"""
+        self.breaker.record(error)
+        if error is None:
+            self.scheduler.on_success()
+        elif (getattr(error, "code", None) or getattr(error, "status_code", None)) == 429:
+            self.scheduler.on_throttled()
+
+    @staticmethod
+    def _record_attempt(op, started, outcome):
+        """Per-attempt latency, also credited to the calling llm.py function as upstream time"""
+        elapsed = time.monotonic() - started
+        LLM_ATTEMPT_SECONDS.observe(elapsed, op=op, outcome=outcome)
+        add_upstream(elapsed)
+
+    def _with_retries(self, attempt_fn, deadline, op="generate"):
+        """Run attempt_fn(remaining) until success, a permanent error or the deadline"""
+        deadline = deadline or Deadline(LLM_REQUEST_TIMEOUT)
+        attempt = 0
+        while True:
+            if deadline.expired():
+                self._count("timeouts")
+                raise LLMTimeout("deadline exceeded before the LLM call started")
+            self._allow()
+            release = self._acquire(deadline)
+            self._count("calls")
+            # The slot is held until the upstream call really ends, even after we stop waiting
+            started = time.monotonic()
+            future = self._executor.submit(attempt_fn, deadline.remaining())
+            future.add_done_callback(release)
+            try:
+                result = future.result(timeout=deadline.remaining())
+                self._record_attempt(op, started, "ok")
+                self._observe()
+                return result
+            except FutureTimeout as e:
+                self._record_attempt(op, started, "timeout")
+                self._observe(e)
+                self._count("timeouts")
+                raise LLMTimeout("LLM did not answer before the deadline")
+            except Exception as e:
+                self._record_attempt(op, started, "error")
+                self._observe(e)
+                if is_outage(e) and not self.breaker.available():
+                    # This failure tripped (or met) an open breaker: don't back off and retry into it
+                    self._count("failures")
+                    raise LLMUnavailable("AI service is temporarily unavailable", self.breaker.retry_after()) from e
+                if attempt >= self.max_retries or not is_retryable(e):
+                    self._count("failures")
+                    raise
+                delay = backoff_delay(attempt)
+                if delay >= deadline.remaining():
+                    self._count("failures")
+                    raise
+                print(f"🔁 LLM call failed ({e}); retry {attempt + 1} in {delay:.2f}s")
+                self._count("retries")
+                time.sleep(delay)
+                attempt += 1
+
+    def _stream_with_retries(self, open_stream, deadline, op="generate_stream"):
+        """
+        Yield text from open_stream(remaining) with the deadline enforced
+        between chunks. Retries only happen before the first chunk arrives.
+        """
+        deadline = deadline or Deadline(LLM_REQUEST_TIMEOUT)
+        attempt = 0
+        while True:
+            if deadline.expired():
+                self._count("timeouts")
+                raise LLMTimeout("deadline exceeded before the LLM stream started")
+            self._allow()
+            release = self._acquire(deadline)
+            self._count("calls")
+            chunks = queue.Queue()
+            cancelled = threading.Event()
+            future = self._executor.submit(self._pump, open_stream, deadline.remaining(), chunks, cancelled)
+            future.add_done_callback(release)
+            started = False
+            waited = 0.0  # time blocked on the upstream, not on our consumer
+            try:
+                while True:
+                    wait_start = time.monotonic()
+                    try:
+                        kind, value = chunks.get(timeout=deadline.remaining())
+                    except queue.Empty:
+                        self._record_stream(op, waited + time.monotonic() - wait_start, "timeout")
+                        self._observe(FutureTimeout())
+                        self._count("timeouts")
+                        raise LLMTimeout("LLM stream stalled past the deadline")
+                    waited += time.monotonic() - wait_start
+                    if kind == "end":
+                        self._record_stream(op, waited, "ok")
+                        self._observe()
+                        return
+                    if kind == "error":
+                        self._record_stream(op, waited, "error")
+                        self._observe(value)
+                        raise value
+                    started = True
+                    yield value
+            except LLMTimeout:
+                raise
+            except Exception as e:
+                if is_outage(e) and not self.breaker.available():
+                    self._count("failures")
+                    raise LLMUnavailable("AI service is temporarily unavailable", self.breaker.retry_after()) from e
+                if started or attempt >= self.max_retries or not is_retryable(e):
+                    self._count("failures")
+                    raise
+                delay = backoff_delay(attempt)
+                if delay >= deadline.remaining():
+                    self._count("failures")
+                    raise
+                print(f"🔁 LLM stream failed ({e}); retry {attempt + 1} in {delay:.2f}s")
+                self._count("retries")
+                time.sleep(delay)
+                attempt += 1
+            finally:
+                cancelled.set()
+
+    @staticmethod
+    def _record_stream(op, waited, outcome):
+        LLM_ATTEMPT_SECONDS.observe(waited, op=op, outcome=outcome)
+        add_upstream(waited)
+
+    @staticmethod
+    def _pump(open_stream, remaining, chunks, cancelled):
+        """Worker side of a stream: forwards chunks until done, failed or abandoned"""
+        try:
+            for chunk in open_stream(remaining):
+                if cancelled.is_set():
+                    return
+                if chunk.text:
+                    chunks.put(("chunk", chunk.text))
+            chunks.put(("end", None))
+        except Exception as e:
+            chunks.put(("error", e))
+
+    # ---------- blocking entry points ----------
+
+    def generate(self, contents, system=None, model=None, deadline=None):
+        """One-shot generation; returns the response text"""
+        def attempt(remaining):
+            return self.provider.models.generate_content(
+                model=model, contents=contents, config=self._config(system, remaining)
+            ).text
+        return self._with_retries(attempt, deadline, "generate")
+
+    def generate_stream(self, contents, system=None, model=None, deadline=None):
+        """Streaming generation; yields text fragments"""
+        def open_stream(remaining):
+            return self.provider.models.generate_content_stream(
+                model=model, contents=contents, config=self._config(system, remaining)
+            )
+        return self._stream_with_retries(open_stream, deadline, "generate_stream")
+
+    def chat(self, message, history=None, system=None, model=None, deadline=None):
+        """Send one message on a chat seeded with history; returns the reply text"""
+        def attempt(remaining):
+            session = self.provider.chats.create(
+                model=model, config=self._config(system, remaining), history=history or []
+            )
+            return session.send_message(message).text
+        return self._with_retries(attempt, deadline, "chat")
+
+    def chat_stream(self, message, history=None, system=None, model=None, deadline=None):
+        """Streaming chat reply; yields text fragments"""
+        def open_stream(remaining):
+            session = self.provider.chats.create(
+                model=model, config=self._config(system, remaining), history=history or []
+            )
+            return session.send_message_stream(message)
+        return self._stream_with_retries(open_stream, deadline, "chat_stream")
+
+    # ---------- thread-pool / async entry points ----------
+
+    def submit(self, method, *args, **kwargs):
+        """Run generate/chat (by name) in the background; returns a Future"""
+        return self._submit_executor.submit(getattr(self, method), *args, **kwargs)
+
+    async def agenerate(self, contents, system=None, model=None, deadline=None):
+        return await asyncio.wrap_future(self.submit("generate", contents, system, model, deadline))
+
+    async def achat(self, message, history=None, system=None, model=None, deadline=None):
+        return await asyncio.wrap_future(self.submit("chat", message, history, system, model, deadline))
+
+    def client_stats(self):
+        with self._lock:
+            return dict(self.stats)
+
+    def warm_up(self):
+        """Pay the deferred imports now (from a background thread) instead of on the first call"""
+        _genai_types()
+
+    def available(self):
+        """False while the circuit breaker would reject a call"""
+        return self.breaker.available()
@@ -0,0 +1,189 @@
+"""
+TracePoint AI - LLM Providers
+Selects the client llm.py talks to. Every provider exposes the subset of
+the google-genai client surface llm.py uses:
+
+    client.models.generate_content(model=, contents=, config=None) -> .text
+    client.models.generate_content_stream(model=, contents=, config=None) -> iter(.text)
+    client.chats.create(model=, config=, history=) -> chat
+    chat.send_message(message) / chat.send_message_stream(message)
+
+LLM_PROVIDER=gemini (default) uses Gemini; LLM_PROVIDER=stub uses an
+offline backend for load tests and local development.
+"""
+
+import hashlib
+import math
+import os
+import random
+import threading
+import time
+
+# ==================== CONFIGURATION ====================
+
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "gemini").strip().lower()
+
+# Latency spec: "fixed:MS", "uniform:MIN_MS,MAX_MS", "normal:MEAN_MS,STDDEV_MS"
+# or "lognormal:MEDIAN_MS,SIGMA" (long tail, closest to real APIs)
+STUB_LATENCY = os.getenv("LLM_STUB_LATENCY", "lognormal:800,0.5")
+STUB_FAILURE_RATE = float(os.getenv("LLM_STUB_FAILURE_RATE", "0"))
+STUB_RESPONSE_CHARS = int(os.getenv("LLM_STUB_RESPONSE_CHARS", "1200"))
+STUB_STREAM_CHUNKS = int(os.getenv("LLM_STUB_STREAM_CHUNKS", "20"))
+STUB_SEED = os.getenv("LLM_STUB_SEED")
+
+LLM_HTTP_MAX_CONNECTIONS = int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", os.getenv("LLM_MAX_CONCURRENCY", "16")))
+LLM_HTTP_KEEPALIVE = float(os.getenv("LLM_HTTP_KEEPALIVE", "60"))  # idle seconds before a connection closes
+
+
+class StubProviderError(Exception):
+    """Injected failure raised by the stub backend"""
+    code = 503
+
+
+def parse_latency(spec):
+    """
+    Turn a latency spec into a sampler returning seconds.
+
+    Raises:
+        ValueError: unknown distribution or malformed parameters
+    """
+    kind, _, params = spec.partition(":")
+    values = [float(v) for v in params.split(",") if v.strip()]
+    kind = kind.strip().lower()
+
+    if kind == "fixed" and len(values) == 1:
+        return lambda rng: values[0] / 1000
+    if kind == "uniform" and len(values) == 2:
+        return lambda rng: rng.uniform(values[0], values[1]) / 1000
+    if kind == "normal" and len(values) == 2:
+        return lambda rng: max(0.0, rng.gauss(values[0], values[1])) / 1000
+    if kind == "lognormal" and len(values) == 2:
+        mu = math.log(values[0])
+        return lambda rng: rng.lognormvariate(mu, values[1]) / 1000
+    raise ValueError(f"Invalid LLM_STUB_LATENCY '{spec}'")
+
+# ==================== STUB BACKEND ====================
+
+class _StubResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class StubBackend:
+    """Shared latency/failure/text generation for the stub client"""
+
+    def __init__(self, latency=STUB_LATENCY, failure_rate=STUB_FAILURE_RATE,
+                 response_chars=STUB_RESPONSE_CHARS, stream_chunks=STUB_STREAM_CHUNKS,
+                 seed=STUB_SEED):
+        self.sample_latency = parse_latency(latency)
+        self.failure_rate = failure_rate
+        self.response_chars = response_chars
+        self.stream_chunks = max(1, stream_chunks)
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "streams": 0, "failures": 0}
+
+    def _draw(self):
+        """Sample (latency_seconds, should_fail) under the lock; Random is not thread-safe"""
+        with self._lock:
+            self.stats["calls"] += 1
+            latency = self.sample_latency(self._rng)
+            fail = self._rng.random() < self.failure_rate
+            if fail:
+                self.stats["failures"] += 1
+        return latency, fail
+
+    def text_for(self, contents):
+        """Deterministic filler text, so identical prompts give identical answers"""
+        digest = hashlib.sha256(repr(contents).encode("utf-8")).hexdigest()[:12]
+        header = f"[stub response {digest}]\n"
+        filler = "The code defines a function, processes its input and returns a result. "
+        body = (filler * (self.response_chars // len(filler) + 1))[:max(0, self.response_chars - len(header))]
+        return header + body
+
+    def generate(self, contents):
+        latency, fail = self._draw()
+        time.sleep(latency)
+        if fail:
+            raise StubProviderError("503 UNAVAILABLE (injected by stub provider)")
+        return _StubResponse(self.text_for(contents))
+
+    def generate_stream(self, contents):
+        latency, fail = self._draw()
+        with self._lock:
+            self.stats["streams"] += 1
+        text = self.text_for(contents)
+        step = max(1, -(-len(text) // self.stream_chunks))
+        pieces = [text[i:i + step] for i in range(0, len(text), step)]
+        # Time to first token is a third of the total; the rest is spread over chunks
+        time.sleep(latency / 3)
+        for index, piece in enumerate(pieces):
+            if fail and index == len(pieces) // 2:
+                raise StubProviderError("stream reset (injected by stub provider)")
+            if index:
+                time.sleep(latency * 2 / 3 / len(pieces))
+            yield _StubResponse(piece)
+
+
+class _StubModels:
+    def __init__(self, backend):
+        self._backend = backend
+
+    def generate_content(self, model=None, contents=None, config=None):
+        return self._backend.generate(contents)
+
+    def generate_content_stream(self, model=None, contents=None, config=None):
+        return self._backend.generate_stream(contents)
+
+
+class _StubChat:
+    def __init__(self, backend, history):
+        self._backend = backend
+        self._history = list(history or [])
+
+    def send_message(self, message):
+        return self._backend.generate([self._history, message])
+
+    def send_message_stream(self, message):
+        return self._backend.generate_stream([self._history, message])
+
+
+class _StubChats:
+    def __init__(self, backend):
+        self._backend = backend
+
+    def create(self, model=None, config=None, history=None):
+        return _StubChat(self._backend, history)
+
+
+class StubClient:
+    """Offline stand-in for genai.Client"""
+
+    def __init__(self, backend=None):
+        self.backend = backend or StubBackend()
+        self.models = _StubModels(self.backend)
+        self.chats = _StubChats(self.backend)
+
+# ==================== FACTORY ====================
+
+def build_client(provider=LLM_PROVIDER):
+    """Create the client for the configured provider"""
+    if provider == "stub":
+        print(f"🧪 Using stub LLM provider (latency {STUB_LATENCY}, failure rate {STUB_FAILURE_RATE})")
+        return StubClient()
+    if provider == "gemini":
+        import httpx
+        from google import genai
+        from google.genai import types
+        # One pooled httpx client per process; connections are kept alive between calls
+        limits = httpx.Limits(
+            max_connections=LLM_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_HTTP_MAX_CONNECTIONS,
+            keepalive_expiry=LLM_HTTP_KEEPALIVE,
+        )
+        # Ensure you have set GEMINI_API_KEY in your environment variables
+        return genai.Client(
+            api_key=os.getenv("GEMINI_API_KEY"),
+            http_options=types.HttpOptions(client_args={"limits": limits}),
+        )
+    raise ValueError(f"Unknown LLM_PROVIDER '{provider}' (expected 'gemini' or 'stub')")
@@ -0,0 +1,366 @@
+"""
+TracePoint AI - Metrics
+Counters and latency histograms exported at /metrics in the Prometheus
+text format (version 0.0.4). No client library needed.
+
+Instrumented stages:
+- every HTTP route (app.py before/after_request)
+- every llm.py call: total time, time spent waiting on the upstream API,
+  and our own overhead (total minus upstream), plus per-attempt upstream
+  latency and scheduler queue wait from llm_client
+- every db.py query function (@timed_query)
+- every sandbox.run_code execution, with its CPU time and peak RSS
+
+Multiprocess mode (gunicorn): set METRICS_MULTIPROC_DIR to a directory
+shared by the workers. Each process writes its values there every
+METRICS_FLUSH_INTERVAL seconds and at exit; /metrics in any worker sums
+counters and histograms across all files. Gauges carry a pid label and
+are skipped once a file goes stale. Empty the directory when the server
+(not a worker) starts.
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from inspect import isgeneratorfunction
+
+# ==================== CONFIGURATION ====================
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+MULTIPROC_DIR = os.getenv("METRICS_MULTIPROC_DIR", "").strip()
+FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "5"))
+
+# Seconds; spans a cached DB read up to a slow forensic report
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1, 2.5, 5, 10, 30, 60, 120)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# ==================== METRIC TYPES ====================
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(label, "")) for label in self.labels)
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(key), value if not isinstance(value, list) else list(value)]
+                    for key, value in self._values.items()]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    """Cumulative buckets; each value is [bucket counts..., sum, count]"""
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+# ==================== REGISTRY ====================
+
+_registry = {}
+_registry_lock = threading.Lock()
+_collectors = []
+
+
+def _register(cls, name, help_text, labels=(), **kwargs):
+    with _registry_lock:
+        metric = _registry.get(name)
+        if metric is None:
+            metric = _registry[name] = cls(name, help_text, labels, **kwargs)
+        return metric
+
+
+def counter(name, help_text, labels=()):
+    return _register(Counter, name, help_text, labels)
+
+
+def histogram(name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+    return _register(Histogram, name, help_text, labels, buckets=buckets)
+
+
+def gauge(name, help_text, labels=()):
+    return _register(Gauge, name, help_text, labels)
+
+
+def register_collector(fn):
+    """fn() is called at scrape/flush time to refresh gauges (e.g. queue depths)"""
+    _collectors.append(fn)
+    return fn
+
+
+def _collect():
+    for fn in list(_collectors):
+        try:
+            fn()
+        except Exception as e:
+            print(f"⚠️ Metrics collector {getattr(fn, '__name__', fn)} failed: {e}")
+
+
+def _local_state():
+    _collect()
+    with _registry_lock:
+        metrics = list(_registry.values())
+    return {
+        m.name: {
+            "kind": m.kind, "help": m.help, "labels": list(m.labels),
+            "buckets": list(getattr(m, "buckets", ())), "values": m.snapshot(),
+        }
+        for m in metrics
+    }
+
+# ==================== MULTIPROCESS ====================
+
+_flusher = None
+_flusher_pid = None
+
+
+def _state_path(pid):
+    return os.path.join(MULTIPROC_DIR, f"metrics-{pid}.json")
+
+
+def flush():
+    """Write this process's values for other workers to aggregate"""
+    if not MULTIPROC_DIR:
+        return
+    path = _state_path(os.getpid())
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(_local_state(), f)
+    os.replace(tmp, path)
+
+
+def _flush_loop():
+    while True:
+        time.sleep(FLUSH_INTERVAL)
+        try:
+            flush()
+        except Exception as e:
+            print(f"⚠️ Metrics flush failed: {e}")
+
+
+def start_multiprocess():
+    """Start the per-process flusher (again after a fork); no-op without METRICS_MULTIPROC_DIR"""
+    global _flusher, _flusher_pid
+    if not MULTIPROC_DIR or _flusher_pid == os.getpid():
+        return
+    os.makedirs(MULTIPROC_DIR, exist_ok=True)
+    _flusher_pid = os.getpid()
+    _flusher = threading.Thread(target=_flush_loop, name="metrics-flush", daemon=True)
+    _flusher.start()
+    atexit.register(flush)
+
+
+def _merged_state():
+    if not MULTIPROC_DIR:
+        return _local_state()
+    flush()
+    merged = {}
+    stale_before = time.time() - FLUSH_INTERVAL * 3
+    for filename in os.listdir(MULTIPROC_DIR):
+        if not (filename.startswith("metrics-") and filename.endswith(".json")):
+            continue
+        path = os.path.join(MULTIPROC_DIR, filename)
+        try:
+            with open(path) as f:
+                state = json.load(f)
+            fresh = os.path.getmtime(path) >= stale_before
+        except (OSError, ValueError):
+            continue
+        pid = filename[len("metrics-"):-len(".json")]
+        for name, metric in state.items():
+            target = merged.setdefault(name, dict(metric, values=[]))
+            if metric["kind"] == "gauge":
+                if not fresh:
+                    continue
+                if "pid" not in target["labels"]:
+                    target["labels"] = metric["labels"] + ["pid"]
+                target["values"].extend([key + [pid], value] for key, value in metric["values"])
+                continue
+            index = {tuple(key): entry for key, entry in ((v[0], v) for v in target["values"])}
+            for key, value in metric["values"]:
+                entry = index.get(tuple(key))
+                if entry is None:
+                    target["values"].append([key, value])
+                    index[tuple(key)] = target["values"][-1]
+                elif isinstance(value, list):
+                    entry[1] = [a + b for a, b in zip(entry[1], value)]
+                else:
+                    entry[1] += value
+    return merged
+
+# ==================== EXPOSITION ====================
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values):
+    pairs = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render():
+    """All metrics in the Prometheus text exposition format"""
+    lines = []
+    for name, metric in sorted(_merged_state().items()):
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['kind']}")
+        names = metric["labels"]
+        for key, value in sorted(metric["values"], key=lambda v: v[0]):
+            if metric["kind"] != "histogram":
+                lines.append(f"{name}{_labels(names, key)} {_number(value)}")
+                continue
+            bounds = [_number(float(b)) for b in metric["buckets"]] + ["+Inf"]
+            for bound, count in zip(bounds, value[:-2] + [value[-1]]):
+                lines.append(f"{name}_bucket{_labels(names + ['le'], key + [bound])} {count}")
+            lines.append(f"{name}_sum{_labels(names, key)} {_number(float(value[-2]))}")
+            lines.append(f"{name}_count{_labels(names, key)} {value[-1]}")
+    return "\n".join(lines) + "\n"
+
+# ==================== INSTRUMENTATION ====================
+
+HTTP_SECONDS = histogram(
+    "tracepoint_http_request_duration_seconds",
+    "Time to produce the response (until headers for streams), by route.",
+    ("method", "route", "status"),
+)
+LLM_CALL_SECONDS = histogram(
+    "tracepoint_llm_call_duration_seconds", "Total time of an llm.py call.", ("function",)
+)
+LLM_UPSTREAM_SECONDS = histogram(
+    "tracepoint_llm_call_upstream_seconds", "Part of an llm.py call spent waiting on the LLM API.", ("function",)
+)
+LLM_OVERHEAD_SECONDS = histogram(
+    "tracepoint_llm_call_overhead_seconds",
+    "Part of an llm.py call spent in our code (prompting, cache, queueing, retries' backoff).",
+    ("function",),
+)
+LLM_ATTEMPT_SECONDS = histogram(
+    "tracepoint_llm_attempt_seconds", "One upstream API attempt.", ("op", "outcome")
+)
+LLM_QUEUE_SECONDS = histogram(
+    "tracepoint_llm_queue_wait_seconds", "Wait for a scheduler slot before an attempt.", ("priority",)
+)
+DB_SECONDS = histogram(
+    "tracepoint_db_query_duration_seconds", "db.py query function latency.", ("query",)
+)
+SANDBOX_SECONDS = histogram(
+    "tracepoint_sandbox_run_duration_seconds", "sandbox.run_code execution time.", ("lang", "outcome")
+)
+SANDBOX_CPU_SECONDS = histogram(
+    "tracepoint_sandbox_run_cpu_seconds", "CPU time (user + system) used by one sandbox run.", ("lang",)
+)
+SANDBOX_PEAK_RSS_BYTES = histogram(
+    "tracepoint_sandbox_run_peak_rss_bytes", "Peak resident memory of one sandbox run.", ("lang",),
+    buckets=tuple(mb * 1024 * 1024 for mb in (8, 16, 32, 64, 128, 256, 512, 1024)),
+)
+
+_upstream = threading.local()
+
+
+def add_upstream(seconds):
+    """Called by llm_client on the calling thread for time spent waiting on the API"""
+    _upstream.seconds = getattr(_upstream, "seconds", 0.0) + seconds
+
+
+@contextmanager
+def _llm_span(function):
+    outer = getattr(_upstream, "seconds", 0.0)
+    _upstream.seconds = 0.0
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        total = time.perf_counter() - started
+        upstream = _upstream.seconds
+        _upstream.seconds = outer + upstream
+        LLM_CALL_SECONDS.observe(total, function=function)
+        LLM_UPSTREAM_SECONDS.observe(upstream, function=function)
+        LLM_OVERHEAD_SECONDS.observe(max(0.0, total - upstream), function=function)
+
+
+def llm_timed(fn):
+    """Decorator for llm.py functions; generators are timed until exhausted"""
+    if isgeneratorfunction(fn):
+        @wraps(fn)
+        def stream_wrapper(*args, **kwargs):
+            with _llm_span(fn.__name__):
+                yield from fn(*args, **kwargs)
+        return stream_wrapper
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        with _llm_span(fn.__name__):
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+def timed_query(fn):
+    """Decorator for db.py query functions"""
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        with DB_SECONDS.time(query=fn.__name__):
+            return fn(*args, **kwargs)
+    return wrapper
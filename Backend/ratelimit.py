@@ -0,0 +1,338 @@
+"""
+TracePoint AI - Rate Limiting & LLM Scheduling
+Two layers keep one user from exhausting the Gemini quota for everyone:
+
+1. Admission (routes): per-user token buckets per priority class. An empty
+   bucket, or a full queue for that class, raises RateLimited, which the
+   app turns into 429 with Retry-After.
+2. Scheduling (llm_client): every upstream attempt waits for a free
+   connection slot and a token from the global bucket. Waiters are served
+   by priority class (chat > analyze > batch) and round-robin across users
+   within a class. The global rate backs off when Gemini answers 429 and
+   recovers gradually.
+
+Buckets live in memory by default; RATE_LIMIT_BACKEND=sqlite keeps them in
+a SQLite file so every gunicorn worker draws from the same budgets.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from functools import wraps
+
+from flask_login import current_user
+
+from db import DB_PATH, get_pooled_conn
+
+# ==================== CONFIGURATION ====================
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1") == "1"
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory").strip().lower()
+RATE_LIMIT_DB_PATH = os.getenv(
+    "RATE_LIMIT_DB_PATH",
+    os.path.join(os.path.dirname(DB_PATH), "ratelimit.db")
+)
+
+# Highest priority first
+PRIORITIES = ("chat", "analyze", "batch")
+
+# Budgets are "COUNT/PERIOD" with PERIOD one of s, m, h (bucket size COUNT)
+USER_BUDGETS = {
+    "chat": os.getenv("RATE_USER_CHAT", "30/m"),
+    "analyze": os.getenv("RATE_USER_ANALYZE", "20/m"),
+    "batch": os.getenv("RATE_USER_BATCH", "500/h"),  # counted in files
+}
+GLOBAL_BUDGET = os.getenv("RATE_GLOBAL", "600/m")  # upstream attempts, all users
+
+QUEUE_LIMITS = {
+    "chat": int(os.getenv("RATE_QUEUE_CHAT", "200")),
+    "analyze": int(os.getenv("RATE_QUEUE_ANALYZE", "100")),
+    "batch": int(os.getenv("RATE_QUEUE_BATCH", "100")),
+}
+
+# Adaptive global rate: halve on upstream 429, creep back on success
+ADAPT_MIN_FACTOR = float(os.getenv("RATE_ADAPT_MIN_FACTOR", "0.1"))
+ADAPT_RECOVERY = float(os.getenv("RATE_ADAPT_RECOVERY", "0.02"))
+ADAPT_COOLDOWN = 1.0  # seconds between two back-offs
+
+PERIODS = {"s": 1, "m": 60, "h": 3600}
+
+
+class RateLimited(Exception):
+    """Request refused by the limiter; the app answers 429 with Retry-After"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = max(1.0, retry_after)
+
+
+def parse_budget(spec):
+    """
+    '30/m' -> (capacity 30, refill 0.5 tokens/second)
+
+    Raises:
+        ValueError: malformed spec
+    """
+    count, _, period = spec.partition("/")
+    seconds = PERIODS.get(period.strip().lower())
+    if seconds is None or float(count) <= 0:
+        raise ValueError(f"Invalid rate budget '{spec}' (expected e.g. 30/m)")
+    return float(count), float(count) / seconds
+
+# ==================== TOKEN BUCKETS ====================
+
+class MemoryBuckets:
+    """Token buckets for this process"""
+
+    def __init__(self):
+        self._state = {}
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, rate, cost=1):
+        """Take cost tokens; returns 0 on success, else seconds until they would be there"""
+        cost = min(cost, capacity)
+        now = time.time()
+        with self._lock:
+            tokens, updated = self._state.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            if tokens >= cost:
+                self._state[key] = (tokens - cost, now)
+                return 0.0
+            self._state[key] = (tokens, now)
+            return (cost - tokens) / rate
+
+
+class SQLiteBuckets:
+    """Token buckets shared by every process using the same file"""
+
+    def __init__(self, path=RATE_LIMIT_DB_PATH):
+        self.path = path
+        self._ready = False
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        conn = get_pooled_conn(self.path)
+        if not self._ready:
+            with self._lock:
+                conn.execute("""
+                CREATE TABLE IF NOT EXISTS rate_buckets (
+                    key TEXT PRIMARY KEY,
+                    tokens REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+                """)
+                conn.commit()
+                self._ready = True
+        return conn
+
+    def take(self, key, capacity, rate, cost=1):
+        cost = min(cost, capacity)
+        now = time.time()
+        with self._connect() as conn:
+            # IMMEDIATE takes the write lock up front so read-modify-write is atomic across workers
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT tokens, updated_at FROM rate_buckets WHERE key=?", (key,)
+            ).fetchone()
+            tokens, updated = (row[0], row[1]) if row else (capacity, now)
+            tokens = min(capacity, tokens + max(0.0, now - updated) * rate)
+            granted = tokens >= cost
+            conn.execute(
+                "INSERT OR REPLACE INTO rate_buckets (key, tokens, updated_at) VALUES (?, ?, ?)",
+                (key, tokens - cost if granted else tokens, now)
+            )
+        return 0.0 if granted else (cost - tokens) / rate
+
+
+def build_buckets():
+    if RATE_LIMIT_BACKEND == "sqlite":
+        return SQLiteBuckets(RATE_LIMIT_DB_PATH)
+    return MemoryBuckets()
+
+# ==================== SCHEDULER ====================
+
+class _Ticket:
+    __slots__ = ("queued",)
+
+    def __init__(self):
+        self.queued = True
+
+
+class Scheduler:
+    """
+    Grants upstream LLM slots by priority class, round-robin across users
+    within a class, subject to the global token bucket.
+    """
+
+    def __init__(self, slots, buckets=None, global_budget=GLOBAL_BUDGET):
+        self.slots = slots
+        self.buckets = buckets or build_buckets()
+        self.global_capacity, self.global_rate = parse_budget(global_budget)
+        self.rate_factor = 1.0
+        self._last_backoff = 0.0
+        self._free = slots
+        self._taking = False  # a head-of-queue ticket is paying the global bucket
+        self._cond = threading.Condition()
+        # class -> OrderedDict(user -> deque of tickets); dict order is the round-robin order
+        self._queues = {p: OrderedDict() for p in PRIORITIES}
+        self._depth = {p: 0 for p in PRIORITIES}
+        self._hold_avg = 1.0  # seconds a slot is typically held (EWMA)
+        self.stats = {"granted": 0, "timed_out": 0, "rejected": 0, "throttled": 0}
+
+    def _head(self):
+        for priority in PRIORITIES:
+            queue = self._queues[priority]
+            if queue:
+                user = next(iter(queue))
+                return priority, user, queue[user][0]
+        return None
+
+    def _remove(self, priority, user, ticket):
+        queue = self._queues[priority]
+        tickets = queue.get(user)
+        if tickets is not None and ticket in tickets:
+            tickets.remove(ticket)
+            if not tickets:
+                del queue[user]
+            self._depth[priority] -= 1
+        ticket.queued = False
+
+    def _grant_head(self, priority, user, ticket):
+        queue = self._queues[priority]
+        queue[user].popleft()
+        if queue[user]:
+            queue.move_to_end(user)  # the user's next call waits behind everyone else's
+        else:
+            del queue[user]
+        self._depth[priority] -= 1
+        ticket.queued = False
+        self._free -= 1
+        self.stats["granted"] += 1
+
+    def acquire(self, user_id, priority, timeout):
+        """Wait for a slot; returns False if timeout passes first"""
+        priority = priority if priority in self._queues else "analyze"
+        user = user_id if user_id is not None else "_"
+        ticket = _Ticket()
+        end = time.monotonic() + timeout
+        with self._cond:
+            self._queues[priority].setdefault(user, deque()).append(ticket)
+            self._depth[priority] += 1
+            try:
+                while True:
+                    wait = None
+                    head = self._head()
+                    if self._free > 0 and not self._taking and head is not None and head[2] is ticket:
+                        # Decided under the lock; the bucket (a SQLite write with the
+                        # sqlite backend) is paid outside it. Only the taker can grant,
+                        # so the free slot is still there when it comes back.
+                        self._taking = True
+                        rate = self.global_rate * self.rate_factor
+                        self._cond.release()
+                        try:
+                            wait = self.buckets.take("global", self.global_capacity, rate)
+                        finally:
+                            self._cond.acquire()
+                            self._taking = False
+                        if wait <= 0:
+                            self._grant_head(priority, user, ticket)
+                            return True
+                        self._cond.notify_all()
+                    remaining = end - time.monotonic()
+                    if remaining <= 0:
+                        self.stats["timed_out"] += 1
+                        return False
+                    self._cond.wait(min(remaining, wait) if wait else remaining)
+            finally:
+                if ticket.queued:
+                    self._remove(priority, user, ticket)
+                self._cond.notify_all()
+
+    def release(self, held_seconds=None):
+        with self._cond:
+            self._free += 1
+            if held_seconds is not None:
+                self._hold_avg = 0.9 * self._hold_avg + 0.1 * held_seconds
+            self._cond.notify_all()
+
+    def on_throttled(self):
+        """Upstream answered 429: halve the global rate (at most once per cooldown)"""
+        with self._cond:
+            now = time.monotonic()
+            if now - self._last_backoff >= ADAPT_COOLDOWN:
+                self.rate_factor = max(ADAPT_MIN_FACTOR, self.rate_factor / 2)
+                self._last_backoff = now
+                self.stats["throttled"] += 1
+                print(f"🐢 Upstream throttling: global LLM rate now {self.rate_factor:.0%} of budget")
+
+    def on_success(self):
+        if self.rate_factor < 1.0:
+            with self._cond:
+                self.rate_factor = min(1.0, self.rate_factor + ADAPT_RECOVERY)
+
+    def check_queue(self, priority):
+        """Raise RateLimited if the class queue is full"""
+        with self._cond:
+            depth = self._depth.get(priority, 0)
+            if depth < QUEUE_LIMITS.get(priority, 100):
+                return
+            self.stats["rejected"] += 1
+            ahead = sum(self._depth[p] for p in PRIORITIES[:PRIORITIES.index(priority) + 1])
+            retry_after = ahead * self._hold_avg / max(1, self.slots)
+        raise RateLimited(f"The {priority} queue is full. Please retry shortly.", retry_after)
+
+    def snapshot(self):
+        with self._cond:
+            return dict(
+                self.stats,
+                slots=self.slots,
+                in_flight=self.slots - self._free,
+                queued=dict(self._depth),
+                rate_factor=round(self.rate_factor, 3),
+                backend=type(self.buckets).__name__,
+            )
+
+# ==================== ADMISSION ====================
+
+_user_buckets = build_buckets()
+_user_budgets = {p: parse_budget(spec) for p, spec in USER_BUDGETS.items()}
+_scheduler = None
+
+
+def set_scheduler(scheduler):
+    """Called by llm_client so admission can see queue depth"""
+    global _scheduler
+    _scheduler = scheduler
+
+
+def admit(user_id, priority, cost=1):
+    """
+    Charge cost against the user's budget for this priority class.
+
+    Raises:
+        RateLimited: budget exhausted or queue full
+    """
+    if not RATE_LIMIT_ENABLED:
+        return
+    if _scheduler is not None:
+        _scheduler.check_queue(priority)
+    capacity, rate = _user_budgets[priority]
+    wait = _user_buckets.take(f"user:{user_id}:{priority}", capacity, rate, cost)
+    if wait > 0:
+        raise RateLimited(f"Too many {priority} requests. Please slow down.", wait)
+
+
+def rate_limited(priority):
+    """Route decorator: admit one request for current_user (place under @login_required)"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            admit(current_user.id, priority)
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def limiter_stats():
+    return _scheduler.snapshot() if _scheduler is not None else {}
@@ -0,0 +1,145 @@
+"""
+TracePoint AI - Chat Retention
+Keeps chat_history small: turns older than CHAT_RETENTION_DAYS, and each
+user's turns beyond the newest CHAT_RETENTION_MAX_ROWS, are moved into
+compressed chat_archive segments (db.archive_chat_rows). /chat/history
+pages into the archive transparently, and search finds archived turns
+through chat_archive_fts.
+
+A background thread applies the policy every CHAT_RETENTION_INTERVAL
+seconds, then runs an incremental VACUUM step so freed pages go back to
+the file system. The same thread works through the compression backfill
+of rows written before chat payloads were compressed
+(db.compress_chat_backlog). Every move is its own transaction, so several
+gunicorn workers running the job at once is safe.
+"""
+
+import os
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+
+from db import (
+    archive_chat_rows, retention_candidates, incremental_vacuum,
+    enable_incremental_vacuum, compress_chat_backlog, CHAT_ARCHIVE_CODEC,
+)
+
+# ==================== CONFIGURATION ====================
+
+RETENTION_DAYS = float(os.getenv("CHAT_RETENTION_DAYS", "90"))  # 0 disables the age rule
+RETENTION_MAX_ROWS = int(os.getenv("CHAT_RETENTION_MAX_ROWS", "2000"))  # live turns per user; 0 disables
+SEGMENT_ROWS = int(os.getenv("CHAT_ARCHIVE_SEGMENT_ROWS", "500"))
+RETENTION_INTERVAL = float(os.getenv("CHAT_RETENTION_INTERVAL", "3600"))  # seconds; 0 disables the thread
+VACUUM_PAGES = int(os.getenv("CHAT_VACUUM_PAGES", "2000"))  # pages released per step
+# Existing databases need one full VACUUM to enable incremental mode
+VACUUM_CONVERT = os.getenv("CHAT_VACUUM_CONVERT", "0") == "1"
+
+_lock = threading.Lock()
+_thread = None
+_stats = {
+    "runs": 0, "rows_archived": 0, "segments": 0,
+    "raw_bytes": 0, "stored_bytes": 0, "pages_freed": 0,
+    "compressed_rows": 0, "compressed_bytes_saved": 0,
+    "last_run": None, "last_error": None,
+}
+
+
+def run_retention(max_rows=RETENTION_MAX_ROWS, days=RETENTION_DAYS, segment_rows=SEGMENT_ROWS,
+                  vacuum_pages=VACUUM_PAGES):
+    """
+    Apply the retention policy once.
+
+    Returns:
+        dict: rows archived, segments written, bytes before/after compression,
+        pages freed by the vacuum step
+    """
+    cutoff = (datetime.utcnow() - timedelta(days=days)).isoformat() if days else None
+    result = {"rows": 0, "segments": 0, "raw_bytes": 0, "stored_bytes": 0, "pages_freed": 0}
+
+    for user_id, up_to_id in retention_candidates(max_rows, cutoff):
+        while True:
+            rows, raw, stored = archive_chat_rows(user_id, up_to_id, segment_rows)
+            if not rows:
+                break
+            result["rows"] += rows
+            result["segments"] += 1
+            result["raw_bytes"] += raw
+            result["stored_bytes"] += stored
+
+    if result["rows"]:
+        freed = incremental_vacuum(vacuum_pages)
+        if freed is None and VACUUM_CONVERT:
+            print("🧹 Converting database to incremental auto-vacuum (one-time VACUUM)...")
+            enable_incremental_vacuum()
+            freed = incremental_vacuum(vacuum_pages)
+        result["pages_freed"] = freed[0] if freed else 0
+        print(
+            f"🗄️ Archived {result['rows']} chat turns in {result['segments']} segments "
+            f"({result['raw_bytes']:,} -> {result['stored_bytes']:,} bytes, {CHAT_ARCHIVE_CODEC}); "
+            f"freed {result['pages_freed']} pages"
+        )
+
+    with _lock:
+        _stats["runs"] += 1
+        _stats["rows_archived"] += result["rows"]
+        _stats["segments"] += result["segments"]
+        _stats["raw_bytes"] += result["raw_bytes"]
+        _stats["stored_bytes"] += result["stored_bytes"]
+        _stats["pages_freed"] += result["pages_freed"]
+        _stats["last_run"] = datetime.utcnow().isoformat()
+    return result
+
+
+def compress_backlog():
+    """Compress any rows still stored as plain text from before migration 004"""
+    report = compress_chat_backlog()
+    if report["rows"]:
+        print(
+            f"🗜️ Compressed {report['rows']} older chat turns "
+            f"({report['bytes_before']:,} -> {report['bytes_after']:,} bytes)"
+        )
+        with _lock:
+            _stats["compressed_rows"] += report["rows"]
+            _stats["compressed_bytes_saved"] += report["bytes_before"] - report["bytes_after"]
+    return report
+
+
+def _loop(interval):
+    # Spread workers that started together
+    time.sleep(random.uniform(0, min(interval, 60)))
+    while True:
+        try:
+            compress_backlog()
+            run_retention()
+            with _lock:
+                _stats["last_error"] = None
+        except Exception as e:
+            print(f"⚠️ Chat retention run failed: {e}")
+            with _lock:
+                _stats["last_error"] = str(e)
+        time.sleep(interval)
+
+
+def start_retention(interval=RETENTION_INTERVAL):
+    """Start the background retention thread once per process"""
+    global _thread
+    if interval <= 0:
+        return False
+    with _lock:
+        if _thread is not None and _thread.is_alive():
+            return False
+        _thread = threading.Thread(target=_loop, args=(interval,), name="chat-retention", daemon=True)
+        _thread.start()
+    return True
+
+
+def retention_stats():
+    with _lock:
+        return dict(
+            _stats,
+            days=RETENTION_DAYS,
+            max_rows=RETENTION_MAX_ROWS,
+            codec=CHAT_ARCHIVE_CODEC,
+            running=_thread is not None and _thread.is_alive(),
+        )
@@ -1,6 +1,26 @@
-import subprocess
 import tempfile
 import os
+import signal
+import time
+from sandbox_pool import get_pool, WorkerError, WorkerTimeout, WorkerUnavailable
+from sandbox_limits import run_limited, limits_for, run_slots, SandboxBusy
+from metrics import SANDBOX_SECONDS, SANDBOX_CPU_SECONDS, SANDBOX_PEAK_RSS_BYTES
+
+# Map of supported executable languages
+EXECUTABLE_LANGS = {
+    "py": {"ext": ".py", "cmd": ["python3"]},
+    "js": {"ext": ".js", "cmd": ["node"]},
+}
+
+# Security check - block dangerous imports/requires
+DANGEROUS_PATTERNS = {
+    "py": ["os.system", "subprocess", "eval(", "exec(", "__import__", "open("],
+    "js": ["require('child_process')", "require('fs')", "eval(", "Function("]
+}
+
+# Result prefixes -> outcome label for the sandbox latency histogram
+_OUTCOMES = (("⏱️", "timeout"), ("🚫", "blocked"), ("🧱", "limit"), ("⏳", "busy"), ("❌", "error"),
+             ("Code execution not supported", "unsupported"))
 
 def run_code(code, lang, timeout=5):
     """
@@ -14,30 +34,122 @@ def run_code(code, lang, timeout=5):
     Returns:
         str: Program output or error message
     """
-    
-    # Map of supported executable languages
-    executable_langs = {
-        "py": {"ext": ".py", "cmd": ["python3"]},
-        "js": {"ext": ".js", "cmd": ["node"]},
-    }
-    
-    if lang not in executable_langs:
+    return execute(code, lang, timeout)["output"]
+
+
+def execute(code, lang, timeout=5):
+    """
+    Execute code like run_code and report the resources the run used
+
+    Returns:
+        dict: output (what run_code returns), outcome, wall_seconds,
+        queued_seconds, cpu_seconds and peak_rss_kb (None when nothing ran)
+    """
+    started = time.perf_counter()
+    report = {"output": "", "outcome": "error", "wall_seconds": 0.0, "queued_seconds": 0.0,
+              "cpu_seconds": None, "peak_rss_kb": None}
+    try:
+        report["output"] = _rejection(code, lang)
+        if not report["output"]:
+            try:
+                # Host-wide cap across languages; the wait is not part of the run
+                with run_slots.acquire() as waited:
+                    run_started = time.perf_counter()
+                    report["output"], usage = _run_code(code, lang, timeout)
+                    report["wall_seconds"] = round(time.perf_counter() - run_started, 4)
+                report["queued_seconds"] = round(waited, 4)
+                report.update(usage)
+            except SandboxBusy as e:
+                report["output"] = f"⏳ Sandbox Busy: {e}.\n\nToo many programs are running right now. Please try again in a moment."
+        report["outcome"] = next(
+            (label for prefix, label in _OUTCOMES if report["output"].startswith(prefix)), "ok"
+        )
+        return report
+    finally:
+        metric_lang = lang if lang in ("py", "js") else "other"
+        SANDBOX_SECONDS.observe(time.perf_counter() - started, lang=metric_lang, outcome=report["outcome"])
+        if report["cpu_seconds"] is not None:
+            SANDBOX_CPU_SECONDS.observe(report["cpu_seconds"], lang=metric_lang)
+        if report["peak_rss_kb"] is not None:
+            SANDBOX_PEAK_RSS_BYTES.observe(report["peak_rss_kb"] * 1024, lang=metric_lang)
+
+
+def _rejection(code, lang):
+    """Message for code that must not run at all, else None"""
+    if lang not in EXECUTABLE_LANGS:
         return f"Code execution not supported for {lang}. Only analysis is available."
     
-    # Security check - block dangerous imports/requires
-    dangerous_patterns = {
-        "py": ["os.system", "subprocess", "eval(", "exec(", "__import__", "open("],
-        "js": ["require('child_process')", "require('fs')", "eval(", "Function("]
-    }
-    
     code_lower = code.lower()
-    for pattern in dangerous_patterns.get(lang, []):
+    for pattern in DANGEROUS_PATTERNS.get(lang, []):
         if pattern.lower() in code_lower:
             return f"🚫 Security Error: Potentially dangerous operation detected: {pattern}\n\nFor security reasons, operations like file I/O, system commands, and dynamic code execution are not allowed in the sandbox."
+    return None
+
+
+def _run_code(code, lang, timeout):
+    """Returns (output message, usage dict)"""
+    limits = limits_for(lang, timeout)
+
+    # Warm worker pool first; cold interpreter start as fallback
+    pool = None
+    try:
+        pool = get_pool(lang)
+    except (FileNotFoundError, OSError) as e:
+        print(f"⚠️ Sandbox pool for {lang} unavailable: {e}")
+    
+    if pool is not None:
+        try:
+            return _describe(pool.run(code, timeout, limits), timeout, limits)
+        except WorkerUnavailable as e:
+            # Nothing ran yet, so a cold start is not a second run
+            print(f"⚠️ Sandbox worker unavailable, falling back to cold start: {e}")
+        except WorkerTimeout:
+            return _timeout_message(timeout), {}
+        except WorkerError as e:
+            # The code was delivered and may have had side effects: never run it again
+            print(f"⚠️ Sandbox worker died during a run: {e}")
+            return "❌ Execution Error: The sandbox stopped unexpectedly while running your program.", {}
     
+    return _run_cold(code, lang, EXECUTABLE_LANGS[lang], timeout, limits)
+
+
+def _describe(result, timeout, limits):
+    """Raw run result -> (user-facing message, usage)"""
+    usage = {key: result[key] for key in ("cpu_seconds", "peak_rss_kb") if result.get(key) is not None}
+    stderr = result["stderr"].strip()
+    if result["timed_out"]:
+        return _timeout_message(timeout), usage
+    if result.get("truncated"):
+        shown = (result["stdout"] or result["stderr"]).rstrip()
+        return f"🧱 Resource Limit: Output exceeded {limits['max_output']} bytes, so the program was stopped.\n\n{shown}", usage
+    # A runner killed by RLIMIT_CPU cannot report its own usage, but SIGXCPU says enough
+    if result["returncode"] == -signal.SIGXCPU or (
+            result["returncode"] == -signal.SIGKILL and usage.get("cpu_seconds", 0) >= limits["cpu_seconds"]):
+        return f"🧱 Resource Limit: CPU time limit of {limits['cpu_seconds']} seconds exceeded.", usage
+    if result["returncode"] != 0 and (stderr.endswith("MemoryError") or "heap limit" in stderr):
+        return f"🧱 Resource Limit: Memory limit of {limits['memory_mb']} MB exceeded.", usage
+    return _format_result(result["stdout"], result["stderr"], result["returncode"]), usage
+
+
+def _format_result(stdout, stderr, returncode):
+    """Turn raw process output into the user-facing message"""
+    if returncode == 0:
+        output = stdout.strip()
+        return output if output else "✅ Program executed successfully (no output)"
+    error = stderr.strip()
+    return f"❌ Execution Error:\n{error}" if error else f"Exit code: {returncode}"
+
+
+def _timeout_message(timeout):
+    return f"⏱️ Timeout Error: Execution exceeded {timeout} seconds.\n\nYour code may have an infinite loop or is taking too long to execute."
+
+
+def _run_cold(code, lang, lang_config, timeout=5, limits=None):
+    """Execute code in a freshly started interpreter; returns (output message, usage)"""
+    limits = limits or limits_for(lang, timeout)
     # Create temporary file
-    lang_config = executable_langs[lang]
     suffix = lang_config["ext"]
+    temp_path = None
     
     try:
         with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix=suffix) as f:
@@ -47,39 +159,22 @@ def run_code(code, lang, timeout=5):
         # Build command
         cmd = lang_config["cmd"] + [temp_path]
         
-        # Execute with timeout
+        # Execute under the time, CPU, memory, process and output caps
         try:
-            result = subprocess.run(
-                cmd,
-                timeout=timeout,
-                capture_output=True,
-                text=True,
-                cwd=tempfile.gettempdir()
-            )
-            
-            # Return output or error
-            if result.returncode == 0:
-                output = result.stdout.strip()
-                return output if output else "✅ Program executed successfully (no output)"
-            else:
-                error = result.stderr.strip()
-                return f"❌ Execution Error:\n{error}" if error else f"Exit code: {result.returncode}"
-        
-        except subprocess.TimeoutExpired:
-            return f"⏱️ Timeout Error: Execution exceeded {timeout} seconds.\n\nYour code may have an infinite loop or is taking too long to execute."
+            return _describe(run_limited(cmd, lang, timeout, limits), timeout, limits)
         
         except FileNotFoundError:
             interpreter_names = {"py": "Python 3", "js": "Node.js"}
             interpreter = interpreter_names.get(lang, lang)
-            return f"❌ Error: {interpreter} interpreter not found on server.\n\nPlease contact the administrator."
+            return f"❌ Error: {interpreter} interpreter not found on server.\n\nPlease contact the administrator.", {}
         
         except Exception as e:
-            return f"❌ Execution Error: {str(e)}"
+            return f"❌ Execution Error: {str(e)}", {}
     
     finally:
         # Clean up temporary file
         try:
-            if os.path.exists(temp_path):
+            if temp_path and os.path.exists(temp_path):
                 os.unlink(temp_path)
         except:
             pass
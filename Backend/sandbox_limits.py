@@ -0,0 +1,427 @@
+"""
+TracePoint AI - Sandbox resource limits
+Per-run caps for sandbox.run_code on top of the wall-clock timeout:
+
+- rlimits set in the child before user code runs: CPU seconds, address
+  space (Python) or V8 heap (Node.js), process count, file size, no core
+  dumps
+- optional cgroup v2 per run (SANDBOX_CGROUP_ROOT, a delegated directory):
+  memory.max and pids.max for the whole process tree, killed as a unit
+- captured stdout/stderr capped at SANDBOX_MAX_OUTPUT; a run that prints
+  more is stopped
+- at most SANDBOX_MAX_CONCURRENT runs at once across languages, with a
+  bounded queue in front
+- usage per run: CPU time, peak RSS and wall time
+
+RLIMIT_NPROC counts every task (thread) of the Unix user, so the cap is
+the user's current count plus SANDBOX_MAX_PROCS. Root ignores it: when
+the app runs as root, only the cgroup's pids.max stops a fork bomb.
+
+Run as a script, this module is the exec wrapper that gives each Node.js
+runner its rlimits:
+
+    python sandbox_limits.py '<limits json>' node ... --runner
+"""
+
+import json
+import os
+import resource
+import select
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+# ==================== CONFIGURATION ====================
+
+SANDBOX_MAX_CONCURRENT = int(os.getenv("SANDBOX_MAX_CONCURRENT", str(max(2, os.cpu_count() or 1))))
+SANDBOX_MAX_QUEUED = int(os.getenv("SANDBOX_MAX_QUEUED", "32"))
+SANDBOX_QUEUE_TIMEOUT = float(os.getenv("SANDBOX_QUEUE_TIMEOUT", "10"))
+
+SANDBOX_MEMORY_MB = int(os.getenv("SANDBOX_MEMORY_MB", "256"))
+SANDBOX_MAX_PROCS = int(os.getenv("SANDBOX_MAX_PROCS", "16"))
+SANDBOX_MAX_FILE_MB = int(os.getenv("SANDBOX_MAX_FILE_MB", "1"))
+SANDBOX_MAX_OUTPUT = int(os.getenv("SANDBOX_MAX_OUTPUT", str(1024 * 1024)))
+SANDBOX_CGROUP_ROOT = os.getenv("SANDBOX_CGROUP_ROOT", "").strip()
+
+MB = 1024 * 1024
+
+
+def cpu_seconds_for(timeout):
+    """CPU budget for a run: the wall timeout plus a second of slack"""
+    return int(timeout) + 1
+
+
+def limits_for(lang, timeout):
+    """The caps one run gets; also sent to the warm workers"""
+    return {
+        "cpu_seconds": cpu_seconds_for(timeout),
+        "memory_mb": SANDBOX_MEMORY_MB,
+        # Node.js needs its own threads, which count as processes
+        "max_procs": SANDBOX_MAX_PROCS if lang == "py" else 0,
+        "max_file_mb": SANDBOX_MAX_FILE_MB,
+        "max_output": SANDBOX_MAX_OUTPUT,
+    }
+
+
+def apply_rlimits(limits, address_space=True):
+    """
+    Set the rlimits in the current process (a freshly forked child).
+
+    address_space=False leaves RLIMIT_AS alone: V8 reserves gigabytes of
+    virtual memory up front, so Node.js is capped with --max-old-space-size.
+    """
+    caps = [
+        (resource.RLIMIT_CPU, limits["cpu_seconds"], limits["cpu_seconds"] + 1),
+        (resource.RLIMIT_FSIZE, limits["max_file_mb"] * MB, limits["max_file_mb"] * MB),
+        (resource.RLIMIT_CORE, 0, 0),
+    ]
+    if address_space:
+        caps.append((resource.RLIMIT_AS, limits["memory_mb"] * MB, limits["memory_mb"] * MB))
+    if limits["max_procs"] and os.geteuid() != 0:
+        tasks = user_tasks(os.getuid())
+        if tasks is not None:
+            caps.append((resource.RLIMIT_NPROC, tasks + limits["max_procs"], tasks + limits["max_procs"]))
+    for which, soft, hard in caps:
+        try:
+            resource.setrlimit(which, (soft, hard))
+        except (ValueError, OSError):
+            pass  # already lower than ours
+
+
+def user_tasks(uid):
+    """
+    Tasks (threads included) whose real uid is uid: what RLIMIT_NPROC
+    counts. None without /proc.
+    """
+    try:
+        pids = [name for name in os.listdir("/proc") if name.isdigit()]
+    except OSError:
+        return None
+    total = 0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                fields = dict(line.split(":", 1) for line in f if ":" in line)
+            if int(fields["Uid"].split()[0]) == uid:
+                total += int(fields["Threads"])
+        except (OSError, KeyError, ValueError):
+            continue  # exited meanwhile
+    return total
+
+
+def exec_limited(argv):
+    """Set the rlimits given as JSON in argv[0], then exec argv[1:]"""
+    apply_rlimits(json.loads(argv[0]), address_space=False)
+    os.execv(argv[1], argv[1:])
+
+
+def node_flags(limits):
+    return [f"--max-old-space-size={limits['memory_mb']}"]
+
+
+def usage_from_rusage(rusage):
+    """CPU time and peak RSS of a reaped child (ru_maxrss is KiB on Linux)"""
+    return {
+        "cpu_seconds": round(rusage.ru_utime + rusage.ru_stime, 4),
+        "peak_rss_kb": rusage.ru_maxrss,
+    }
+
+# ==================== CGROUP V2 ====================
+
+class RunCgroup:
+    """
+    One cgroup v2 directory per run under SANDBOX_CGROUP_ROOT.
+
+    The child joins it before exec (join()), so everything it forks is
+    counted against memory.max / pids.max and killed with cgroup.kill.
+    Without a usable root every method is a no-op.
+    """
+
+    _counter = 0
+    _counter_lock = threading.Lock()
+
+    def __init__(self, limits, root=SANDBOX_CGROUP_ROOT):
+        self.path = None
+        if not root:
+            return
+        with RunCgroup._counter_lock:
+            RunCgroup._counter += 1
+            name = f"run-{os.getpid()}-{RunCgroup._counter}"
+        path = os.path.join(root, name)
+        try:
+            os.mkdir(path)
+            self._write(path, "memory.max", str(limits["memory_mb"] * MB))
+            self._write(path, "memory.swap.max", "0")
+            self._write(path, "pids.max", str(max(limits["max_procs"], SANDBOX_MAX_PROCS)))
+            self.path = path
+        except OSError as e:
+            print(f"⚠️ Sandbox cgroup unavailable, using rlimits only: {e}")
+            self._remove(path)
+
+    @staticmethod
+    def _write(path, name, value):
+        with open(os.path.join(path, name), "w") as f:
+            f.write(value)
+
+    def _read_stat(self, name, key=None):
+        try:
+            with open(os.path.join(self.path, name)) as f:
+                text = f.read()
+        except OSError:
+            return None
+        if key is None:
+            return int(text.strip())
+        for line in text.splitlines():
+            field, _, value = line.partition(" ")
+            if field == key:
+                return int(value)
+        return None
+
+    def join(self):
+        """In the child, before exec; the open is done by the child itself"""
+        if self.path:
+            self._write(self.path, "cgroup.procs", "0")
+
+    def usage(self):
+        """Whole-tree usage, or {} (then rusage of the direct child is used)"""
+        if not self.path:
+            return {}
+        usage = {}
+        cpu_usec = self._read_stat("cpu.stat", "usage_usec")
+        if cpu_usec is not None:
+            usage["cpu_seconds"] = round(cpu_usec / 1e6, 4)
+        peak = self._read_stat("memory.peak")  # Linux 5.19+
+        if peak is not None:
+            usage["peak_rss_kb"] = peak // 1024
+        return usage
+
+    def close(self):
+        if not self.path:
+            return
+        try:
+            self._write(self.path, "cgroup.kill", "1")
+        except OSError:
+            pass
+        self._remove(self.path)
+        self.path = None
+
+    @staticmethod
+    def _remove(path):
+        # cgroup.kill is asynchronous: the directory empties a moment later
+        for _ in range(50):
+            try:
+                os.rmdir(path)
+                return
+            except FileNotFoundError:
+                return
+            except OSError:
+                time.sleep(0.01)
+        print(f"⚠️ Could not remove sandbox cgroup {path}")
+
+# ==================== EXECUTION ====================
+
+def _kill_group(pid):
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        # Not a group leader (yet): at least the child itself
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+
+def run_limited(cmd, lang, timeout, limits=None):
+    """
+    Run cmd with the per-run caps in its own process group.
+
+    Returns:
+        dict: stdout, stderr, returncode, timed_out, truncated, cpu_seconds,
+        peak_rss_kb
+    """
+    limits = limits or limits_for(lang, timeout)
+    cgroup = RunCgroup(limits)
+
+    def preexec():
+        cgroup.join()
+        apply_rlimits(limits, address_space=lang != "js")
+
+    if lang == "js":
+        cmd = cmd[:1] + node_flags(limits) + cmd[1:]
+    try:
+        proc = subprocess.Popen(
+            cmd,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            cwd=tempfile.gettempdir(),
+            start_new_session=True,  # the whole tree is killable as a unit
+            preexec_fn=preexec,
+        )
+    except BaseException:
+        cgroup.close()
+        raise
+
+    try:
+        stdout, stderr, timed_out, truncated, status, rusage = collect_output(
+            proc.pid, [proc.stdout.fileno(), proc.stderr.fileno()], timeout, limits["max_output"]
+        )
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        usage = usage_from_rusage(rusage)
+        usage.update(cgroup.usage())
+    finally:
+        proc.stdout.close()
+        proc.stderr.close()
+        cgroup.close()
+
+    return {
+        "stdout": stdout,
+        "stderr": stderr,
+        "returncode": proc.returncode,
+        "timed_out": timed_out,
+        "truncated": truncated,
+        **usage,
+    }
+
+
+def collect_output(pid, fds, timeout, max_output):
+    """
+    Read a child's stdout/stderr and reap it. The child (its whole process
+    group) is killed once the timeout passes or the output together
+    exceeds max_output bytes.
+
+    Returns:
+        tuple: (stdout, stderr, timed_out, truncated, wait status, rusage)
+    """
+    buffers = {fd: bytearray() for fd in fds}
+    open_fds = list(fds)
+    deadline = time.monotonic() + timeout
+    timed_out = truncated = False
+    reaped = None
+
+    def read(fd):
+        nonlocal truncated
+        chunk = os.read(fd, 65536)
+        if not chunk:
+            open_fds.remove(fd)
+            return
+        space = max_output - sum(len(b) for b in buffers.values())
+        buffers[fd].extend(chunk[:max(0, space)])
+        if len(chunk) > space:
+            truncated = True
+
+    while open_fds and not truncated:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            timed_out = True
+            break
+        ready, _, _ = select.select(open_fds, [], [], min(remaining, 0.05))
+        for fd in ready:
+            read(fd)
+        if not ready:
+            # The run is over when the child exits, even if something it
+            # forked still holds the pipes: take what is buffered and stop
+            reaped = os.wait4(pid, os.WNOHANG)
+            if reaped[0]:
+                while open_fds and not truncated:
+                    ready, _, _ = select.select(open_fds, [], [], 0)
+                    if not ready:
+                        break
+                    for fd in ready:
+                        read(fd)
+                break
+            reaped = None
+
+    # Output closed early: the timeout still applies
+    while reaped is None and not (timed_out or truncated):
+        if time.monotonic() >= deadline:
+            timed_out = True
+            break
+        reaped = os.wait4(pid, os.WNOHANG)
+        if not reaped[0]:
+            reaped = None
+            time.sleep(0.005)
+    if reaped is None:
+        _kill_group(pid)
+        reaped = os.wait4(pid, 0)
+    else:
+        # Whatever it left running in its group goes too
+        try:
+            os.killpg(pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+    _, status, rusage = reaped
+
+    out, err = (buffers[fd].decode("utf-8", "replace") for fd in fds)
+    return out, err, timed_out, truncated, status, rusage
+
+# ==================== CONCURRENCY ====================
+
+class SandboxBusy(Exception):
+    """Every run slot is taken and the queue is full (or the wait timed out)"""
+
+
+class RunSlots:
+    """
+    Host-wide cap on concurrent sandbox runs, with a bounded FIFO queue.
+
+    Runs past max_running wait up to wait_timeout seconds; past max_queued
+    waiters they are rejected right away.
+    """
+
+    def __init__(self, max_running=SANDBOX_MAX_CONCURRENT, max_queued=SANDBOX_MAX_QUEUED,
+                 wait_timeout=SANDBOX_QUEUE_TIMEOUT):
+        self.max_running = max_running
+        self.max_queued = max_queued
+        self.wait_timeout = wait_timeout
+        self._cond = threading.Condition()
+        self._running = 0
+        self._waiting = []
+        self.stats = {"runs": 0, "rejected": 0, "wait_timeouts": 0}
+
+    @contextmanager
+    def acquire(self):
+        """Hold a slot for the duration of a run; yields the seconds spent queued"""
+        started = time.perf_counter()
+        with self._cond:
+            if self._running >= self.max_running or self._waiting:
+                if len(self._waiting) >= self.max_queued:
+                    self.stats["rejected"] += 1
+                    raise SandboxBusy("sandbox queue is full")
+                ticket = object()
+                self._waiting.append(ticket)
+                deadline = time.monotonic() + self.wait_timeout
+                try:
+                    while self._running >= self.max_running or self._waiting[0] is not ticket:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self.stats["wait_timeouts"] += 1
+                            raise SandboxBusy("timed out waiting for a sandbox slot")
+                        self._cond.wait(remaining)
+                finally:
+                    self._waiting.remove(ticket)
+                    self._cond.notify_all()
+            self._running += 1
+            self.stats["runs"] += 1
+        try:
+            yield time.perf_counter() - started
+        finally:
+            with self._cond:
+                self._running -= 1
+                self._cond.notify_all()
+
+    def snapshot(self):
+        with self._cond:
+            return dict(self.stats, limit=self.max_running, running=self._running,
+                        queued=len(self._waiting))
+
+
+run_slots = RunSlots()
+
+
+if __name__ == "__main__":
+    exec_limited(sys.argv[1:])
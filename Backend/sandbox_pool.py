@@ -0,0 +1,230 @@
+"""
+TracePoint AI - Warm Sandbox Worker Pool
+Keeps pre-started interpreter processes per language so short snippets do
+not pay interpreter startup on every run.
+"""
+
+import json
+import os
+import queue
+import select
+import signal
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from sandbox_limits import RunCgroup, limits_for, node_flags
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# ==================== CONFIGURATION ====================
+
+SANDBOX_POOL_ENABLED = os.getenv("SANDBOX_POOL", "1") == "1"
+SANDBOX_POOL_SIZE = int(os.getenv("SANDBOX_POOL_SIZE", "2"))
+SANDBOX_WORKER_MAX_RUNS = int(os.getenv("SANDBOX_WORKER_MAX_RUNS", "100"))
+
+# Extra seconds the host waits on a worker beyond the run's own timeout
+WORKER_GRACE = 2.0
+
+WORKER_COMMANDS = {
+    "py": [sys.executable, "-u", os.path.join(BASE_DIR, "sandbox_worker.py")],
+    # V8 heap cap, inherited by the child each run executes in; that child
+    # starts through sandbox_limits.py, which sets the run's rlimits
+    "js": [
+        "node", *node_flags(limits_for("js", 0)), os.path.join(BASE_DIR, "sandbox_worker.js"),
+        "--rlimit-exec", sys.executable, os.path.join(BASE_DIR, "sandbox_limits.py"),
+        "--limits", json.dumps(limits_for("js", 5)),  # a default run's, for the first runner
+    ],
+}
+
+
+class WorkerError(Exception):
+    """The worker process died or stopped answering"""
+
+
+class WorkerUnavailable(WorkerError):
+    """No worker could be handed the code, so nothing ran"""
+
+
+class WorkerTimeout(WorkerError):
+    """The worker received the code but did not answer in time"""
+
+
+class Worker:
+    """One warm interpreter process speaking the length-prefixed protocol"""
+
+    def __init__(self, cmd):
+        self.runs = 0
+        self.proc = subprocess.Popen(
+            cmd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            cwd=tempfile.gettempdir(),
+            start_new_session=True,  # own process group, killable as a unit
+        )
+
+    def alive(self):
+        return self.proc.poll() is None
+
+    def _read_exact(self, n, deadline):
+        fd = self.proc.stdout.fileno()
+        data = b""
+        while len(data) < n:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise WorkerTimeout("worker did not answer in time")
+            ready, _, _ = select.select([fd], [], [], remaining)
+            if not ready:
+                continue
+            chunk = os.read(fd, n - len(data))
+            if not chunk:
+                raise WorkerError("worker exited")
+            data += chunk
+        return data
+
+    def run(self, code, timeout, limits, cgroup=None):
+        body = json.dumps({
+            "code": code, "timeout": timeout, "max_output": limits["max_output"],
+            "limits": limits, "cgroup": cgroup,
+        }).encode("utf-8")
+        try:
+            self.proc.stdin.write(struct.pack(">I", len(body)) + body)
+            self.proc.stdin.flush()
+        except (BrokenPipeError, OSError) as e:
+            raise WorkerUnavailable(f"worker pipe closed: {e}")
+
+        deadline = time.monotonic() + timeout + WORKER_GRACE
+        size = struct.unpack(">I", self._read_exact(4, deadline))[0]
+        self.runs += 1
+        return json.loads(self._read_exact(size, deadline))
+
+    def kill(self):
+        try:
+            os.killpg(self.proc.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+        try:
+            self.proc.wait(timeout=1)
+        except Exception:
+            pass
+
+
+class WorkerPool:
+    """
+    Fixed-size pool of warm workers for one language.
+
+    Workers are recycled after max_runs executions, after any timeout and
+    whenever they misbehave.
+    """
+
+    def __init__(self, lang, cmd, size=SANDBOX_POOL_SIZE, max_runs=SANDBOX_WORKER_MAX_RUNS):
+        self.lang = lang
+        self.cmd = cmd
+        self.size = size
+        self.max_runs = max_runs
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self.stats = {"runs": 0, "recycled": 0, "spawned": 0}
+        for _ in range(size):
+            self._idle.put(self._spawn())
+
+    def _spawn(self):
+        with self._lock:
+            self.stats["spawned"] += 1
+        return Worker(self.cmd)
+
+    def run(self, code, timeout=5, limits=None):
+        """
+        Execute code on an idle worker.
+
+        Returns:
+            dict: stdout, stderr, returncode, timed_out, truncated,
+            cpu_seconds, peak_rss_kb
+
+        Raises:
+            WorkerUnavailable: the code was never handed to a worker
+            WorkerError: the worker got the code, then died or went silent
+        """
+        try:
+            worker = self._idle.get(timeout=timeout + WORKER_GRACE)
+        except queue.Empty:
+            raise WorkerUnavailable("no idle worker available")
+        limits = limits or limits_for(self.lang, timeout)
+        # Every run is a child of the worker that joins the run's cgroup
+        cgroup = RunCgroup(limits)
+        recycle = False
+        try:
+            if not worker.alive():
+                try:
+                    worker = self._spawn()
+                except OSError as e:
+                    raise WorkerUnavailable(f"could not start a worker: {e}")
+            result = worker.run(code, timeout, limits, cgroup.path)
+            result.update(cgroup.usage())
+            recycle = result.get("timed_out") or worker.runs >= self.max_runs
+            return result
+        except WorkerError:
+            recycle = True
+            raise
+        finally:
+            cgroup.close()
+            with self._lock:
+                self.stats["runs"] += 1
+                if recycle:
+                    self.stats["recycled"] += 1
+            if recycle:
+                # Replace off the request path so the caller is not billed for startup
+                worker.kill()
+                threading.Thread(target=self._replace, daemon=True).start()
+            else:
+                self._idle.put(worker)
+
+    def _replace(self):
+        try:
+            self._idle.put(self._spawn())
+        except OSError as e:
+            print(f"❌ Could not respawn {self.lang} sandbox worker: {e}")
+
+    def shutdown(self):
+        while True:
+            try:
+                self._idle.get_nowait().kill()
+            except queue.Empty:
+                return
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(lang):
+    """Return the pool for lang, starting it on first use (None if disabled)"""
+    if not SANDBOX_POOL_ENABLED or lang not in WORKER_COMMANDS:
+        return None
+    pool = _pools.get(lang)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(lang)
+            if pool is None:
+                pool = WorkerPool(lang, WORKER_COMMANDS[lang])
+                _pools[lang] = pool
+    return pool
+
+
+def pool_stats():
+    """Per-language pool counters"""
+    return {
+        lang: dict(pool.stats, size=pool.size, idle=pool._idle.qsize())
+        for lang, pool in _pools.items()
+    }
+
+
+def shutdown_pools():
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.shutdown()
+        _pools.clear()
@@ -0,0 +1,239 @@
+// TracePoint AI - Warm Node.js sandbox worker
+// Long-lived process managed by sandbox_pool. Each request runs in its own
+// short-lived node child (this file with --runner), so a snippet gets the
+// same globals, timers and event loop as `node file.js` and runs never see
+// each other's state. The next child is started as soon as a run replies,
+// so interpreter startup stays off the request path.
+//
+// Command line: sandbox_worker.js --rlimit-exec <python> <sandbox_limits.py>
+// --limits <json>. Each runner starts through that wrapper, which sets the
+// run's rlimits (CPU, file size, no core dumps) and execs node, in its own
+// process group that is killed as a whole when the run ends. --limits are
+// the ones the first runner is started with; a request with other limits
+// gets a fresh runner.
+//
+// Protocol (stdin/stdout): 4-byte big-endian length + JSON body.
+//   request:  {"code": str, "timeout": float, "max_output": int,
+//              "limits": {...} (sandbox_limits.limits_for), "cgroup": str or null}
+//   response: {"stdout": str, "stderr": str, "returncode": int, "timed_out": bool,
+//              "truncated": bool, "cpu_seconds": float, "peak_rss_kb": int}
+//
+// The heap cap comes from --max-old-space-size on the worker's command
+// line, which every child inherits through process.execArgv.
+
+const { spawn } = require('child_process');
+const fs = require('fs');
+const os = require('os');
+const path = require('path');
+
+const RUNNER_FLAG = '--runner';
+const USAGE_FD = 4; // runner -> worker: {"cpu_seconds", "peak_rss_kb"} at exit
+
+function argAfter(flag, count = 1) {
+  const at = process.argv.indexOf(flag);
+  return at < 0 ? null : process.argv.slice(at + 1, at + 1 + count);
+}
+
+// Drop the runner's own frames from a user-facing stack trace
+function userStack(err) {
+  if (!err || !err.stack) return String(err);
+  return err.stack
+    .split('\n')
+    .filter((line) => !/(\(|at )node:/.test(line) && !line.includes(__filename))
+    .join('\n');
+}
+
+// ==================== RUNNER (child) ====================
+
+function runner() {
+  const Module = require('module');
+
+  // stdio are socketpairs, which Node writes asynchronously: a busy loop
+  // would buffer its output in memory instead of reaching the output cap
+  for (const stream of [process.stdout, process.stderr]) {
+    if (stream._handle && stream._handle.setBlocking) stream._handle.setBlocking(true);
+  }
+
+  process.once('message', (request) => {
+    // The IPC channel would keep the event loop alive: the child exits
+    // once the snippet's own timers and promises are done
+    process.disconnect();
+    const cpuStart = process.cpuUsage();
+    process.on('exit', () => {
+      const cpu = process.cpuUsage(cpuStart);
+      try {
+        fs.writeSync(USAGE_FD, JSON.stringify({
+          cpu_seconds: (cpu.user + cpu.system) / 1e6,
+          peak_rss_kb: process.resourceUsage().maxRSS,
+        }));
+      } catch (err) {
+        // worker already gone
+      }
+    });
+
+    const filename = path.join(process.cwd(), 'sandbox.js');
+    const mod = new Module(filename, null);
+    mod.filename = filename;
+    mod.paths = Module._nodeModulePaths(process.cwd());
+    try {
+      mod._compile(request.code, filename);
+    } catch (err) {
+      process.stderr.write(userStack(err) + '\n');
+      process.exitCode = 1;
+    }
+  });
+}
+
+// ==================== WORKER ====================
+
+const protocolOut = process.stdout;
+let pending = Buffer.alloc(0);
+let queue = Promise.resolve();
+let spare = null;
+let lastLimits = null;
+
+function writeMessage(obj) {
+  const body = Buffer.from(JSON.stringify(obj), 'utf8');
+  const header = Buffer.alloc(4);
+  header.writeUInt32BE(body.length, 0);
+  protocolOut.write(Buffer.concat([header, body]));
+}
+
+const wrapper = argAfter('--rlimit-exec', 2);
+const defaultLimits = (argAfter('--limits') || [])[0] || null;
+
+// The runner's whole process group: anything the snippet forked goes too
+function killRunner(child) {
+  try {
+    process.kill(-child.pid, 'SIGKILL');
+  } catch (err) {
+    // already gone
+  }
+}
+
+function spawnRunner(limits) {
+  const node = [process.execPath, ...process.execArgv, __filename, RUNNER_FLAG];
+  const argv = wrapper && limits ? [...wrapper, limits, ...node] : node;
+  const child = spawn(argv[0], argv.slice(1), {
+    stdio: ['ignore', 'pipe', 'pipe', 'ipc', 'pipe'],
+    detached: true,
+  });
+  child.limits = limits;
+  child.on('error', () => {}); // surfaces as a failed run via 'close'
+  return child;
+}
+
+function takeRunner(limits) {
+  const child = spare;
+  spare = null;
+  if (child && child.limits === limits && child.connected
+      && child.exitCode === null && child.signalCode === null) {
+    return child;
+  }
+  if (child) killRunner(child);
+  return spawnRunner(limits);
+}
+
+function run(request) {
+  const timeoutMs = Math.max(1, Math.round((request.timeout || 5) * 1000));
+  const maxOutput = request.max_output || 1024 * 1024;
+  const limits = request.limits ? JSON.stringify(request.limits) : defaultLimits;
+  lastLimits = limits;
+  const child = takeRunner(limits);
+
+  return new Promise((resolve) => {
+    const out = { stdout: [], stderr: [], bytes: 0, truncated: false };
+    let usage = '';
+    let timedOut = false;
+    const kill = () => killRunner(child);
+
+    const collect = (name) => (chunk) => {
+      if (out.truncated) return;
+      const space = maxOutput - out.bytes;
+      if (chunk.length > space) {
+        // Stop the run at the first write past the cap
+        out[name].push(chunk.subarray(0, Math.max(0, space)));
+        out.bytes = maxOutput;
+        out.truncated = true;
+        kill();
+        return;
+      }
+      out[name].push(chunk);
+      out.bytes += chunk.length;
+    };
+    child.stdout.on('data', collect('stdout'));
+    child.stderr.on('data', collect('stderr'));
+    child.stdio[USAGE_FD].on('data', (chunk) => { usage += chunk; });
+    // Leftovers the snippet forked would hold the pipes open past its exit
+    child.on('exit', kill);
+
+    const timer = setTimeout(() => {
+      timedOut = true;
+      kill();
+    }, timeoutMs);
+
+    child.on('close', (code, signal) => {
+      clearTimeout(timer);
+      let report = {};
+      try {
+        report = JSON.parse(usage);
+      } catch (err) {
+        // killed before it could report
+      }
+      resolve({
+        stdout: Buffer.concat(out.stdout).toString('utf8'),
+        stderr: Buffer.concat(out.stderr).toString('utf8'),
+        returncode: code !== null ? code : -(os.constants.signals[signal] || 9),
+        timed_out: timedOut,
+        truncated: out.truncated,
+        cpu_seconds: report.cpu_seconds,
+        peak_rss_kb: report.peak_rss_kb,
+      });
+    });
+
+    if (request.cgroup) {
+      try {
+        fs.writeFileSync(path.join(request.cgroup, 'cgroup.procs'), String(child.pid));
+      } catch (err) {
+        // the heap cap and timeout still apply
+      }
+    }
+    child.send({ code: request.code }, (err) => {
+      if (err) kill();
+    });
+  });
+}
+
+function worker() {
+  lastLimits = defaultLimits;
+  spare = spawnRunner(lastLimits);
+
+  process.stdin.on('data', (chunk) => {
+    pending = Buffer.concat([pending, chunk]);
+    while (pending.length >= 4) {
+      const size = pending.readUInt32BE(0);
+      if (pending.length < 4 + size) break;
+      const body = pending.subarray(4, 4 + size).toString('utf8');
+      pending = pending.subarray(4 + size);
+      // One run at a time, in arrival order
+      queue = queue
+        .then(() => run(JSON.parse(body)))
+        .catch((err) => ({ stdout: '', stderr: `Worker error: ${err}`, returncode: 1, timed_out: false }))
+        .then((response) => {
+          writeMessage(response);
+          if (!spare) spare = spawnRunner(lastLimits);
+        });
+    }
+  });
+
+  process.stdin.on('end', () => {
+    if (spare) killRunner(spare);
+    process.exit(0);
+  });
+}
+
+if (process.argv.includes(RUNNER_FLAG)) {
+  runner();
+} else {
+  worker();
+}
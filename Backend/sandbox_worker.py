@@ -0,0 +1,144 @@
+"""
+TracePoint AI - Warm Python sandbox worker
+Long-lived interpreter managed by sandbox_pool. Each request is executed in
+a forked child with a fresh namespace, so runs never see each other's state.
+
+Protocol (stdin/stdout): 4-byte big-endian length + JSON body.
+    request:  {"code": str, "timeout": float, "max_output": int,
+               "limits": {...} (sandbox_limits.limits_for), "cgroup": str or null}
+    response: {"stdout": str, "stderr": str, "returncode": int, "timed_out": bool,
+               "truncated": bool, "cpu_seconds": float, "peak_rss_kb": int}
+"""
+
+import json
+import os
+import signal
+import struct
+import sys
+import traceback
+
+from sandbox_limits import apply_rlimits, collect_output, limits_for, usage_from_rusage
+
+# Keep private handles for the protocol; the child gets fresh fds 0/1/2
+_IN = os.fdopen(os.dup(0), "rb", buffering=0)
+_OUT = os.fdopen(os.dup(1), "wb", buffering=0)
+_DEVNULL = os.open(os.devnull, os.O_RDONLY)
+
+
+def _read_exact(n):
+    data = b""
+    while len(data) < n:
+        chunk = _IN.read(n - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return data
+
+
+def read_message():
+    header = _read_exact(4)
+    if header is None:
+        return None
+    body = _read_exact(struct.unpack(">I", header)[0])
+    return json.loads(body) if body is not None else None
+
+
+def write_message(obj):
+    data = json.dumps(obj).encode("utf-8")
+    _OUT.write(struct.pack(">I", len(data)) + data)
+
+
+def _child(code, limits, cgroup, out_w, err_w):
+    """Runs in the forked child; never returns"""
+    os.setsid()  # own process group: anything it forks dies with it
+    if cgroup:
+        try:
+            with open(os.path.join(cgroup, "cgroup.procs"), "w") as f:
+                f.write("0")
+        except OSError:
+            pass  # rlimits still apply
+    os.close(_IN.fileno())
+    os.close(_OUT.fileno())
+    os.dup2(_DEVNULL, 0)
+    os.dup2(out_w, 1)
+    os.dup2(err_w, 2)
+    sys.stdin = open(0, "r", closefd=False)
+    sys.stdout = open(1, "w", closefd=False)
+    sys.stderr = open(2, "w", closefd=False)
+
+    apply_rlimits(limits)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+    status = 0
+    try:
+        namespace = {"__name__": "__main__", "__builtins__": __builtins__}
+        exec(compile(code, "<sandbox>", "exec"), namespace)
+    except SystemExit as e:
+        if isinstance(e.code, int):
+            status = e.code
+        elif e.code is not None:
+            print(e.code, file=sys.stderr)
+            status = 1
+    except BaseException as e:
+        # Hide this worker's own frame from the user's traceback
+        tb = e.__traceback__.tb_next if e.__traceback__ else None
+        traceback.print_exception(type(e), e, tb)
+        status = 1
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        except Exception:
+            pass
+    os._exit(status)
+
+
+def run(request):
+    code = request["code"]
+    timeout = float(request.get("timeout", 5))
+    limits = request.get("limits") or limits_for("py", timeout)
+    max_output = int(request.get("max_output", limits["max_output"]))
+
+    out_r, out_w = os.pipe()
+    err_r, err_w = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(out_r)
+        os.close(err_r)
+        _child(code, limits, request.get("cgroup"), out_w, err_w)
+    os.close(out_w)
+    os.close(err_w)
+
+    try:
+        stdout, stderr, timed_out, truncated, status, rusage = collect_output(
+            pid, [out_r, err_r], timeout, max_output
+        )
+    finally:
+        os.close(out_r)
+        os.close(err_r)
+
+    return {
+        "stdout": stdout,
+        "stderr": stderr,
+        "returncode": os.waitstatus_to_exitcode(status),
+        "timed_out": timed_out,
+        "truncated": truncated,
+        **usage_from_rusage(rusage),
+    }
+
+
+def main():
+    os.dup2(_DEVNULL, 0)
+    os.dup2(2, 1)  # stray prints must not corrupt the protocol channel
+    while True:
+        request = read_message()
+        if request is None:
+            return
+        try:
+            write_message(run(request))
+        except Exception as e:
+            write_message({"stdout": "", "stderr": f"Worker error: {e}", "returncode": 1, "timed_out": False})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+"""
+TracePoint AI - Server-Sent Events helpers
+"""
+
+import json
+from flask import Response, stream_with_context
+
+
+def sse_event(data, event=None):
+    """Format one SSE frame; data is JSON-encoded"""
+    frame = f"event: {event}\n" if event else ""
+    return frame + f"data: {json.dumps(data)}\n\n"
+
+
+def sse_response(generator):
+    """Wrap a generator of SSE frames in a streaming response"""
+    return Response(
+        stream_with_context(generator),
+        mimetype="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",  # disable proxy buffering (nginx)
+        },
+    )
@@ -0,0 +1,491 @@
+"""
+TracePoint AI - Static Pre-Analysis
+Fast local analysis that runs before any LLM call: structure, imports,
+cyclomatic complexity, dangerous calls and line metrics.
+
+Python is parsed with `ast`; other languages use a single-pass regex
+tokenizer that understands their strings and comments.
+"""
+
+import ast
+import io
+import re
+import threading
+import time
+import tokenize
+
+# ast.parse is not safe to call from several threads at once on some
+# CPython builds ("AST constructor recursion depth mismatch" SystemError)
+_AST_LOCK = threading.Lock()
+
+
+def parse_python(code):
+    """Thread-safe ast.parse; raises SyntaxError like the original"""
+    with _AST_LOCK:
+        return ast.parse(code)
+
+# ==================== DANGEROUS CALLS ====================
+
+PY_DANGEROUS = {
+    "eval": "Dynamic code execution",
+    "exec": "Dynamic code execution",
+    "compile": "Dynamic code compilation",
+    "__import__": "Dynamic import",
+    "open": "File system access",
+    "input": "Reads from stdin",
+    "os.system": "Shell command execution",
+    "os.popen": "Shell command execution",
+    "os.remove": "File deletion",
+    "os.unlink": "File deletion",
+    "os.rmdir": "Directory deletion",
+    "shutil.rmtree": "Recursive deletion",
+    "subprocess.run": "Process execution",
+    "subprocess.call": "Process execution",
+    "subprocess.Popen": "Process execution",
+    "subprocess.check_output": "Process execution",
+    "subprocess.check_call": "Process execution",
+    "pickle.load": "Unsafe deserialization",
+    "pickle.loads": "Unsafe deserialization",
+    "marshal.loads": "Unsafe deserialization",
+    "yaml.load": "Unsafe deserialization (use safe_load)",
+    "requests.get": "Network access",
+    "requests.post": "Network access",
+    "urllib.request.urlopen": "Network access",
+    "socket.socket": "Network access",
+}
+
+TOKEN_DANGEROUS = {
+    "js": {
+        "eval": "Dynamic code execution",
+        "Function": "Dynamic code execution",
+        "document.write": "DOM injection",
+        "innerHTML": "Possible XSS sink",
+        "outerHTML": "Possible XSS sink",
+        "child_process": "Process execution",
+        "execSync": "Process execution",
+        "fs.unlink": "File deletion",
+        "fs.writeFile": "File system access",
+        "fs.readFile": "File system access",
+    },
+    "java": {
+        "Runtime.getRuntime": "Process execution",
+        "ProcessBuilder": "Process execution",
+        "ObjectInputStream": "Unsafe deserialization",
+        "Class.forName": "Reflection",
+        "executeQuery": "SQL execution (check for injection)",
+        "System.exit": "Terminates the JVM",
+    },
+    "c": {
+        "system": "Shell command execution",
+        "popen": "Shell command execution",
+        "gets": "Unbounded read (buffer overflow)",
+        "strcpy": "Unbounded copy (buffer overflow)",
+        "strcat": "Unbounded copy (buffer overflow)",
+        "sprintf": "Unbounded format (buffer overflow)",
+        "scanf": "Unbounded read without width",
+        "execl": "Process execution",
+        "execv": "Process execution",
+        "execvp": "Process execution",
+    },
+    "sql": {
+        "DROP": "Destructive DDL",
+        "TRUNCATE": "Destructive DDL",
+        "DELETE": "Row deletion",
+        "GRANT": "Privilege change",
+        "EXEC": "Dynamic SQL execution",
+    },
+    "html": {
+        "script": "Inline script",
+        "iframe": "Embedded frame",
+        "javascript": "javascript: URL",
+        "onclick": "Inline event handler",
+        "onerror": "Inline event handler",
+        "onload": "Inline event handler",
+    },
+    "css": {
+        "expression": "CSS expression (legacy script execution)",
+        "import": "External stylesheet import",
+    },
+}
+TOKEN_DANGEROUS["cpp"] = TOKEN_DANGEROUS["c"]
+
+# ==================== PYTHON (ast) ====================
+
+class _PythonVisitor(ast.NodeVisitor):
+    """Collects every metric in one walk of the tree"""
+
+    _BRANCHES = (ast.If, ast.For, ast.AsyncFor, ast.While, ast.IfExp,
+                 ast.ExceptHandler, ast.Assert)
+
+    def __init__(self):
+        self.functions = []
+        self.classes = []
+        self.imports = []
+        self.dangerous = []
+        self.module_complexity = 1
+        self._function_stack = []
+        self._class_stack = []
+
+    # complexity bookkeeping -----------------------------------------
+
+    def _add_complexity(self, amount):
+        if self._function_stack:
+            self._function_stack[-1]["complexity"] += amount
+        else:
+            self.module_complexity += amount
+
+    def generic_visit(self, node):
+        if isinstance(node, self._BRANCHES):
+            self._add_complexity(1)
+        elif isinstance(node, ast.BoolOp):
+            self._add_complexity(len(node.values) - 1)
+        elif isinstance(node, ast.comprehension):
+            self._add_complexity(1 + len(node.ifs))
+        elif hasattr(ast, "match_case") and isinstance(node, ast.match_case):
+            self._add_complexity(1)
+        super().generic_visit(node)
+
+    # structure -------------------------------------------------------
+
+    def _visit_function(self, node):
+        info = {
+            "name": node.name,
+            "line": node.lineno,
+            "end_line": getattr(node, "end_lineno", node.lineno),
+            "args": [a.arg for a in node.args.posonlyargs + node.args.args + node.args.kwonlyargs],
+            "async": isinstance(node, ast.AsyncFunctionDef),
+            "complexity": 1,
+        }
+        if self._class_stack:
+            info["class"] = self._class_stack[-1]["name"]
+            self._class_stack[-1]["methods"].append(node.name)
+        self.functions.append(info)
+        self._function_stack.append(info)
+        self.generic_visit(node)
+        self._function_stack.pop()
+
+    visit_FunctionDef = _visit_function
+    visit_AsyncFunctionDef = _visit_function
+
+    def visit_ClassDef(self, node):
+        info = {
+            "name": node.name,
+            "line": node.lineno,
+            "end_line": getattr(node, "end_lineno", node.lineno),
+            "bases": [_dotted_name(b) or "?" for b in node.bases],
+            "methods": [],
+        }
+        self.classes.append(info)
+        self._class_stack.append(info)
+        self.generic_visit(node)
+        self._class_stack.pop()
+
+    def visit_Import(self, node):
+        for alias in node.names:
+            self.imports.append({"module": alias.name, "line": node.lineno})
+        self.generic_visit(node)
+
+    def visit_ImportFrom(self, node):
+        module = "." * node.level + (node.module or "")
+        for alias in node.names:
+            self.imports.append({"module": f"{module}.{alias.name}" if module else alias.name,
+                                 "line": node.lineno})
+        self.generic_visit(node)
+
+    def visit_Call(self, node):
+        name = _dotted_name(node.func)
+        if name:
+            reason = PY_DANGEROUS.get(name)
+            if reason is None and "." in name:
+                # Catch aliased module calls, e.g. "sp.Popen" -> "Popen"
+                suffix = name.rsplit(".", 1)[1]
+                reason = next((r for k, r in PY_DANGEROUS.items()
+                               if "." in k and k.rsplit(".", 1)[1] == suffix and suffix[0].isupper()), None)
+            if reason:
+                self.dangerous.append({"call": name, "line": node.lineno, "reason": reason})
+        self.generic_visit(node)
+
+
+def _dotted_name(node):
+    parts = []
+    while isinstance(node, ast.Attribute):
+        parts.append(node.attr)
+        node = node.value
+    if isinstance(node, ast.Name):
+        parts.append(node.id)
+        return ".".join(reversed(parts))
+    return None
+
+
+def _python_line_metrics(code, lines):
+    comment_lines = set()
+    try:
+        for tok in tokenize.generate_tokens(io.StringIO(code).readline):
+            if tok.type == tokenize.COMMENT:
+                comment_lines.add(tok.start[0])
+    except (tokenize.TokenError, IndentationError, SyntaxError):
+        pass
+    blank = sum(1 for line in lines if not line.strip())
+    comment_only = sum(1 for n in comment_lines if lines[n - 1].strip().startswith("#"))
+    return {
+        "total": len(lines),
+        "code": len(lines) - blank - comment_only,
+        "comment": len(comment_lines),
+        "blank": blank,
+    }
+
+
+def _analyze_python(code, lines):
+    try:
+        tree = parse_python(code)
+    except SyntaxError as e:
+        result = _analyze_tokens(code, lines, "py")
+        result["syntax_error"] = f"Syntax Error at line {e.lineno}: {e.msg}"
+        return result
+
+    visitor = _PythonVisitor()
+    visitor.visit(tree)
+    return {
+        "parser": "ast",
+        "syntax_error": None,
+        "lines": _python_line_metrics(code, lines),
+        "functions": visitor.functions,
+        "classes": visitor.classes,
+        "imports": visitor.imports,
+        "dangerous_calls": visitor.dangerous,
+        "module_complexity": visitor.module_complexity,
+    }
+
+# ==================== OTHER LANGUAGES (tokenizer) ====================
+
+_COMMENT_STYLES = {
+    "js": (r"//[^\n]*", r"/\*.*?\*/"),
+    "java": (r"//[^\n]*", r"/\*.*?\*/"),
+    "c": (r"//[^\n]*", r"/\*.*?\*/"),
+    "cpp": (r"//[^\n]*", r"/\*.*?\*/"),
+    "css": (r"/\*.*?\*/",),
+    "sql": (r"--[^\n]*", r"/\*.*?\*/"),
+    "html": (r"<!--.*?-->",),
+    "py": (r"#[^\n]*",),
+}
+
+_STRING = r"\"(?:\\.|[^\"\\\n])*\"|'(?:\\.|[^'\\\n])*'|`(?:\\.|[^`\\])*`"
+_TOKEN_RES = {}
+
+
+def _token_re(lang):
+    if lang not in _TOKEN_RES:
+        comments = "|".join(_COMMENT_STYLES.get(lang, ()))
+        parts = [f"(?P<comment>{comments})"] if comments else []
+        parts += [
+            f"(?P<string>{_STRING})",
+            r"(?P<word>[A-Za-z_$][\w$]*(?:\.[A-Za-z_$][\w$]*)*)",
+            r"(?P<op>&&|\|\||\?|[{}();\n])",
+        ]
+        _TOKEN_RES[lang] = re.compile("|".join(parts), re.S)
+    return _TOKEN_RES[lang]
+
+
+_BRANCH_WORDS = {"if", "for", "while", "case", "catch", "elif", "when", "foreach"}
+_NOT_FUNCTIONS = {"if", "for", "while", "switch", "catch", "return", "sizeof", "new", "function", "else"}
+_IMPORT_PATTERNS = {
+    "js": re.compile(r"""^\s*(?:import\s.*?from\s+['"]([^'"]+)['"]|import\s+['"]([^'"]+)['"])|require\(\s*['"]([^'"]+)['"]\s*\)""", re.M),
+    "java": re.compile(r"^\s*import\s+(?:static\s+)?([\w.*]+)\s*;", re.M),
+    "c": re.compile(r"^\s*#\s*include\s*[<\"]([^>\"]+)[>\"]", re.M),
+    "css": re.compile(r"""@import\s+(?:url\()?['"]?([^'")\s;]+)""", re.M),
+    "html": re.compile(r"""<(?:script|link)[^>]+(?:src|href)\s*=\s*['"]([^'"]+)['"]""", re.I),
+}
+_IMPORT_PATTERNS["cpp"] = _IMPORT_PATTERNS["c"]
+
+
+def _analyze_tokens(code, lines, lang):
+    """Single pass over the token stream for non-Python languages"""
+    dangerous_names = TOKEN_DANGEROUS.get(lang, {})
+    if lang == "sql":
+        dangerous_names = {k.lower(): v for k, v in dangerous_names.items()}
+
+    comment_lines = set()
+    code_lines = set()
+    functions = []
+    classes = []
+    dangerous = []
+    complexity = 1
+    depth = 0
+    open_functions = []  # (info, depth at which its body opened)
+
+    line = 1
+    prev_words = []  # recent words on the logical statement
+    pending_function = None
+    pending_class = None
+
+    for match in _token_re(lang).finditer(code):
+        kind = match.lastgroup
+        text = match.group()
+
+        if kind == "comment":
+            end_line = line + text.count("\n")
+            comment_lines.update(range(line, end_line + 1))
+            line = end_line
+            continue
+        if kind == "string":
+            code_lines.add(line)
+            line += text.count("\n")
+            continue
+        if text == "\n":
+            line += 1
+            continue
+
+        code_lines.add(line)
+
+        if kind == "word":
+            word = text.lower() if lang == "sql" else text
+            base = word.split(".")[-1]
+            if base in _BRANCH_WORDS:
+                complexity += 1
+                if open_functions:
+                    open_functions[-1][0]["complexity"] += 1
+            reason = dangerous_names.get(word) or dangerous_names.get(base)
+            if reason:
+                dangerous.append({"call": text, "line": line, "reason": reason})
+            if prev_words and prev_words[-1] in ("class", "struct", "interface") and lang not in ("css", "html", "sql"):
+                pending_class = {"name": text, "line": line, "methods": []}
+            elif prev_words and prev_words[-1] == "function":
+                pending_function = {"name": text, "line": line, "complexity": 1}
+            prev_words.append(base)
+            prev_words = prev_words[-3:]
+        elif text in ("&&", "||", "?"):
+            complexity += 1
+            if open_functions:
+                open_functions[-1][0]["complexity"] += 1
+        elif text == "(":
+            # "name(" after a non-keyword word may be a declaration
+            if (pending_function is None and prev_words and prev_words[-1] not in _NOT_FUNCTIONS
+                    and lang in ("js", "java", "c", "cpp")):
+                pending_function = {"name": prev_words[-1], "line": line, "complexity": 1}
+        elif text == "{":
+            depth += 1
+            if pending_class is not None:
+                classes.append(pending_class)
+                pending_class = None
+            elif pending_function is not None:
+                info = pending_function
+                if classes and depth > 1:
+                    info["class"] = classes[-1]["name"]
+                    classes[-1]["methods"].append(info["name"])
+                functions.append(info)
+                open_functions.append((info, depth))
+            pending_function = None
+            prev_words = []
+        elif text == "}":
+            if open_functions and open_functions[-1][1] == depth:
+                open_functions[-1][0]["end_line"] = line
+                open_functions.pop()
+            depth = max(0, depth - 1)
+            pending_function = None
+            prev_words = []
+        elif text == ";":
+            pending_function = None
+            pending_class = None
+            prev_words = []
+
+    imports = []
+    pattern = _IMPORT_PATTERNS.get(lang)
+    if pattern:
+        for m in pattern.finditer(code):
+            module = next((g for g in m.groups() if g), None)
+            if module:
+                imports.append({"module": module, "line": code.count("\n", 0, m.start()) + 1})
+
+    blank = sum(1 for text in lines if not text.strip())
+    return {
+        "parser": "tokenizer",
+        "syntax_error": None if depth == 0 else "Mismatched braces",
+        "lines": {
+            "total": len(lines),
+            "code": len(code_lines),
+            "comment": len(comment_lines),
+            "blank": blank,
+        },
+        "functions": functions,
+        "classes": classes,
+        "imports": imports,
+        "dangerous_calls": dangerous,
+        "module_complexity": complexity,
+    }
+
+# ==================== PUBLIC API ====================
+
+EXTENSION_LANGS = {
+    "py": "py", "js": "js", "jsx": "js", "ts": "js", "tsx": "js",
+    "java": "java", "kt": "java", "c": "c", "h": "c",
+    "cpp": "cpp", "hpp": "cpp", "cc": "cpp",
+    "html": "html", "css": "css", "sql": "sql",
+}
+
+
+def language_for_filename(filename, default="py"):
+    """Guess the analysis language from a file extension"""
+    if filename and "." in filename:
+        return EXTENSION_LANGS.get(filename.rsplit(".", 1)[1].lower(), default)
+    return default
+
+
+def analyze(code, lang):
+    """
+    Run static pre-analysis.
+
+    Args:
+        code: Source code
+        lang: Language code as used by /analyze ('py', 'js', ...)
+
+    Returns:
+        dict: parser, syntax_error, lines, functions, classes, imports,
+              dangerous_calls, complexity summary and elapsed_ms
+    """
+    start = time.perf_counter()
+    lines = code.split("\n")
+
+    if lang == "py":
+        result = _analyze_python(code, lines)
+    else:
+        result = _analyze_tokens(code, lines, lang)
+
+    per_function = [f["complexity"] for f in result["functions"]]
+    result["complexity"] = {
+        "module": result.pop("module_complexity"),
+        "max_function": max(per_function) if per_function else 0,
+        "average_function": round(sum(per_function) / len(per_function), 2) if per_function else 0,
+    }
+    result["language"] = lang
+    result["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 3)
+    return result
+
+
+def prompt_summary(result, max_items=12):
+    """
+    Compact text form of an analysis result for injection into prompts.
+    Tells the model what is already known so it can focus its answer.
+    """
+    lines = [
+        f"Lines: {result['lines']['total']} total, {result['lines']['code']} code, "
+        f"{result['lines']['comment']} comment"
+    ]
+    if result.get("syntax_error"):
+        lines.append(f"Syntax: {result['syntax_error']}")
+    if result["functions"]:
+        items = [
+            f"{f.get('class') + '.' if f.get('class') else ''}{f['name']} (line {f['line']}, complexity {f['complexity']})"
+            for f in result["functions"][:max_items]
+        ]
+        lines.append("Functions: " + "; ".join(items))
+    if result["classes"]:
+        lines.append("Classes: " + ", ".join(c["name"] for c in result["classes"][:max_items]))
+    if result["imports"]:
+        modules = sorted({i["module"] for i in result["imports"]})
+        lines.append("Imports: " + ", ".join(modules[:max_items]))
+    if result["dangerous_calls"]:
+        items = [f"{d['call']} at line {d['line']} ({d['reason']})" for d in result["dangerous_calls"][:max_items]]
+        lines.append("Risky calls: " + "; ".join(items))
+    if result["functions"]:
+        lines.append(f"Max function complexity: {result['complexity']['max_function']}")
+    return "\n".join(lines)
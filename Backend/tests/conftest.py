@@ -0,0 +1,86 @@
+"""
+Shared fixtures. Backend modules import each other as top-level modules,
+so the Backend directory goes on sys.path, and configuration read at
+import time (DB path, provider, cache tier) is set before any import.
+"""
+
+import os
+import sys
+import tempfile
+
+_TMP = tempfile.mkdtemp(prefix="tracepoint-tests-")
+os.environ.setdefault("DB_PATH", os.path.join(_TMP, "app.db"))
+os.environ.setdefault("LLM_PROVIDER", "stub")
+os.environ.setdefault("LLM_CACHE_PERSIST", "0")
+os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+os.environ.setdefault("CHAT_RETENTION_INTERVAL", "0")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+import db
+
+
+def reset_db_state(path):
+    """Point db at path and drop per-database module state"""
+    db.DB_PATH = path
+    db._active_zdict = None
+    db._zdicts.clear()
+    db._load_segment.cache_clear()
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """A freshly initialized database with its own chat writer"""
+    monkeypatch.setattr(db, "DB_PATH", db.DB_PATH)
+    reset_db_state(str(tmp_path / "app.db"))
+    writer = db.ChatWriter(interval=0.01)
+    monkeypatch.setattr(db, "_chat_writer", writer)
+    db.init_db()
+    yield db
+    writer.close()
+    db.close_thread_conns()
+
+
+@pytest.fixture
+def user_id(database):
+    database.create_user("tester", "tester@example.com", "secret")
+    return database.get_user_by_email("tester@example.com")["id"]
+
+
+@pytest.fixture
+def llm_client(monkeypatch):
+    """
+    llm.py's client backed by the offline stub provider. Each test sets
+    backend.failure_rate as it needs; config objects are not built, since
+    the stub ignores them.
+    """
+    import llm
+    import llm_client as client_module
+    from cache import response_cache
+    from llm_providers import StubBackend, StubClient
+    monkeypatch.setattr(client_module.LLMClient, "_config", staticmethod(lambda system, remaining: None))
+    monkeypatch.setattr(client_module, "LLM_RETRY_BASE_DELAY", 0.001)
+    backend = StubBackend(latency="fixed:0", failure_rate=0, seed=1)
+    client = client_module.LLMClient(StubClient(backend), max_concurrency=4, max_retries=1)
+    monkeypatch.setattr(llm, "client", client)
+    response_cache.clear()
+    yield client
+    response_cache.clear()
+
+
+@pytest.fixture
+def app_client(database, user_id, monkeypatch):
+    """Flask test client logged in as user_id"""
+    import health
+    from app import create_app
+    from auth import SESSION_IDENTITY_KEY
+    monkeypatch.setattr(health, "start_prober", lambda *args, **kwargs: False)
+    app = create_app({"TESTING": True})
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["_user_id"] = str(user_id)
+        session["_fresh"] = True
+        session[SESSION_IDENTITY_KEY] = [user_id, "tester", "tester@example.com"]
+    return client
+
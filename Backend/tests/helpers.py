@@ -0,0 +1,18 @@
+"""Helpers shared by the test modules"""
+
+import json
+
+
+def sse_frames(response):
+    """Parse a streamed SSE body into [(event, data)]"""
+    frames = []
+    for block in response.get_data(as_text=True).split("\n\n"):
+        if not block.strip():
+            continue
+        event = "message"
+        for line in block.split("\n"):
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: "):
+                frames.append((event, json.loads(line[len("data: "):])))
+    return frames
@@ -0,0 +1,118 @@
+"""Upstream failures fall back to static analysis, including on the request that trips the breaker"""
+
+import pytest
+
+import llm
+from llm_client import CircuitBreaker, LLMUnavailable
+
+CODE = "def add(a, b):\n    return a + b\n"
+
+
+@pytest.fixture
+def failing(llm_client):
+    llm_client.provider.backend.failure_rate = 1
+    return llm_client
+
+
+def test_breaker_opens_after_threshold_and_probes_after_reset():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05, enabled=True)
+    outage = ConnectionError("reset")
+    breaker.record(outage)
+    assert breaker.available()
+    breaker.record(outage)
+    assert breaker.state == "open" and not breaker.available()
+    with pytest.raises(LLMUnavailable):
+        breaker.allow()
+
+    import time
+    time.sleep(0.06)
+    breaker.allow()  # the probe
+    assert breaker.state == "half_open"
+    with pytest.raises(LLMUnavailable):
+        breaker.allow()  # only one probe at a time
+    breaker.record()
+    assert breaker.state == "closed"
+
+
+def test_call_that_trips_the_breaker_raises_unavailable(failing):
+    failing.breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30, enabled=True)
+    failing.max_retries = 3
+    with pytest.raises(LLMUnavailable):
+        llm.analyze_code_with_ai(CODE, "py", static=None)
+    assert failing.breaker.state == "open"
+    assert failing.provider.backend.stats["calls"] == 2
+
+
+def test_final_upstream_failure_raises_unavailable_while_breaker_closed(failing):
+    failing.breaker = CircuitBreaker(failure_threshold=100, enabled=True)
+    with pytest.raises(LLMUnavailable):
+        llm.analyze_code_with_ai(CODE, "py", static=None)
+    with pytest.raises(LLMUnavailable):
+        list(llm.analyze_code_stream(CODE, "py", static=None))
+
+
+def test_analyze_route_degrades_on_the_tripping_request(app_client, failing):
+    failing.breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30, enabled=True)
+    body = app_client.post("/analyze", json={"code": CODE, "lang": "py"}).get_json()
+    assert body["degraded"] is True
+    assert "⚠️" not in body["explanation"]
+    assert "## Static Analysis" in body["explanation"]
+
+
+def test_analyze_stream_route_degrades_after_partial_text(app_client, failing):
+    from tests.helpers import sse_frames
+    failing.breaker = CircuitBreaker(failure_threshold=100, enabled=True)
+    frames = sse_frames(app_client.post("/analyze/stream", json={"code": CODE, "lang": "py"}))
+    event, done = frames[-1]
+    assert event == "done" and done["degraded"] is True
+    assert done["explanation"].startswith("ℹ️ The AI service is temporarily unavailable.")
+
+
+def test_forensic_batch_degrades_to_static_scans_while_breaker_is_open(database, user_id, failing):
+    import time
+    import jobs
+    failing.breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30, enabled=True)
+    failing.breaker.record(ConnectionError("reset"))
+    assert failing.breaker.state == "open"
+
+    job_id = jobs.submit_batch(user_id, [
+        {"filename": "a.py", "code": CODE},
+        {"filename": "b.js", "code": "function f() { return eval('1'); }"},
+    ])
+    deadline = time.monotonic() + 10
+    while jobs.get_job(job_id, user_id)["status"] != "completed" and time.monotonic() < deadline:
+        time.sleep(0.02)
+
+    job = jobs.get_job(job_id, user_id)
+    assert job["status"] == "completed" and job["successful"] == 2
+    assert all(r["degraded"] for r in job["results"])
+    assert all("Static Forensic Scan" in r["analysis"] for r in job["results"])
+    assert failing.provider.backend.stats["calls"] == 0
+
+
+def test_chat_route_answers_503_while_breaker_is_open_and_saves_nothing(app_client, database, user_id, failing):
+    failing.breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30, enabled=True)
+    failing.breaker.record(ConnectionError("reset"))
+    response = app_client.post("/chat", json={"message": "What is a closure?"})
+    assert response.status_code == 503
+    assert int(response.headers["Retry-After"]) >= 1
+    database.flush_chat_writes()
+    assert database.get_chat_count(user_id) == 0
+
+
+def test_replies_are_never_sniffed_for_error_text(app_client, database, user_id, llm_client, monkeypatch):
+    reply = "⚠️ Careful: this loop never ends."
+    monkeypatch.setattr(llm_client.provider.backend, "text_for", lambda contents: reply)
+    body = app_client.post("/chat", json={"message": "Is this loop fine?"}).get_json()
+    assert body["reply"] == reply
+    database.flush_chat_writes()
+    assert database.get_history(user_id)[0][1] == reply
+
+
+def test_non_upstream_failure_raises_llm_error(llm_client, monkeypatch):
+    from llm_client import LLMError
+    monkeypatch.setattr(llm_client.provider.backend, "text_for", lambda contents: "")
+    with pytest.raises(LLMError):
+        llm.chat_response("hello")
+    with pytest.raises(LLMError):
+        llm.answer_code_question("why?", CODE, "py")
@@ -0,0 +1,110 @@
+"""Response cache: tiers, single-flight coalescing and leader hand-over"""
+
+import threading
+import time
+
+import pytest
+
+from cache import LRUCache, ResponseCache, make_key
+
+
+class _BrokenTier(LRUCache):
+    """A faster tier whose writes fail (disk full, locked database...)"""
+
+    def set(self, key, value, ttl=None):
+        raise OSError("tier unavailable")
+
+
+def test_hit_in_slower_tier_survives_failing_promotion():
+    slow = LRUCache()
+    slow.set("k", "value")
+    cache = ResponseCache([_BrokenTier(), slow])
+    assert cache.get("k") == "value"
+    assert cache.stats()["errors"] == 1
+    assert cache.stats()["hits"] == 1
+
+
+def test_hit_is_promoted_into_faster_tiers():
+    fast, slow = LRUCache(), LRUCache()
+    slow.set("k", "value")
+    cache = ResponseCache([fast, slow])
+    assert cache.get("k") == "value"
+    assert fast.get("k") == "value"
+
+
+def test_keys_ignore_cosmetic_whitespace():
+    a = make_key("analyze", "m", "prompt", code="x = 1   \r\n\n")
+    b = make_key("analyze", "m", "prompt", code="x = 1")
+    assert a == b
+    assert a != make_key("analyze", "m", "prompt", code="x = 2")
+
+
+def _concurrently(cache, key, compute, count):
+    results, errors = [], []
+
+    def call():
+        try:
+            results.append(cache.get_or_compute(key, compute))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, results, errors
+
+
+def test_concurrent_misses_compute_once():
+    cache = ResponseCache([LRUCache()])
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.1)
+        return "answer"
+
+    threads, results, errors = _concurrently(cache, "k", compute, 5)
+    for thread in threads:
+        thread.join(2)
+    assert results == ["answer"] * 5 and not errors
+    assert len(calls) == 1
+    assert cache.stats()["coalesced"] == 4
+    assert cache.stats()["inflight"] == 0
+
+
+def test_leader_error_is_shared_and_not_cached():
+    cache = ResponseCache([LRUCache()])
+
+    def compute():
+        time.sleep(0.1)
+        raise ValueError("upstream said no")
+
+    threads, results, errors = _concurrently(cache, "k", compute, 3)
+    for thread in threads:
+        thread.join(2)
+    assert not results and len(errors) == 3
+    assert all(isinstance(e, ValueError) for e in errors)
+    assert cache.get("k") is None
+
+
+def test_interrupted_leader_hands_over_to_a_waiter():
+    cache = ResponseCache([LRUCache()])
+    leading = threading.Event()
+    interrupt = threading.Event()
+
+    def abandoned():
+        leading.set()
+        interrupt.wait(2)
+        raise GeneratorExit  # the leader's client disconnected
+
+    leader = threading.Thread(target=lambda: pytest.raises(GeneratorExit, cache.get_or_compute, "k", abandoned))
+    leader.start()
+    leading.wait(2)
+
+    threads, results, errors = _concurrently(cache, "k", lambda: "answer", 3)
+    time.sleep(0.05)
+    interrupt.set()
+    for thread in threads + [leader]:
+        thread.join(2)
+    assert results == ["answer"] * 3 and not errors
+    assert cache.stats()["inflight"] == 0
@@ -0,0 +1,120 @@
+"""Archived chat segments: round-trip, counters and paging across the live/archive boundary"""
+
+import pytest
+
+import db
+
+
+@pytest.fixture(params=["gzip", "zstd"])
+def codec(request, monkeypatch):
+    if request.param == "zstd" and db.zstandard is None:
+        pytest.skip("zstandard not installed")
+    monkeypatch.setattr(db, "CHAT_ARCHIVE_CODEC", request.param)
+    return request.param
+
+
+def _store(database, user_id, count):
+    for i in range(count):
+        database.save_chat(user_id, f"m{i}", f"r{i}" + " detail" * i)
+    assert database.flush_chat_writes()
+    return [row[0] for row in reversed(database.get_history_page(user_id, limit=count))]
+
+
+def test_archive_round_trip(database, user_id, codec):
+    ids = _store(database, user_id, 6)
+    live_before = [tuple(row) for row in database.get_history_page(user_id, limit=6)]
+
+    rows, raw, stored = database.archive_chat_rows(user_id, ids[3], segment_rows=3)
+    assert rows == 3 and raw > 0 and stored > 0
+    rows, _, _ = database.archive_chat_rows(user_id, ids[3], segment_rows=3)
+    assert rows == 1
+    assert database.archive_chat_rows(user_id, ids[3]) == (0, 0, 0)
+
+    segment = database.get_conn().execute(
+        "SELECT id, codec, first_id, last_id FROM chat_archive WHERE user_id=? ORDER BY id LIMIT 1", (user_id,)
+    ).fetchone()
+    assert (segment["codec"], segment["first_id"], segment["last_id"]) == (codec, ids[0], ids[2])
+    assert [row[0] for row in database._load_segment(segment["id"])] == ids[:3]
+
+    # Archived turns come back exactly as they were stored
+    assert database.get_archived_turns(user_id, limit=10) == live_before[2:]
+    assert database.get_conn().execute(
+        "SELECT COUNT(*) FROM chat_history WHERE user_id=?", (user_id,)
+    ).fetchone()[0] == 2
+    assert database.get_chat_count(user_id) == 6
+
+
+def test_history_pages_cross_into_the_archive(database, user_id):
+    ids = _store(database, user_id, 10)
+    database.archive_chat_rows(user_id, ids[2], segment_rows=2)
+    database.archive_chat_rows(user_id, ids[2], segment_rows=2)  # segments [0,1] and [2]
+
+    seen, before = [], None
+    while True:
+        page = database.get_history_page(user_id, limit=3, before_id=before)
+        if not page:
+            break
+        seen += [row[0] for row in page]
+        before = page[-1][0]
+    assert seen == list(reversed(ids))
+
+    # A cursor that already points into the archive
+    assert [row[0] for row in database.get_history_page(user_id, limit=5, before_id=ids[2])] == [ids[1], ids[0]]
+
+
+def test_delete_history_drops_archive(database, user_id):
+    ids = _store(database, user_id, 4)
+    database.archive_chat_rows(user_id, ids[1])
+    database.delete_user_history(user_id)
+    assert database.get_archived_turns(user_id) == []
+    assert database.get_chat_count(user_id) == 0
+
+
+def test_search_finds_archived_turns(database, user_id):
+    database.save_chat(user_id, "How do I reverse a linked list?", "Walk it once, flipping each next pointer.")
+    for i in range(4):
+        database.save_chat(user_id, f"loop question {i}", "use a for loop")
+    assert database.flush_chat_writes()
+    oldest = database.get_history_page(user_id, limit=10)[-1][0]
+    database.archive_chat_rows(user_id, oldest)
+
+    results = database.search_history(user_id, "linked lis")
+    assert [r["id"] for r in results] == [oldest]
+    assert "<mark>linked</mark>" in results[0]["message_snippet"]
+    assert "<mark>" not in results[0]["response_snippet"]
+    assert results[0]["timestamp"]
+
+    # Live and archived matches page together
+    database.archive_chat_rows(user_id, oldest + 2)
+    seen, after = [], None
+    while True:
+        page = database.search_history(user_id, "loop", limit=2, after=after)
+        if not page:
+            break
+        seen += [r["id"] for r in page]
+        after = (page[-1]["rank"], page[-1]["id"])
+    assert sorted(seen) == [oldest + 1, oldest + 2, oldest + 3, oldest + 4]
+
+
+def test_archived_turns_stay_private_and_leave_with_deletion(database, user_id):
+    database.create_user("other", "other@example.com", "secret")
+    other = database.get_user_by_email("other@example.com")["id"]
+    database.save_chat(user_id, "recursion depth", "use a loop")
+    assert database.flush_chat_writes()
+    database.archive_chat_rows(user_id, 10 ** 9)
+
+    assert database.search_history(other, "recursion") == []
+    database.delete_user_history(user_id)
+    assert database.search_history(user_id, "recursion") == []
+
+
+def test_migration_indexes_existing_segments(database, user_id):
+    database.save_chat(user_id, "memoization question", "cache the results")
+    assert database.flush_chat_writes()
+    database.archive_chat_rows(user_id, 10 ** 9)
+    conn = database.get_conn()
+    conn.execute("DROP TABLE chat_archive_fts")
+    conn.execute("PRAGMA user_version=7")
+
+    database.migrate()
+    assert len(database.search_history(user_id, "memoiz")) == 1
@@ -0,0 +1,66 @@
+"""Dictionary-compressed chat payloads"""
+
+import pytest
+
+import db
+
+LONG = "The code defines a function that returns the result of the loop. " * 8
+
+
+def test_long_text_round_trips_through_a_blob(database):
+    packed = database.pack_text(LONG)
+    assert isinstance(packed, bytes) and len(packed) < len(LONG)
+    assert database.unpack_text(packed) == LONG
+
+
+def test_short_and_non_text_values_are_stored_as_is(database):
+    assert database.pack_text("short") == "short"
+    assert database.pack_text(None) is None
+    assert database.unpack_text("plain") == "plain"
+
+
+def test_compression_can_be_turned_off(database, monkeypatch):
+    monkeypatch.setattr(db, "CHAT_COMPRESS", False)
+    assert database.pack_text(LONG) == LONG
+
+
+def test_rows_from_older_dictionaries_still_decode(database, user_id):
+    database.save_chat(user_id, "question", LONG)
+    assert database.flush_chat_writes()
+    database.retrain_zdict()
+    database.save_chat(user_id, "again", LONG + " twice")
+    assert database.flush_chat_writes()
+
+    # Start cold, as another process would
+    database._zdicts.clear()
+    database._active_zdict = None
+    assert [row[1] for row in database.get_history(user_id)] == [LONG + " twice", LONG]
+    assert len(database.search_history(user_id, "loop")) == 2
+
+
+def test_compression_report_counts_stored_blobs(database, user_id):
+    database.save_chat(user_id, "question", LONG)
+    assert database.flush_chat_writes()
+    report = database.chat_compression_report()
+    assert report["response"]["compressed_rows"] == 1
+    assert report["response"]["saved_bytes"] > 0
+
+
+def test_rolled_back_dictionary_is_never_used(database, user_id):
+    database.save_chat(user_id, "question", LONG)
+    assert database.flush_chat_writes()
+    active = database._current_zdict()
+
+    with pytest.raises(RuntimeError):
+        with database.get_conn() as conn:
+            database._train_zdict(conn.cursor())
+            raise RuntimeError("retrain aborted")
+    assert database._current_zdict() == active
+    packed = database.pack_text(LONG + " again")
+
+    # The rolled-back id is handed out again, to a different dictionary
+    database.save_chat(user_id, "different corpus", "Completely unrelated words about databases. " * 20)
+    assert database.flush_chat_writes()
+    database.retrain_zdict()
+    database._zdicts.clear()
+    assert database.unpack_text(packed) == LONG + " again"
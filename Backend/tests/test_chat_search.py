@@ -0,0 +1,83 @@
+"""Full-text chat search and keyset-paginated history"""
+
+import sqlite3
+
+
+def _store(database, user_id, turns):
+    for message, response in turns:
+        database.save_chat(user_id, message, response)
+    assert database.flush_chat_writes()
+
+
+def test_search_matches_prefixes_and_highlights(database, user_id):
+    _store(database, user_id, [
+        ("How do generators work?", "A generator yields values lazily."),
+        ("What is a <closure>?", "A function plus its enclosing scope."),
+    ])
+    results = database.search_history(user_id, "yie")
+    assert len(results) == 1
+    assert "<mark>yields</mark>" in results[0]["response_snippet"]
+
+    closure = database.search_history(user_id, "closure")
+    assert "&lt;<mark>closure</mark>&gt;" in closure[0]["message_snippet"]
+    assert database.search_history(user_id, "   ") == []
+
+
+def test_search_is_scoped_to_the_user(database, user_id):
+    database.create_user("other", "other@example.com", "secret")
+    other = database.get_user_by_email("other@example.com")["id"]
+    _store(database, other, [("recursion depth", "use a loop")])
+    assert database.search_history(user_id, "recursion") == []
+    assert len(database.search_history(other, "recursion")) == 1
+
+
+def test_deleted_history_leaves_the_index(database, user_id):
+    _store(database, user_id, [("sorting lists", "use bisect")])
+    database.delete_user_history(user_id)
+    assert database.search_history(user_id, "sorting") == []
+    database.rebuild_chat_search()
+    assert database.search_history(user_id, "sorting") == []
+
+
+def test_plain_sqlite_clients_can_write_history(database, user_id):
+    _store(database, user_id, [("q" * 300, "long answer " * 50), ("sorting lists", "use bisect")])
+    plain = sqlite3.connect(database.DB_PATH)
+    try:
+        with plain:
+            plain.execute(
+                "INSERT INTO chat_history (user_id, message, response) VALUES (?, 'heapq question', 'from a script')",
+                (user_id,)
+            )
+            plain.execute("DELETE FROM chat_history WHERE message='sorting lists'")
+        assert plain.execute("SELECT COUNT(*) FROM chat_history").fetchone()[0] == 2
+    finally:
+        plain.close()
+
+    assert database.search_history(user_id, "sorting") == []
+    database.rebuild_chat_search()
+    assert len(database.search_history(user_id, "heapq")) == 1
+    assert len(database.search_history(user_id, "answer")) == 1
+
+
+def test_search_pages_by_rank_then_id(database, user_id):
+    _store(database, user_id, [(f"loop question {i}", "answer") for i in range(7)])
+    seen, after = [], None
+    while True:
+        page = database.search_history(user_id, "loop", limit=3, after=after)
+        if not page:
+            break
+        seen += [result["id"] for result in page]
+        after = (page[-1]["rank"], page[-1]["id"])
+    assert len(seen) == 7 and len(set(seen)) == 7
+
+
+def test_history_pages_cover_every_turn_once(database, user_id):
+    _store(database, user_id, [(f"m{i}", f"r{i}") for i in range(10)])
+    messages, before = [], None
+    while True:
+        page = database.get_history_page(user_id, limit=4, before_id=before)
+        if not page:
+            break
+        messages += [row[1] for row in page]
+        before = page[-1][0]
+    assert messages == [f"m{i}" for i in reversed(range(10))]
@@ -0,0 +1,50 @@
+"""Write-behind chat inserts: read-your-writes, flushing and poison rows"""
+
+import db
+
+
+def test_buffered_turns_are_visible_to_the_same_user(database, user_id):
+    writer = database._chat_writer
+    writer.interval = 60  # keep rows buffered
+    database.save_chat(user_id, "first", "one")
+    database.save_chat(user_id, "second", "two")
+
+    assert writer.pending_count(user_id) == 2
+    assert [row[0] for row in database.get_history(user_id)] == ["second", "first"]
+    assert database.get_chat_count(user_id) == 2
+    page = database.get_history_page(user_id, limit=10)
+    assert [row[0] for row in page] == [None, None]
+
+    assert database.flush_chat_writes()
+    assert writer.pending_count(user_id) == 0
+    assert [row[1] for row in database.get_history_page(user_id, limit=10)] == ["second", "first"]
+
+
+def test_poison_row_is_dropped_without_blocking_the_queue(database, user_id, monkeypatch):
+    monkeypatch.setattr(db, "CHAT_WRITE_MAX_ATTEMPTS", 2)
+    writer = database._chat_writer
+    database.save_chat(user_id, "before", "ok")
+    database.save_chat(user_id, None, "message is NOT NULL")  # IntegrityError every time
+    database.save_chat(user_id, "after", "ok")
+
+    assert writer.flush(timeout=10)
+    stats = writer.snapshot()
+    assert stats["dropped"] == 1
+    assert stats["written"] == 2
+    assert stats["pending"] == 0
+    assert [row[0] for row in database.get_history(user_id)] == ["after", "before"]
+
+    # The queue keeps working afterwards
+    database.save_chat(user_id, "later", "ok")
+    assert writer.flush(timeout=5)
+    assert database.get_chat_count(user_id) == 3
+
+
+def test_close_writes_buffered_rows_and_skips_poison(database, user_id):
+    writer = db.ChatWriter(interval=60)
+    writer.add(user_id, "kept", "ok", "2026-01-01T00:00:00")
+    writer.add(user_id, None, "bad", "2026-01-01T00:00:01")
+    writer.close(timeout=10)
+
+    assert writer.stats["dropped"] == 1
+    assert [row[0] for row in database.get_history(user_id)] == ["kept"]
@@ -0,0 +1,89 @@
+"""Splitting large sources on syntactic boundaries for chunked forensics"""
+
+import chunking
+
+PY_CODE = '''"""Module docstring"""
+import os
+
+LIMIT = 3
+
+
+@staticmethod
+def first():
+    return "def not_a_unit():"
+
+
+class Second:
+    def method(self):
+        return 1
+
+# trailing comment
+'''
+
+JS_CODE = '''const a = 1;
+// function fake() {
+function one() {
+    return "}";
+}
+/* } */
+class Two {
+    run() { return `{`; }
+}
+'''
+
+
+def _covers_every_line(units, code):
+    lines = code.split("\n")
+    covered = [n for u in units for n in range(u["start_line"], u["end_line"] + 1)]
+    return sorted(covered) == covered and set(covered) >= {n for n, text in enumerate(lines, 1) if text.strip()}
+
+
+def test_python_units_follow_top_level_definitions():
+    units = chunking.split_units(PY_CODE, "py")
+    assert [(u["name"], u["kind"]) for u in units] == [
+        ("module", "statements"), ("first", "function"), ("Second", "class"),
+    ]
+    assert units[1]["code"].lstrip().startswith("@staticmethod")
+    assert units[-1]["code"].rstrip().endswith("# trailing comment")
+    assert _covers_every_line(units, PY_CODE)
+
+
+def test_python_syntax_error_falls_back_to_paragraphs():
+    units = chunking.split_units("def broken(:\n    pass\n\nx = 1\n", "py")
+    assert [(u["kind"], u["start_line"], u["end_line"]) for u in units] == [("section", 1, 2), ("section", 4, 4)]
+
+
+def test_brace_units_ignore_braces_in_strings_and_comments():
+    units = chunking.split_units(JS_CODE, "js")
+    assert [(u["name"], u["start_line"], u["end_line"]) for u in units] == [
+        ("statements", 1, 1), ("one", 2, 5), ("Two", 6, 9),
+    ]
+    assert _covers_every_line(units, JS_CODE)
+
+
+def test_split_code_packs_units_without_cutting_them():
+    code = "\n\n".join(f"def f{i}():\n    return {i}" for i in range(10)) + "\n"
+    chunks = chunking.split_code(code, "py", max_chars=60)
+
+    assert len(chunks) > 1
+    assert [c["index"] for c in chunks] == list(range(len(chunks)))
+    assert [name for c in chunks for name in c["names"]] == [f"f{i}" for i in range(10)]
+    assert all(len(c["code"]) <= 60 for c in chunks)
+    assert "\n".join(c["code"] for c in chunks).split() == code.split()
+
+
+def test_split_code_cuts_an_oversized_unit_at_line_boundaries():
+    body = "\n".join(f"    x{i} = {i}" for i in range(50))
+    code = f"def big():\n{body}\n    return x0\n"
+    chunks = chunking.split_code(code, "py", max_chars=200)
+
+    assert len(chunks) > 1
+    assert chunks[0]["names"] == ["big (part 1)"]
+    assert all(len(c["code"]) <= 200 for c in chunks)
+    assert [c["start_line"] for c in chunks[1:]] == [c["end_line"] + 1 for c in chunks[:-1]]
+
+
+def test_small_input_is_one_chunk():
+    chunks = chunking.split_code(JS_CODE, "js")
+    assert len(chunks) == 1
+    assert chunks[0]["code"] == JS_CODE.rstrip("\n")
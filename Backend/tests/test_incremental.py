@@ -0,0 +1,60 @@
+"""Incremental re-analysis never stores the output of a failed call"""
+
+import pytest
+
+import incremental
+from db import get_analysis_units
+from static_analysis import analyze as static_analyze
+from tests.helpers import sse_frames
+
+CODE = "def add(a, b):\n    return a + b\n"
+
+
+def _analyze_stream(stats):
+    return incremental.iter_analysis(CODE, "py", "beginner", static_analyze(CODE, "py"), stats)
+
+
+def test_failed_stream_is_not_saved(database, llm_client):
+    llm_client.provider.backend.failure_rate = 1
+    stats = {}
+    with pytest.raises(Exception, match="stream reset"):
+        list(_analyze_stream(stats))
+    assert stats["failed"] == 1
+
+    units, known = incremental.plan(CODE, "py", "beginner")
+    assert known == {}
+
+
+def test_healthy_run_after_failed_stream_analyzes_afresh(app_client, database, llm_client):
+    llm_client.provider.backend.failure_rate = 1
+    frames = sse_frames(app_client.post("/analyze/stream", json={"code": CODE, "lang": "py"}))
+    assert frames[-1][1]["degraded"] is True
+
+    llm_client.provider.backend.failure_rate = 0
+    body = app_client.post("/analyze", json={"code": CODE, "lang": "py"}).get_json()
+    assert body["units"]["reused"] == 0
+    assert body["units"]["analyzed"] == 1
+    assert "⚠️" not in body["explanation"]
+
+    # ...and that clean result is the one reused next time
+    again = app_client.post("/analyze", json={"code": CODE, "lang": "py"}).get_json()
+    assert again["units"]["message"] == "reused 1 of 1 units"
+    assert again["explanation"] == body["explanation"]
+
+
+def test_abandoned_stream_is_not_saved(database, llm_client):
+    stream = _analyze_stream({})
+    next(stream)
+    stream.close()
+
+    units, known = incremental.plan(CODE, "py", "beginner")
+    assert known == {}
+
+
+def test_migration_purges_units_saved_from_failed_streams(database):
+    database.save_analysis_unit("bad", "file", "The code…⚠️ AI Analysis Error: stream reset")
+    database.save_analysis_unit("good", "file", "The code adds two numbers.")
+    with database.get_conn() as conn:
+        database._m005_purge_failed_analysis_units(conn.cursor())
+
+    assert get_analysis_units(["bad", "good"]) == {"good": "The code adds two numbers."}
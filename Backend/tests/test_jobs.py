@@ -0,0 +1,42 @@
+"""Forensic jobs whose process died are failed instead of polled forever"""
+
+import os
+
+import jobs
+
+
+def _create(database, user_id, job_id, owner):
+    database.create_forensic_job(job_id, user_id, ["a.py", "b.py"], owner)
+    database.update_forensic_job_status(job_id, "running")
+    database.update_forensic_job_file(job_id, 0, "done", analysis="report")
+    database.update_forensic_job_file(job_id, 1, "running")
+
+
+def test_startup_sweep_fails_orphans_and_keeps_live_jobs(database, user_id):
+    _create(database, user_id, "dead", f"{jobs._HOST}:999999999:abcd1234")
+    _create(database, user_id, "legacy", None)
+    _create(database, user_id, "mine", jobs.owner_id())
+
+    assert jobs.recover_orphaned_jobs() == 2
+
+    dead = jobs.get_job("dead", user_id)
+    assert dead["status"] == "failed" and dead["finished_at"]
+    assert [r["status"] for r in dead["results"]] == ["done", "failed"]
+    assert dead["results"][0]["analysis"] == "report"
+    assert dead["results"][1]["error"] == jobs.ORPHANED_ERROR
+    assert jobs.get_job("legacy", user_id)["status"] == "failed"
+    assert jobs.get_job("mine", user_id)["status"] == "running"
+
+
+def test_reused_pid_is_not_mistaken_for_the_owner(database, user_id):
+    previous_run = f"{jobs._HOST}:{os.getpid()}:00000000"
+    _create(database, user_id, "old", previous_run)
+
+    # Polling fails it even without a sweep (owner died after startup)
+    assert jobs.get_job("old", user_id)["status"] == "failed"
+
+
+def test_jobs_on_other_hosts_are_left_alone(database, user_id):
+    _create(database, user_id, "remote", "some-other-host:1:abcd1234")
+    assert jobs.recover_orphaned_jobs() == 0
+    assert jobs.get_job("remote", user_id)["status"] == "running"
@@ -0,0 +1,35 @@
+"""Prometheus text exposition of the per-stage latency histograms"""
+
+import metrics
+
+
+def _sample(text, line_start):
+    return next(line for line in text.splitlines() if line.startswith(line_start))
+
+
+def test_histogram_buckets_are_cumulative_and_end_with_inf():
+    hist = metrics.histogram("tracepoint_test_seconds", "Test histogram.", ("stage",), buckets=(0.1, 1))
+    hist.observe(0.05, stage='a "quoted"\nstage')
+    hist.observe(0.5, stage='a "quoted"\nstage')
+    hist.observe(5, stage='a "quoted"\nstage')
+
+    text = metrics.render()
+    labels = 'stage="a \\"quoted\\"\\nstage"'
+    assert "# TYPE tracepoint_test_seconds histogram" in text
+    assert _sample(text, f'tracepoint_test_seconds_bucket{{{labels},le="0.1"}}').endswith(" 1")
+    assert _sample(text, f'tracepoint_test_seconds_bucket{{{labels},le="1.0"}}').endswith(" 2")
+    assert _sample(text, f'tracepoint_test_seconds_bucket{{{labels},le="+Inf"}}').endswith(" 3")
+    assert _sample(text, f"tracepoint_test_seconds_sum{{{labels}}}").endswith(" 5.55")
+    assert _sample(text, f"tracepoint_test_seconds_count{{{labels}}}").endswith(" 3")
+
+
+def test_endpoint_reports_http_and_llm_stages(app_client, llm_client):
+    app_client.post("/chat", json={"message": "What is a closure?"})
+    response = app_client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.content_type == metrics.CONTENT_TYPE
+    text = response.get_data(as_text=True)
+    assert 'tracepoint_http_request_duration_seconds_count{method="POST",route="/chat",status="200"}' in text
+    assert 'tracepoint_llm_call_duration_seconds_count{function="chat_response"}' in text
+    assert "tracepoint_llm_breaker_open 0" in text
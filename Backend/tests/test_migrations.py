@@ -0,0 +1,106 @@
+"""Upgrading a database created by the baseline schema through every migration"""
+
+import sqlite3
+
+import pytest
+
+import db
+from tests.conftest import reset_db_state
+
+LONG = "Explain why this loop never terminates and how to fix it. " * 10
+
+BASELINE = """
+CREATE TABLE users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT UNIQUE NOT NULL,
+    email TEXT UNIQUE NOT NULL,
+    password TEXT NOT NULL,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE chat_history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    message TEXT NOT NULL,
+    response TEXT NOT NULL,
+    timestamp TEXT DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users(id)
+);
+CREATE INDEX idx_chat_user_id ON chat_history(user_id);
+CREATE INDEX idx_chat_timestamp ON chat_history(timestamp);
+INSERT INTO users (username, email, password) VALUES ('ada', 'ada@example.com', 'x'), ('bob', 'bob@example.com', 'x');
+"""
+
+
+@pytest.fixture
+def baseline(tmp_path, monkeypatch):
+    """A database as the original db.init_db left it, with some history"""
+    path = str(tmp_path / "baseline.db")
+    conn = sqlite3.connect(path)
+    conn.executescript(BASELINE)
+    conn.executemany(
+        "INSERT INTO chat_history (user_id, message, response, timestamp) VALUES (?, ?, ?, ?)",
+        [(1, f"recursion question {i}", LONG, f"2024-01-01T00:00:{i:02d}") for i in range(5)]
+        + [(2, "what is a closure", "a function with its environment", "2024-01-02T00:00:00")]
+    )
+    conn.commit()
+    conn.close()
+
+    monkeypatch.setattr(db, "DB_PATH", db.DB_PATH)
+    reset_db_state(path)
+    monkeypatch.setattr(db, "_chat_writer", db.ChatWriter(interval=0.01))
+    yield db
+    db._chat_writer.close()
+    db.close_thread_conns()
+
+
+def _names(kind):
+    conn = db.get_conn()
+    return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type=?", (kind,))}
+
+
+def test_upgrade_applies_every_migration(baseline):
+    assert db.schema_version() == 0
+    db.init_db()
+    assert db.schema_version() == db.MIGRATIONS[-1][0]
+
+    indexes = _names("index")
+    assert "idx_chat_user_id_id" in indexes
+    assert "idx_chat_user_id" not in indexes
+    assert {"chat_counts", "chat_archive", "chat_zdicts", "chat_backfill", "chat_fts", "chat_archive_fts"} <= _names("table")
+    columns = [row[1] for row in db.get_conn().execute("PRAGMA table_info(forensic_jobs)")]
+    assert "owner" in columns
+
+    # Nothing in the schema needs the app's SQL functions except the chat_text view
+    schema = db.get_conn().execute("SELECT name, sql FROM sqlite_master WHERE sql LIKE '%tp_decompress%'").fetchall()
+    assert [row[0] for row in schema] == ["chat_text"]
+
+    # Counters are backfilled from the existing rows
+    assert db.get_chat_count(1) == 5
+    assert db.get_chat_count(2) == 1
+    # Existing rows are searchable through the rebuilt index
+    assert len(db.search_history(1, "recursion")) == 5
+    assert db.search_history(2, "recursion") == []
+
+
+def test_upgrade_is_idempotent(baseline):
+    db.init_db()
+    version = db.schema_version()
+    db.init_db()
+    assert db.schema_version() == version
+    assert db.get_chat_count(1) == 5
+
+
+def test_backlog_rows_are_compressed_after_upgrade(baseline):
+    db.init_db()
+    before = [tuple(row) for row in db.get_history(1)]
+
+    report = db.compress_chat_backlog(batch_size=2)
+    assert report["done"] and report["rows"] == 5
+    assert report["bytes_after"] < report["bytes_before"]
+
+    stored = db.get_conn().execute("SELECT typeof(response) FROM chat_history WHERE user_id=1").fetchall()
+    assert {row[0] for row in stored} == {"blob"}
+    assert [tuple(row) for row in db.get_history(1)] == before
+    assert len(db.search_history(1, "terminates")) == 5
+    # Resuming after completion has nothing left to do
+    assert db.compress_chat_backlog() == {"rows": 0, "bytes_before": 0, "bytes_after": 0, "done": True}
@@ -0,0 +1,180 @@
+"""Warm sandbox workers behave like a cold interpreter start"""
+
+import shutil
+import sys
+import time
+
+import pytest
+
+import sandbox
+from sandbox_limits import limits_for
+from sandbox_pool import WORKER_COMMANDS, WorkerPool
+
+node = pytest.mark.skipif(shutil.which("node") is None, reason="Node.js not installed")
+
+
+@pytest.fixture
+def js_pool():
+    pool = WorkerPool("js", WORKER_COMMANDS["js"], size=1)
+    yield pool
+    pool.shutdown()
+
+
+def run_js(pool, code, timeout=5):
+    return pool.run(code, timeout, limits_for("js", timeout))
+
+
+@node
+@pytest.mark.parametrize("code, expected", [
+    ("setTimeout(() => console.log('later'), 20)", "later\n"),
+    ("Promise.resolve(1).then(console.log)", "1\n"),
+    ("console.log(typeof require, typeof process, typeof Buffer)", "function object function\n"),
+    ("console.log(require('path').join('a', 'b'))", "a/b\n"),
+])
+def test_js_snippet_gets_node_globals_and_event_loop(js_pool, code, expected):
+    result = run_js(js_pool, code)
+    assert result["stdout"] == expected
+    assert result["returncode"] == 0
+
+
+@node
+def test_js_runs_do_not_share_globals(js_pool):
+    run_js(js_pool, "globalThis.leak = 42")
+    assert run_js(js_pool, "console.log(typeof leak)")["stdout"] == "undefined\n"
+
+
+@node
+def test_js_errors_exit_codes_and_limits(js_pool):
+    failed = run_js(js_pool, "throw new Error('boom')")
+    assert failed["returncode"] == 1
+    assert "Error: boom" in failed["stderr"] and "sandbox_worker" not in failed["stderr"]
+
+    assert run_js(js_pool, "process.exit(3)")["returncode"] == 3
+
+    flood = js_pool.run("for (;;) console.log('x'.repeat(1000))", 5, dict(limits_for("js", 5), max_output=10000))
+    assert flood["truncated"] and len(flood["stdout"]) == 10000
+
+    looping = run_js(js_pool, "while (true) {}", timeout=1)
+    assert looping["timed_out"]
+
+
+class _ColdStarts:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, code, lang, lang_config, timeout=5, limits=None):
+        self.calls += 1
+        return "cold", {}
+
+
+@pytest.fixture
+def cold_starts(monkeypatch):
+    import sandbox
+    recorder = _ColdStarts()
+    monkeypatch.setattr(sandbox, "_run_cold", recorder)
+    return recorder
+
+
+def _use_pool(monkeypatch, pool):
+    import sandbox
+    monkeypatch.setattr(sandbox, "get_pool", lambda lang: pool)
+
+
+def test_worker_death_after_delivery_is_not_rerun(monkeypatch, cold_starts):
+    import sandbox
+    # Reads the request header, then dies mid-run
+    pool = WorkerPool("py", [sys.executable, "-c", "import sys; sys.stdin.buffer.read(4); sys.exit(1)"], size=1)
+    _use_pool(monkeypatch, pool)
+    try:
+        output, usage = sandbox._run_code("print(1)", "py", 2)
+    finally:
+        pool.shutdown()
+    assert output.startswith("❌ Execution Error")
+    assert cold_starts.calls == 0
+
+
+def test_silent_worker_gets_one_timeout_budget(monkeypatch, cold_starts):
+    import sandbox
+    import sandbox_pool
+    monkeypatch.setattr(sandbox_pool, "WORKER_GRACE", 0.2)
+    pool = WorkerPool("py", [sys.executable, "-c", "import sys, time; sys.stdin.buffer.read(4); time.sleep(30)"], size=1)
+    _use_pool(monkeypatch, pool)
+    started = time.monotonic()
+    try:
+        output, usage = sandbox._run_code("print(1)", "py", 0.5)
+    finally:
+        pool.shutdown()
+    assert output.startswith("⏱️")
+    assert cold_starts.calls == 0
+    assert time.monotonic() - started < 2
+
+
+def test_undelivered_request_falls_back_to_cold_start(monkeypatch, cold_starts):
+    import sandbox
+    pool = WorkerPool("py", WORKER_COMMANDS["py"], size=1)
+    # The idle worker is gone and no replacement can start
+    pool.cmd = ["/nonexistent/interpreter"]
+    worker = pool._idle.get_nowait()
+    worker.kill()
+    pool._idle.put(worker)
+    _use_pool(monkeypatch, pool)
+    try:
+        output, usage = sandbox._run_code("print(1)", "py", 2)
+    finally:
+        pool.shutdown()
+    assert output == "cold"
+    assert cold_starts.calls == 1
+
+
+def test_process_cap_is_relative_to_the_users_tasks(monkeypatch):
+    import resource
+    import sandbox_limits
+    applied = {}
+    monkeypatch.setattr(sandbox_limits.os, "geteuid", lambda: 1000)
+    monkeypatch.setattr(sandbox_limits, "user_tasks", lambda uid: 40)
+    monkeypatch.setattr(sandbox_limits.resource, "setrlimit", lambda which, caps: applied.setdefault(which, caps))
+    sandbox_limits.apply_rlimits(limits_for("py", 5))
+    assert applied[resource.RLIMIT_NPROC] == (40 + sandbox_limits.SANDBOX_MAX_PROCS,) * 2
+
+
+def test_user_tasks_counts_threads():
+    import os
+    import threading
+    from sandbox_limits import user_tasks
+    stop = threading.Event()
+    threads = [threading.Thread(target=stop.wait) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    try:
+        assert user_tasks(os.getuid()) >= threading.active_count()
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+
+@node
+def test_js_runs_get_file_size_and_cpu_limits(js_pool, tmp_path):
+    target = tmp_path / "big.bin"
+    limits = limits_for("js", 5)
+    big = run_js(js_pool, f"require('fs').writeFileSync({str(target)!r}, Buffer.alloc({(limits['max_file_mb'] + 4) * 1024 * 1024}))")
+    assert big["returncode"] != 0
+    assert target.stat().st_size <= limits["max_file_mb"] * 1024 * 1024
+
+    # RLIMIT_CPU stops a busy loop before the (longer) wall timeout
+    spinning = js_pool.run("while (true) {}", 5, dict(limits, cpu_seconds=1))
+    assert not spinning["timed_out"] and spinning["returncode"] < 0
+    message, _ = sandbox._describe(spinning, 5, dict(limits, cpu_seconds=1))
+    assert message.startswith("🧱 Resource Limit: CPU time")
+
+
+@node
+def test_js_run_takes_its_forked_processes_with_it(js_pool, tmp_path):
+    marker = tmp_path / "survivor"
+    code = (
+        "const { spawn } = require('child_process');"
+        f"spawn('sh', ['-c', 'sleep 1; touch {marker}'], {{ stdio: 'ignore' }}).unref();"
+    )
+    assert run_js(js_pool, code)["returncode"] == 0
+    time.sleep(1.5)
+    assert not marker.exists()
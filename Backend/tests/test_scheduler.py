@@ -0,0 +1,77 @@
+"""LLM slot scheduler: priority and per-user fairness, and no bucket I/O under its lock"""
+
+import threading
+import time
+
+from ratelimit import MemoryBuckets, Scheduler
+
+
+def _scheduler(slots=1, buckets=None):
+    return Scheduler(slots, buckets or MemoryBuckets(), global_budget="1000/s")
+
+
+def _waiters(scheduler, calls):
+    """Start blocked acquire() calls in order; returns the list grants are appended to"""
+    granted = []
+
+    def wait(user, priority):
+        if scheduler.acquire(user, priority, 5):
+            granted.append((user, priority))
+
+    threads = []
+    for user, priority in calls:
+        thread = threading.Thread(target=wait, args=(user, priority))
+        thread.start()
+        threads.append(thread)
+        time.sleep(0.02)  # queue them in a known order
+    return granted, threads
+
+
+def test_priority_then_round_robin_across_users():
+    scheduler = _scheduler()
+    assert scheduler.acquire("holder", "chat", 1)
+    granted, threads = _waiters(scheduler, [
+        ("a", "batch"), ("a", "analyze"), ("a", "analyze"), ("b", "analyze"), ("c", "chat"),
+    ])
+    for _ in range(len(threads)):
+        scheduler.release()
+        time.sleep(0.05)
+    for thread in threads:
+        thread.join(1)
+    assert granted == [("c", "chat"), ("a", "analyze"), ("b", "analyze"), ("a", "analyze"), ("a", "batch")]
+
+
+def test_acquire_times_out_when_no_slot_frees():
+    scheduler = _scheduler()
+    assert scheduler.acquire("a", "chat", 1)
+    assert scheduler.acquire("b", "chat", 0.05) is False
+    assert scheduler.snapshot()["timed_out"] == 1
+    assert scheduler.snapshot()["queued"]["chat"] == 0
+
+
+class _SlowBuckets(MemoryBuckets):
+    """Stands in for the SQLite backend waiting on its busy timeout"""
+
+    def __init__(self, delay):
+        super().__init__()
+        self.delay = delay
+
+    def take(self, key, capacity, rate, cost=1):
+        time.sleep(self.delay)
+        return super().take(key, capacity, rate, cost)
+
+
+def test_global_bucket_is_paid_outside_the_scheduler_lock():
+    scheduler = _scheduler(slots=2, buckets=_SlowBuckets(0.5))
+    holder = threading.Thread(target=scheduler.acquire, args=("a", "chat", 5))
+    holder.start()
+    time.sleep(0.1)  # now inside take()
+
+    started = time.monotonic()
+    scheduler.release()
+    scheduler.snapshot()
+    scheduler.check_queue("chat")
+    assert time.monotonic() - started < 0.1
+
+    holder.join(2)
+    assert scheduler.snapshot()["granted"] == 1
@@ -0,0 +1,103 @@
+"""Local static pre-analysis for Python (ast) and C-like languages (tokenizer)"""
+
+import static_analysis
+
+PY_CODE = '''import os
+from collections import OrderedDict as OD
+
+# a comment with a brace {
+class Cache(OD):
+    """Docstring mentioning { and }"""
+
+    def get(self, key, default=None):
+        if key in self and default is None:
+            return self[key]
+        return default
+
+
+async def load(path):
+    text = "}{ not code"
+    return [line for line in open(path) if line]
+'''
+
+JS_CODE = '''import fs from 'fs';
+const helpers = require("./helpers");
+
+// function commented() { if (x) {} }
+/* a block comment { with braces
+   over two lines } */
+function greet(name) {
+    const brace = "}";
+    const tpl = `{ ${name} }`;
+    if (name && name.length) {
+        return brace + tpl;
+    }
+    return eval('"{"');
+}
+
+class Greeter {
+    hello(who) {
+        return who ? greet(who) : "";
+    }
+}
+'''
+
+
+def test_python_structure_imports_and_dangerous_calls():
+    result = static_analysis.analyze(PY_CODE, "py")
+
+    assert result["parser"] == "ast" and result["syntax_error"] is None
+    assert [m["module"] for m in result["imports"]] == ["os", "collections.OrderedDict"]
+    assert [(c["name"], c["bases"], c["methods"]) for c in result["classes"]] == [("Cache", ["OD"], ["get"])]
+
+    functions = {f["name"]: f for f in result["functions"]}
+    assert functions["get"]["class"] == "Cache"
+    assert functions["get"]["args"] == ["self", "key", "default"]
+    assert functions["get"]["complexity"] == 3  # if + and
+    assert functions["load"]["async"] is True
+    assert functions["load"]["complexity"] == 3  # comprehension + its if
+
+    assert [(d["call"], d["line"]) for d in result["dangerous_calls"]] == [("open", 16)]
+
+
+def test_python_line_metrics():
+    result = static_analysis.analyze(PY_CODE, "py")
+    assert result["lines"] == {"total": 17, "code": 11, "comment": 1, "blank": 5}
+
+
+def test_python_syntax_error_falls_back_to_the_tokenizer():
+    result = static_analysis.analyze("def broken(:\n    eval('x')\n", "py")
+    assert result["parser"] == "tokenizer"
+    assert result["syntax_error"].startswith("Syntax Error at line 1")
+
+
+def test_js_braces_in_strings_and_comments_do_not_open_blocks():
+    result = static_analysis.analyze(JS_CODE, "js")
+
+    assert result["parser"] == "tokenizer" and result["syntax_error"] is None
+    assert [m["module"] for m in result["imports"]] == ["fs", "./helpers"]
+    assert [(c["name"], c["methods"]) for c in result["classes"]] == [("Greeter", ["hello"])]
+
+    functions = {f["name"]: f for f in result["functions"]}
+    assert set(functions) == {"greet", "hello"}, "nothing is picked up from the comments"
+    assert (functions["greet"]["line"], functions["greet"]["end_line"]) == (7, 14)
+    assert functions["greet"]["complexity"] == 3  # if + &&
+    assert functions["hello"]["class"] == "Greeter"
+    assert functions["hello"]["complexity"] == 2  # ?
+
+    assert [(d["call"], d["line"]) for d in result["dangerous_calls"]] == [("eval", 13)]
+    assert result["lines"]["comment"] == 3
+
+
+def test_c_mismatched_braces_are_reported():
+    code = '#include <stdio.h>\nint main() {\n    char buf[8];\n    gets(buf);\n    printf("}");\n'
+    result = static_analysis.analyze(code, "c")
+    assert result["syntax_error"] == "Mismatched braces"
+    assert [m["module"] for m in result["imports"]] == ["stdio.h"]
+    assert [d["call"] for d in result["dangerous_calls"]] == ["gets"]
+    assert result["functions"][0]["name"] == "main"
+
+
+def test_prompt_summary_mentions_what_was_found():
+    summary = static_analysis.prompt_summary(static_analysis.analyze(JS_CODE, "js"))
+    assert "greet" in summary and "eval" in summary
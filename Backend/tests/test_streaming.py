@@ -0,0 +1,67 @@
+"""Streamed chat and analysis replies when the upstream stream fails part-way"""
+
+import pytest
+
+import llm
+from tests.helpers import sse_frames
+
+
+def test_chat_stream_failure_raises_instead_of_yielding_error_text(llm_client):
+    llm_client.provider.backend.failure_rate = 1
+    parts = []
+    with pytest.raises(Exception, match="stream reset"):
+        for text in llm.chat_response_stream("hello"):
+            parts.append(text)
+    assert parts, "the stub fails half-way, after some text went out"
+    assert not any("⚠️" in part for part in parts)
+
+
+def test_chat_stream_route_reports_error_and_saves_nothing(app_client, llm_client, database, user_id):
+    llm_client.provider.backend.failure_rate = 1
+    response = app_client.post("/chat/stream", json={"message": "What is a closure?"})
+    frames = sse_frames(response)
+
+    assert frames[-1][0] == "error"
+    assert frames[-1][1]["partial"] is True
+    assert not any(event == "done" for event, _ in frames)
+    database.flush_chat_writes()
+    assert database.get_chat_count(user_id) == 0
+
+
+def test_chat_stream_route_saves_complete_reply(app_client, llm_client, database, user_id):
+    response = app_client.post("/chat/stream", json={"message": "What is a closure?"})
+    frames = sse_frames(response)
+
+    assert frames[-1][0] == "done"
+    reply = frames[-1][1]["reply"]
+    assert reply == "".join(data["delta"] for event, data in frames if event == "message")
+    database.flush_chat_writes()
+    assert database.get_history(user_id)[0][1] == reply
+
+
+def test_analyze_stream_failure_is_not_cached(llm_client):
+    llm_client.provider.backend.failure_rate = 1
+    with pytest.raises(Exception):
+        list(llm.analyze_code_stream("print(1)", "py", static=None))
+
+    llm_client.provider.backend.failure_rate = 0
+    text = "".join(llm.analyze_code_stream("print(1)", "py", static=None))
+    assert "⚠️" not in text and text.startswith("[stub response")
+
+
+def test_analyze_stream_disconnect_hands_over_to_waiting_request(llm_client):
+    import threading
+    from cache import response_cache
+
+    code = "print('disconnect')"
+    leader = llm.analyze_code_stream(code, "py", static=None)
+    next(leader)  # the leader now holds the claim
+    shared = []
+    waiter = threading.Thread(target=lambda: shared.append("".join(llm.analyze_code_stream(code, "py", static=None))))
+    waiter.start()
+    waiter.join(0.1)
+    assert waiter.is_alive() and response_cache.stats()["coalesced"] >= 1
+
+    leader.close()  # the leader's client went away
+    waiter.join(5)
+    assert shared and shared[0].startswith("[stub response")
@@ -0,0 +1,41 @@
+"""
+TracePoint AI - WSGI Entry Point
+Production servers load this module, not app.py's dev server:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+or any WSGI server with the factory: gunicorn "wsgi:create_app()".
+Per-process setup (database migrations, background threads) is done by
+the gunicorn hooks in gunicorn.conf.py; init_server/init_worker below are
+the same steps for other servers.
+"""
+
+from app import app, create_app
+from db import init_db, flush_chat_writes
+from retention import start_retention
+from jobs import recover_orphaned_jobs
+import health
+import metrics
+
+
+def init_server():
+    """Once per deployment, before workers serve: schema and migrations"""
+    init_db()
+
+
+def init_worker():
+    """In each worker process (after the fork)"""
+    metrics.start_multiprocess()
+    health.start_prober()
+    start_retention()
+    recover_orphaned_jobs()
+
+
+def shutdown_worker(timeout=10):
+    """Flush buffered chat rows and metrics before the worker exits"""
+    if not flush_chat_writes(timeout):
+        print("⚠️ Chat writer did not flush every row before shutdown")
+    metrics.flush()
+
+
+__all__ = ["app", "create_app", "init_server", "init_worker", "shutdown_worker"]